@@ -0,0 +1,60 @@
+"""content addressed time series blobs
+
+Revision ID: 14fe762777c2
+Revises: a05afeb3eaa9
+Create Date: 2026-10-19 12:31:07.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '14fe762777c2'
+down_revision: Union[str, None] = 'a05afeb3eaa9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('timeseriesblobs',
+    sa.Column('hash', sa.String(length=64), nullable=False),
+    sa.Column('dataframe', sa.LargeBinary(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('hash')
+    )
+    # existing rows keep their inline dataframe, new rows reference a blob
+    for table in ['predictions', 'historicloaddata']:
+        op.add_column(table, sa.Column('blob_hash', sa.String(length=64), nullable=True))
+        op.create_foreign_key(f'{table}_blob_hash_fkey', table, 'timeseriesblobs', ['blob_hash'], ['hash'])
+        op.create_index(f'ix_{table}_blob_hash', table, ['blob_hash'], unique=False)
+        op.alter_column(table, 'dataframe', existing_type=sa.LargeBinary(), nullable=True)
+
+
+def downgrade() -> None:
+    connection = op.get_bind()
+    blobs = sa.table(
+        'timeseriesblobs',
+        sa.column('hash', sa.String()),
+        sa.column('dataframe', sa.LargeBinary()),
+    )
+    for table in ['predictions', 'historicloaddata']:
+        # move the blobs back inline before they are dropped
+        t = sa.table(
+            table,
+            sa.column('id', sa.Uuid()),
+            sa.column('dataframe', sa.PickleType()),
+            sa.column('blob_hash', sa.String()),
+        )
+        rows = connection.execute(
+            sa.select(t.c.id, blobs.c.dataframe).join(blobs, blobs.c.hash == t.c.blob_hash)
+        ).all()
+        for row in rows:
+            connection.execute(t.update().where(t.c.id == row.id).values(dataframe=row.dataframe))
+        op.alter_column(table, 'dataframe', existing_type=sa.LargeBinary(), nullable=False)
+        op.drop_index(f'ix_{table}_blob_hash', table_name=table)
+        op.drop_constraint(f'{table}_blob_hash_fkey', table, type_='foreignkey')
+        op.drop_column(table, 'blob_hash')
+    op.drop_table('timeseriesblobs')
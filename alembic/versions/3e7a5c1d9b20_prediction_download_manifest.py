@@ -0,0 +1,26 @@
+"""prediction download manifest
+
+Revision ID: 3e7a5c1d9b20
+Revises: 9c3f27d14e8b
+Create Date: 2026-10-19 15:02:44.519318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e7a5c1d9b20'
+down_revision: Union[str, None] = '9c3f27d14e8b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('predictions', sa.Column('download_manifest', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('predictions', 'download_manifest')
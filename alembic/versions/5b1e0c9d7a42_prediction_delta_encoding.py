@@ -0,0 +1,37 @@
+"""prediction delta encoding
+
+Revision ID: 5b1e0c9d7a42
+Revises: 14fe762777c2
+Create Date: 2026-10-19 13:02:44.518930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1e0c9d7a42'
+down_revision: Union[str, None] = '14fe762777c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('predictions', sa.Column('base_prediction_id', sa.Uuid(), nullable=True))
+    op.add_column('predictions', sa.Column('delta_depth', sa.Integer(), server_default='0', nullable=False))
+    op.create_foreign_key('predictions_base_prediction_id_fkey', 'predictions', 'predictions', ['base_prediction_id'], ['id'])
+
+
+def downgrade() -> None:
+    # deltas can't be decoded without their base
+    predictions = sa.table('predictions', sa.column('base_prediction_id', sa.Uuid()))
+    deltas = op.get_bind().execute(
+        sa.select(sa.func.count()).select_from(predictions).where(predictions.c.base_prediction_id.is_not(None))
+    ).scalar()
+    if deltas:
+        raise RuntimeError(f"{deltas} predictions are stored as delta, delete them before downgrading")
+    op.drop_constraint('predictions_base_prediction_id_fkey', 'predictions', type_='foreignkey')
+    op.drop_column('predictions', 'delta_depth')
+    op.drop_column('predictions', 'base_prediction_id')
@@ -0,0 +1,52 @@
+"""unique latest predictions
+
+Revision ID: 5f8d3b2e6a71
+Revises: 9c4e1a7f2b58
+Create Date: 2026-10-19 19:03:27.861402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f8d3b2e6a71'
+down_revision: Union[str, None] = '9c4e1a7f2b58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('latestpredictions', sa.Column('component_key', sa.Uuid(), nullable=True))
+    op.execute(
+        "UPDATE latestpredictions "
+        "SET component_key = COALESCE(component_id, '00000000-0000-0000-0000-000000000000'::uuid)"
+    )
+    # concurrent writers may have added a second row for a series, only the most recent one is kept
+    op.execute(
+        "DELETE FROM latestpredictions older USING latestpredictions newer "
+        "WHERE older.location_id = newer.location_id AND older.type = newer.type "
+        "AND older.component_key = newer.component_key "
+        "AND (older.prediction_created_at, older.id) < (newer.prediction_created_at, newer.id)"
+    )
+    op.alter_column('latestpredictions', 'component_key', nullable=False)
+    op.drop_index('ix_latestpredictions_location_id_type_component_id', table_name='latestpredictions')
+    op.create_index(
+        'ux_latestpredictions_location_id_type_component_key',
+        'latestpredictions',
+        ['location_id', 'type', 'component_key'],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ux_latestpredictions_location_id_type_component_key', table_name='latestpredictions')
+    op.create_index(
+        'ix_latestpredictions_location_id_type_component_id',
+        'latestpredictions',
+        ['location_id', 'type', 'component_id'],
+        unique=False,
+    )
+    op.drop_column('latestpredictions', 'component_key')
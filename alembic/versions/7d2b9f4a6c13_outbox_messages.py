@@ -0,0 +1,38 @@
+"""outbox messages
+
+Revision ID: 7d2b9f4a6c13
+Revises: 3e7a5c1d9b20
+Create Date: 2026-10-19 16:41:08.207413
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2b9f4a6c13'
+down_revision: Union[str, None] = '3e7a5c1d9b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('outboxmessages',
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('channel', sa.String(), nullable=False),
+    sa.Column('dataframe', sa.LargeBinary(), nullable=False),
+    sa.Column('file_name', sa.String(), nullable=True),
+    sa.Column('recipient', sa.String(), nullable=True),
+    sa.Column('prediction_date', sa.Date(), nullable=True),
+    sa.Column('prediction_ids', sa.JSON(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('outboxmessages')
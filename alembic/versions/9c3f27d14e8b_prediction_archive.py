@@ -0,0 +1,33 @@
+"""prediction archive
+
+Revision ID: 9c3f27d14e8b
+Revises: 5b1e0c9d7a42
+Create Date: 2026-10-19 13:41:19.087215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c3f27d14e8b'
+down_revision: Union[str, None] = '5b1e0c9d7a42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('predictions', sa.Column('archive_path', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    # archived predictions can't be found without their stub pointing to the archive
+    predictions = sa.table('predictions', sa.column('archive_path', sa.String()))
+    archived = op.get_bind().execute(
+        sa.select(sa.func.count()).select_from(predictions).where(predictions.c.archive_path.is_not(None))
+    ).scalar()
+    if archived:
+        raise RuntimeError(f"{archived} predictions are archived, delete them before downgrading")
+    op.drop_column('predictions', 'archive_path')
@@ -0,0 +1,26 @@
+"""outbox dead letters
+
+Revision ID: 9c4e1a7f2b58
+Revises: 7d2b9f4a6c13
+Create Date: 2026-10-19 18:12:44.530921
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4e1a7f2b58'
+down_revision: Union[str, None] = '7d2b9f4a6c13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('outboxmessages', sa.Column('dead_lettered_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('outboxmessages', 'dead_lettered_at')
@@ -0,0 +1,94 @@
+"""latest prediction read model
+
+Revision ID: a05afeb3eaa9
+Revises: 1c511b7b12e2
+Create Date: 2026-10-19 09:12:41.113027
+
+"""
+import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a05afeb3eaa9'
+down_revision: Union[str, None] = '1c511b7b12e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('latestpredictions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('location_id', sa.Uuid(), nullable=False),
+    sa.Column('type', sa.String(), nullable=False),
+    sa.Column('component_id', sa.Uuid(), nullable=True),
+    sa.Column('prediction_id', sa.Uuid(), nullable=False),
+    sa.Column('prediction_created_at', sa.DateTime(), nullable=False),
+    sa.Column('shipments', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['location_id'], ['locations.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['component_id'], ['components.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['prediction_id'], ['predictions.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_latestpredictions_location_id_type_component_id',
+        'latestpredictions',
+        ['location_id', 'type', 'component_id'],
+        unique=False,
+    )
+    # backfill the read model from the existing predictions
+    connection = op.get_bind()
+    predictions = sa.table(
+        'predictions',
+        sa.column('id', sa.Uuid()),
+        sa.column('location_id', sa.Uuid()),
+        sa.column('type', sa.String()),
+        sa.column('component_id', sa.Uuid()),
+        sa.column('created_at', sa.DateTime()),
+    )
+    shipments = sa.table(
+        'predictionshipments',
+        sa.column('prediction_id', sa.Uuid()),
+        sa.column('receiver', sa.String()),
+        sa.column('created_at', sa.DateTime()),
+    )
+    latest_predictions = sa.table(
+        'latestpredictions',
+        sa.column('location_id', sa.Uuid()),
+        sa.column('type', sa.String()),
+        sa.column('component_id', sa.Uuid()),
+        sa.column('prediction_id', sa.Uuid()),
+        sa.column('prediction_created_at', sa.DateTime()),
+        sa.column('shipments', sa.JSON()),
+        sa.column('created_at', sa.DateTime()),
+    )
+    latest = {}
+    for row in connection.execute(sa.select(predictions).order_by(predictions.c.created_at)):
+        latest[(row.location_id, row.type, row.component_id)] = row
+    if not latest:
+        return
+    summaries = {}
+    for row in connection.execute(sa.select(shipments).order_by(shipments.c.created_at)):
+        summaries.setdefault(row.prediction_id, {}).setdefault(row.receiver, row.created_at.isoformat() + "+00:00")
+    now = datetime.datetime.utcnow()
+    op.bulk_insert(latest_predictions, [
+        {
+            'location_id': row.location_id,
+            'type': row.type,
+            'component_id': row.component_id,
+            'prediction_id': row.id,
+            'prediction_created_at': row.created_at,
+            'shipments': summaries.get(row.id, {}),
+            'created_at': now,
+        }
+        for row in latest.values()
+    ])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_latestpredictions_location_id_type_component_id', table_name='latestpredictions')
+    op.drop_table('latestpredictions')
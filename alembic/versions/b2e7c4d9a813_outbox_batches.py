@@ -0,0 +1,33 @@
+"""outbox batches
+
+Revision ID: b2e7c4d9a813
+Revises: 5f8d3b2e6a71
+Create Date: 2026-10-19 20:26:51.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2e7c4d9a813'
+down_revision: Union[str, None] = '5f8d3b2e6a71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('outboxmessages', sa.Column('batch_id', sa.Uuid(), nullable=True))
+    op.add_column('outboxmessages', sa.Column('delivered_at', sa.DateTime(), nullable=True))
+    # messages written before are delivered on their own, like before
+    op.execute("UPDATE outboxmessages SET batch_id = id")
+    op.alter_column('outboxmessages', 'batch_id', nullable=False)
+    op.create_index(op.f('ix_outboxmessages_batch_id'), 'outboxmessages', ['batch_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_outboxmessages_batch_id'), table_name='outboxmessages')
+    op.drop_column('outboxmessages', 'delivered_at')
+    op.drop_column('outboxmessages', 'batch_id')
@@ -0,0 +1,40 @@
+"""
+compares split_df_by_day with the previous implementation, which built a boolean mask per day, on wide
+frames spanning several months, e.g.
+
+    python -m scripts.benchmark_split_df_by_day --days 180 --columns 50
+"""
+import argparse
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from src.utils.split_df_by_day import split_df_by_day
+from src.utils.timezone import TIMEZONE_BERLIN
+
+
+def split_df_by_day_with_masks(df: pd.DataFrame, timezone_for_day_boundary) -> dict:
+    dfs_by_day = {}
+    for day in pd.Series(df.tz_convert(timezone_for_day_boundary).index).dt.date.unique():
+        dfs_by_day[day] = df[df.tz_convert(timezone_for_day_boundary).index.date == day]
+    return dfs_by_day
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--columns", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    index = pd.date_range("2024-01-01", periods=args.days * 96, freq="15min", tz="UTC")
+    df = pd.DataFrame(np.random.default_rng(0).random((len(index), args.columns)), index=index)
+
+    for name, split in [("masks", split_df_by_day_with_masks), ("single pass", split_df_by_day)]:
+        seconds = min(timeit.repeat(lambda: split(df, TIMEZONE_BERLIN), number=1, repeat=args.runs))
+        print(f"{name}: {seconds * 1000:.1f}ms for {args.days} days x {args.columns} columns")
+
+
+if __name__ == "__main__":
+    main()
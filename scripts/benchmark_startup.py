@@ -0,0 +1,45 @@
+"""
+measures the time a fresh process needs until the app has started up, with optinode set up lazily
+(as it is now) and eagerly on startup (as it was before), e.g.
+
+    python -m scripts.benchmark_startup --runs 5
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+STARTUP = """
+import asyncio
+import src.main
+asyncio.run(src.main.init_bus())
+"""
+
+STARTUP_WITH_OPTINODE = STARTUP + """
+from src.services.load_data_exchange.optinode_database import setup_optinode
+setup_optinode()
+"""
+
+
+def measure(code: str, runs: int) -> list[float]:
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    for name, code in [("lazy optinode", STARTUP), ("eager optinode", STARTUP_WITH_OPTINODE)]:
+        durations = measure(code, args.runs)
+        print(f"{name}: median {statistics.median(durations):.2f}s, min {min(durations):.2f}s over {args.runs} runs")
+
+
+if __name__ == "__main__":
+    main()
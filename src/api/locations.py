@@ -9,7 +9,7 @@ from .common import get_bus, BasePagination
 from src.infrastructure.message_bus import MessageBus
 from src.domain import commands
 from src.domain.model import Location as DLocation
-from src.enums import DataRetriever, State, TransmissionSystemOperator
+from src.enums import DataRetriever, PredictionType, State, TransmissionSystemOperator
 
 router = APIRouter(prefix="/locations")
 
@@ -197,14 +197,23 @@ def send_predictions(bus: Annotated[MessageBus, Depends(get_bus)], location_id:
 def list_location_predictions(
     bus: Annotated[MessageBus, Depends(get_bus)],
     location_id: str,
-    type: str | None = None,
+    type: PredictionType | None = None,
+    latest: bool = False,
+    include_archived: bool = False,
 ):
     prediction_response_body = []
     with bus.uow as uow:
-        location: DLocation = uow.locations.get(id=uuid.UUID(location_id))
-        if not location:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-        for prediction in location.predictions:
+        if latest:
+            # served from the latest prediction read model, the location aggregate is only loaded for a 404
+            predictions = uow.latest_predictions.get_predictions(uuid.UUID(location_id), type)
+            if not predictions and not uow.locations.get(id=uuid.UUID(location_id)):
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        else:
+            location: DLocation = uow.locations.get(id=uuid.UUID(location_id))
+            if not location:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+            predictions = uow.predictions.get_range(location.id, type, include_archived=include_archived)
+        for prediction in predictions:
             if not type or (type and prediction.type == type):
                 prediction_response_body.append(
                     {
@@ -13,6 +13,9 @@ class Settings(BaseSettings):
     cors_origin: str = "https://localhost:3000"
     smtp_host: str = "smtp.office365.com"
     smtp_port: int = 587
+    smtp_starttls: bool = True
+    fahrplanmanagement_consolidated_emails: bool = False  # one email with all files per recipient instead of one per file
+    email_max_attachment_bytes: int = 10 * 1024 * 1024  # per consolidated email
     smtp_email: str = "kai.timofejew@node.energy"
     smtp_pass: str
     mail_recipient_cons: str = "verbrauchsprognosen@ppa-mailbox.node.energy"
@@ -29,6 +32,25 @@ class Settings(BaseSettings):
     iet_sftp_host: str = "nodeenergysftp.blob.core.windows.net"
 
     optinode_db_connection_string: str
+    optinode_query_batch_size: int = 500
+    optinode_warm_up: bool = False  # set up optinode on startup instead of on first use, for processes running the scheduled jobs
+
+    prediction_delta_keyframe_interval: int = 1  # > 1 stores predictions as delta to their predecessor with a full keyframe every n predictions
+    prediction_archive_path: str | None = None  # mounted persistent volume, no archiving if empty
+    prediction_archive_after_days: int = 90
+    archive_cron: str | None = None  # e.g. "0 3 * * *", no archiving if empty
+    outbox_delivery_interval_seconds: int = 60  # delay of fahrplanmanagement mails after update_cron, see main.deliver_outbox
+    outbox_batch_size: int = 100
+    outbox_max_attempts: int = 5  # failed messages are dead-lettered afterwards
+    outbox_dead_letter_retention_days: int = 30
+    sftp_cache_path: str | None = "/tmp/ppa-predictions/sftp-cache"  # no caching of downloaded forecast files if empty
+    sftp_cache_max_bytes: int = 512 * 1024 * 1024
+    sftp_listing_max_age_seconds: int = 300
+    sftp_max_sessions_per_host: int = 4
+    sftp_keepalive_seconds: int = 30
+    sftp_max_idle_seconds: int = 900
+    sftp_download_concurrency: int = 4
+    sftp_upload_concurrency: int = 4
 
     model_config = SettingsConfigDict(env_file="src/.env")
 
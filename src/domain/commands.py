@@ -103,3 +103,13 @@ class SendAllEigenverbrauchsPredictionsToImpuls(Command):
 @dataclass
 class SendAllResidualLongPredictionsToImpuls(Command):
     send_even_if_not_sent_to_internal_fahrplanmanagement: Optional[bool] = False
+
+
+@dataclass
+class ArchivePredictions(Command):
+    older_than_days: Optional[int] = None
+
+
+@dataclass
+class DeliverOutbox(Command):
+    pass
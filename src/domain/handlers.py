@@ -3,10 +3,12 @@ from __future__ import annotations
 import logging
 import datetime
 import uuid
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from uuid import UUID
 
+import numpy as np
 import pandas as pd
 from pandera.typing import DataFrame
 
@@ -23,8 +25,8 @@ from src.services.load_data_exchange.impuls_energy_trading import TIMEZONE_FILEN
 from src.utils.dataframe_schemas import IetLoadDataSchema, TimeSeriesSchema, FahrplanmanagementSchema
 from src.utils.external_schedules import GATE_CLOSURE_INTERNAL_FAHRPLANMANAGEMENT
 from src.utils.split_df_by_day import split_df_by_day
-from src.utils.timezone import TIMEZONE_BERLIN, TIMEZONE_UTC
-from src.enums import Measurand, DataRetriever, PredictionType
+from src.utils.timezone import TIMEZONE_BERLIN, TIMEZONE_UTC, utc_now
+from src.enums import Measurand, PredictionType
 from src import enums
 
 logger = logging.getLogger(__name__)
@@ -38,18 +40,24 @@ def update_and_predict_all(
     _: commands.UpdatePredictAll,
     uow: unit_of_work.AbstractUnitOfWork,
     ldr: src.services.load_data_exchange.common.AbstractLoadDataRetriever,
-    dts: data_sender.AbstractDataSender,
 ):
     with uow:
-        for location in uow.locations.get_all():
+        locations = uow.locations.get_all()
+        # retrieve the historic data of all locations at once
+        historic_data = ldr.get_bulk_data(
+            (malo.number, malo.measurand)
+            for location in locations
+            for malo in _market_locations_with_historic_data(location)
+        )
+        for location in locations:
             update_historic_data(
-                commands.UpdateHistoricData(location_id=str(location.id)), uow, ldr
+                commands.UpdateHistoricData(location_id=str(location.id)), uow, ldr, historic_data
             )
             calculate_predictions(
                 commands.CalculatePredictions(location_id=str(location.id)), uow
             )
             send_predictions(
-                commands.SendPredictions(location_id=str(location.id)), uow, dts
+                commands.SendPredictions(location_id=str(location.id)), uow
             )
 
 
@@ -57,36 +65,33 @@ def update_historic_data(
     cmd: commands.UpdateHistoricData,
     uow: unit_of_work.AbstractUnitOfWork,
     ldr: src.services.load_data_exchange.common.AbstractLoadDataRetriever,
+    historic_data: Optional[dict[tuple[str, Measurand], pd.DataFrame]] = None,
 ):
     with uow:
-
-        def get_historic_load_data(malo: MarketLocation):
-            result = None
-            try:
-                df = ldr.get_data(malo.number, malo.measurand)
-                result = model.HistoricLoadData(df=df)
-            except Exception as exc:
-                logger.error("Could not get historic data for market_location %s", malo)
-                logger.error(exc)
-            return result
-
         location: model.Location = uow.locations.get(UUID(cmd.location_id))
+        market_locations = _market_locations_with_historic_data(location)
+        if historic_data is None:
+            historic_data = ldr.get_bulk_data((malo.number, malo.measurand) for malo in market_locations)
 
-        if (hld := get_historic_load_data(location.residual_short)) is not None:
-            location.residual_short.historic_load_data = hld
-
-        if location.has_production:
-            if (hld := get_historic_load_data(location.residual_long)) is not None:
-                location.residual_long.historic_load_data = hld
-
-        for producer in location.producers:
-            if (hld := get_historic_load_data(producer.market_location)) is not None:
-                producer.market_location.historic_load_data = hld
+        for malo in market_locations:
+            df = historic_data.get((malo.number, malo.measurand))
+            if df is None:
+                logger.error("Could not get historic data for market_location %s", malo)
+                continue
+            malo.historic_load_data = model.HistoricLoadData(df=df)
 
         uow.locations.update(location)
         uow.commit()
 
 
+def _market_locations_with_historic_data(location: model.Location) -> list[MarketLocation]:
+    market_locations = [location.residual_short]
+    if location.has_production:
+        market_locations.append(location.residual_long)
+    market_locations.extend(producer.market_location for producer in location.producers)
+    return market_locations
+
+
 def calculate_predictions(
     cmd: commands.CalculatePredictions,
     uow: unit_of_work.AbstractUnitOfWork,
@@ -146,14 +151,15 @@ def calculate_predictions(
 
             local_consumption_prediction_df = rf_predictor.get_result()
 
-            location.add_prediction(
-                model.Prediction(
-                    df=DataFrame[TimeSeriesSchema](local_consumption_prediction_df),
-                    type=src.enums.PredictionType.CONSUMPTION,
-                )
+            consumption_prediction = model.Prediction(
+                location_id=location.id,
+                df=DataFrame[TimeSeriesSchema](local_consumption_prediction_df),
+                type=src.enums.PredictionType.CONSUMPTION,
             )
+            uow.predictions.add(consumption_prediction)
 
             # Erzeugungsprognose
+            production_predictions = []
             if location.has_production:
                 for producer in location.producers:
                     data_retriever_config = DATA_RETRIEVER_MAP[producer.prognosis_data_retriever]
@@ -161,137 +167,150 @@ def calculate_predictions(
                     asset_identifier = data_retriever_config.asset_identifier_func(
                         LocationAndProducer(location, producer)
                     )
-                    location.add_prediction(
-                        model.Prediction(
-                            df=DataFrame[TimeSeriesSchema](data_retriever.get_data(
-                                asset_identifier=asset_identifier,
-                                measurand=Measurand.NEGATIVE,
-                                start=datetime.datetime.combine(
-                                    start_date, datetime.time.min, tzinfo=TIMEZONE_BERLIN
-                                ),
-                            )),
-                            type=src.enums.PredictionType.PRODUCTION,
-                            component=producer,
-                        )
+                    production_df = data_retriever.get_data(
+                        asset_identifier=asset_identifier,
+                        measurand=Measurand.NEGATIVE,
+                        start=datetime.datetime.combine(
+                            start_date, datetime.time.min, tzinfo=TIMEZONE_BERLIN
+                        ),
+                    )
+                    production_prediction = model.Prediction(
+                        location_id=location.id,
+                        df=DataFrame[TimeSeriesSchema](production_df),
+                        type=src.enums.PredictionType.PRODUCTION,
+                        component=producer,
+                        download_manifest=list(data_retriever.download_manifest),
                     )
+                    uow.predictions.add(production_prediction)
+                    production_predictions.append(production_prediction)
 
             # Überschuss / Bezug
-            location.calculate_location_residual_loads()
+            for residual_prediction in location.calculate_location_residual_loads(
+                consumption_prediction, production_predictions
+            ):
+                uow.predictions.add(residual_prediction)
         except Exception as exc:
             logger.error(f"Could not create prediction for location {location.alias}")
             logger.error(exc)
 
-        uow.locations.update(location)
         uow.commit()
 
 
 def send_predictions_evt(
     evt: events.PredictionsCreated,
     uow: unit_of_work,
-    dts: data_sender.AbstractDataSender,
 ):
-    send_predictions(commands.SendPredictions(location_id=evt.location_id), uow, dts)
+    send_predictions(commands.SendPredictions(location_id=evt.location_id), uow)
 
 
 def send_predictions(
     cmd: commands.SendPredictions,
     uow: unit_of_work.AbstractUnitOfWork,
-    dts: data_sender.AbstractDataSender,
 ):
     # this only sends data to internal fahrplanmanagement, because impuls requires one single file for all locations
-    # so in case one location was updated, sending jobs for impuls must be triggered additionally
+    # so in case one location was updated, sending jobs for impuls must be triggered additionally.
+    # The mails are only written to the outbox, they are delivered by deliver_outbox
     today = datetime.date.today().strftime("%Y-%m-%d")
     with uow:
         location: model.Location = uow.locations.get(UUID(cmd.location_id))
-        short_prediction_sent = False
+        outbox_messages = []
         if location.settings.send_consumption_predictions_to_fahrplanmanagement:
-            short_prediction = location.get_most_recent_prediction(src.enums.PredictionType.RESIDUAL_SHORT)
-            short_prediction_df = FahrplanmanagementSchema.from_time_series_schema(short_prediction.df, location.residual_short.number)
+            short_prediction = uow.predictions.latest(location.id, src.enums.PredictionType.RESIDUAL_SHORT)
             if short_prediction:
-                short_prediction_sent = dts.send_to_internal_fahrplanmanagement(
-                    data=short_prediction_df,
-                    file_name=f"{location.residual_short.number}_{location.alias if location.alias else ''}_residual_short_{today}.csv",
-                    recipient=settings.mail_recipient_cons
-                )
-                if short_prediction_sent:
-                    short_prediction.shipments.append(
-                        model.PredictionShipment(receiver=enums.PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT)
+                outbox_messages.append(
+                    model.OutboxMessage(
+                        channel=enums.OutboxChannel.FAHRPLANMANAGEMENT_EMAIL,
+                        df=FahrplanmanagementSchema.from_time_series_schema(short_prediction.df, location.residual_short.number),
+                        file_name=f"{location.residual_short.number}_{location.alias if location.alias else ''}_residual_short_{today}.csv",
+                        recipient=settings.mail_recipient_cons,
+                        prediction_ids=[short_prediction.id],
                     )
+                )
 
         if location.has_production:
-            long_prediction = location.get_most_recent_prediction(src.enums.PredictionType.RESIDUAL_LONG)
-            long_prediction_df = FahrplanmanagementSchema.from_time_series_schema(long_prediction.df, location.residual_long.number)
+            long_prediction = uow.predictions.latest(location.id, src.enums.PredictionType.RESIDUAL_LONG)
             if long_prediction:
-                long_prediction_sent = dts.send_to_internal_fahrplanmanagement(
-                    data=long_prediction_df,
-                    file_name=f"{location.residual_long.number}_{location.alias if location.alias else ''}_residual_long_{today}.csv",
-                    recipient=settings.mail_recipient_prod
-                )
-                if long_prediction_sent:
-                    long_prediction.shipments.append(
-                        model.PredictionShipment(receiver=enums.PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT)
+                outbox_messages.append(
+                    model.OutboxMessage(
+                        channel=enums.OutboxChannel.FAHRPLANMANAGEMENT_EMAIL,
+                        df=FahrplanmanagementSchema.from_time_series_schema(long_prediction.df, location.residual_long.number),
+                        file_name=f"{location.residual_long.number}_{location.alias if location.alias else ''}_residual_long_{today}.csv",
+                        recipient=settings.mail_recipient_prod,
+                        prediction_ids=[long_prediction.id],
                     )
+                )
 
-        # if residuals where successfully sent, also mark the consumption and production predictions as sent because
+        # once residuals are delivered, also mark the consumption and production predictions as sent because
         # they are the base for computing the residuals.
         # This is necessary, because for sending own consumption data to impuls we need to compute own consumption
         # based on consumption and production predictions that where used to compute the residuals that where sent to
         # internal fahrplanmanagement.
         # This is not the perfect model, maybe it would be better to store input predictions on residuals.
 
-        consumption_prediction = location.get_most_recent_prediction(src.enums.PredictionType.CONSUMPTION)
-        production_prediction = location.get_most_recent_prediction(src.enums.PredictionType.PRODUCTION)
-        if not location.has_production:
-            if short_prediction_sent:
-                consumption_prediction.shipments.append(
-                    model.PredictionShipment(receiver=enums.PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT)
-                )
-        else:
-            if short_prediction_sent or long_prediction_sent:
+        input_predictions = []
+        if outbox_messages:
+            input_predictions.append(uow.predictions.latest(location.id, src.enums.PredictionType.CONSUMPTION))
+            if location.has_production:
                 # both residual_short and residual_long use consumption and production predictions as input
-                consumption_prediction.shipments.append(
-                    model.PredictionShipment(receiver=enums.PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT)
-                )
-                production_prediction.shipments.append(
-                    model.PredictionShipment(receiver=enums.PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT)
-                )
-        uow.locations.update(location)
+                input_predictions.append(uow.predictions.latest(location.id, src.enums.PredictionType.PRODUCTION))
+        batch_id = uuid.uuid4()
+        for outbox_message in outbox_messages:
+            outbox_message.prediction_ids.extend(p.id for p in input_predictions if p is not None)
+            outbox_message.batch_id = batch_id
+            uow.outbox.add(outbox_message)
         uow.commit()
 
 
 def send_eigenverbrauchs_predictions_to_impuls_energy_trading(
     cmd: commands.SendAllEigenverbrauchsPredictionsToImpuls,
     uow: unit_of_work.AbstractUnitOfWork,
-    dts: data_sender.AbstractDataSender
 ):
-    predictions: [DataFrame[TimeSeriesSchema]] = []
     with uow:
-        locations: [model.Location] = uow.locations.get_all()
+        locations = uow.impuls_energy_trading_locations.list()
         mandatory_previous_receivers, sent_before = _query_params_for_impuls_predictions(
             cmd.send_even_if_not_sent_to_internal_fahrplanmanagement
         )
+        location_ids = [location.location_id for location in locations]
+        consumption_predictions = uow.predictions.latest_for_locations(
+            location_ids, PredictionType.CONSUMPTION, receiver=mandatory_previous_receivers, sent_before=sent_before
+        )
+        production_predictions = uow.predictions.latest_for_locations(
+            location_ids, PredictionType.PRODUCTION, receiver=mandatory_previous_receivers, sent_before=sent_before
+        )
 
+        valid_locations = []
         for location in locations:
-            if not _location_is_assigned_to_impuls(location):
-                continue
-            prediction = location.get_predicted_own_consumption(
-                mandatory_previous_receivers=mandatory_previous_receivers,
-                sent_before=sent_before,
-            )
-            if prediction is None:
+            if location.location_id not in consumption_predictions or location.location_id not in production_predictions:
                 logger.error(f"Could not get valid own consumption prediction for location {location.alias}")
                 continue
-            prediction.rename(columns={"value": str(location.residual_long.id)}, inplace=True)
-            predictions.append(prediction)
-        for date, daily_df in _get_daily_dfs_from_predictions(predictions).items():
-            dts.send_eigenverbrauch_to_impuls_energy_trading(daily_df, prediction_date=date)
+            valid_locations.append(location)
+
+        # own consumption of all locations at once, on the grid the daily files are built from
+        dates = _dates_in_prognosis_horizon_impuls_energy_trading()
+        grid = _grid_for_impuls_energy_trading(dates)
+        production_dfs = [production_predictions[location.location_id].df for location in valid_locations]
+        own_consumption = model.get_predicted_own_consumptions(
+            _align_to_grid(grid, [consumption_predictions[location.location_id].df for location in valid_locations]),
+            _align_to_grid(grid, production_dfs),
+            production_covered=_covered_by_grid(grid, production_dfs),
+        )
+        columns = [str(location.residual_long_id) for location in valid_locations]
+        batch_id = uuid.uuid4()
+        for date, daily_df in _get_daily_dfs_from_grid(dates, grid, own_consumption, columns).items():
+            uow.outbox.add(
+                model.OutboxMessage(
+                    channel=enums.OutboxChannel.IMPULS_EIGENVERBRAUCH_SFTP,
+                    df=daily_df,
+                    prediction_date=date,
+                    batch_id=batch_id,
+                )
+            )
         uow.commit()
 
 
 def send_residual_long_predictions_to_impuls_energy_trading(
     cmd: commands.SendAllEigenverbrauchsPredictionsToImpuls,
     uow: unit_of_work.AbstractUnitOfWork,
-    dts: data_sender.AbstractDataSender
 ):
     with uow:
         predictions = _get_predictions_for_impuls_energy_trading(
@@ -300,33 +319,77 @@ def send_residual_long_predictions_to_impuls_energy_trading(
             cmd.send_even_if_not_sent_to_internal_fahrplanmanagement,
         )
 
-        for date, daily_df in _get_daily_dfs_from_predictions(predictions).items():
-            dts.send_residual_long_to_impuls_energy_trading(daily_df, prediction_date=date)
+        prediction_ids = [prediction.id for prediction, _ in predictions]
+        batch_id = uuid.uuid4()
+        for date, daily_df in _get_daily_dfs_from_predictions([df for _, df in predictions]).items():
+            uow.outbox.add(
+                model.OutboxMessage(
+                    channel=enums.OutboxChannel.IMPULS_RESIDUAL_LONG_SFTP,
+                    df=daily_df,
+                    prediction_date=date,
+                    prediction_ids=list(prediction_ids),
+                    batch_id=batch_id,
+                )
+            )
         uow.commit()
 
 
-def _location_is_assigned_to_impuls(location: model.Location) -> bool:
-    return location.has_production and any(p.prognosis_data_retriever == DataRetriever.IMPULS_ENERGY_TRADING_SFTP for p in location.producers)
-
-
 def _get_daily_dfs_from_predictions(
         predictions: [DataFrame[TimeSeriesSchema]]
 ) -> OrderedDict[datetime.date, DataFrame[IetLoadDataSchema]]:
-    df = pd.concat(predictions, axis=1)
-    df = df.tz_convert(TIMEZONE_UTC)
-    df.index.name = "#timestamp"
-    df = df.div(1000)  # convert from kW to MW
-    df = df.round(3)  # todo clarify for which unit the 3 digits rule applies
-    dfs_by_day = split_df_by_day(df, TIMEZONE_FILENAMES)
+    dates = _dates_in_prognosis_horizon_impuls_energy_trading()
+    grid = _grid_for_impuls_energy_trading(dates)
+    columns = [prediction.columns[0] for prediction in predictions]
+    return _get_daily_dfs_from_grid(dates, grid, _align_to_grid(grid, predictions), columns)
+
+
+def _grid_for_impuls_energy_trading(dates: list[datetime.date]) -> pd.DatetimeIndex:
+    horizon_end = _day_start_impuls_energy_trading(dates[-1] + datetime.timedelta(days=1))
+    return pd.date_range(
+        _day_start_impuls_energy_trading(dates[0]), horizon_end, freq="15min", inclusive="left", name="#timestamp"
+    )
+
+
+def _day_start_impuls_energy_trading(date: datetime.date) -> pd.Timestamp:
+    return pd.Timestamp(
+        datetime.datetime.combine(date, datetime.time.min, tzinfo=TIMEZONE_FILENAMES)
+    ).tz_convert(TIMEZONE_UTC)
+
+
+def _align_to_grid(grid: pd.DatetimeIndex, dfs: list[DataFrame[TimeSeriesSchema]]) -> np.ndarray:
+    # one column per frame, values are written by their position on the grid, timestamps off the grid are dropped
+    values = np.full((len(grid), len(dfs)), np.nan)
+    for i, df in enumerate(dfs):
+        positions = grid.get_indexer(df.index)
+        on_grid = positions >= 0
+        values[positions[on_grid], i] = df.iloc[:, 0].to_numpy(dtype=float)[on_grid]
+    return values
+
 
+def _covered_by_grid(grid: pd.DatetimeIndex, dfs: list[DataFrame[TimeSeriesSchema]]) -> np.ndarray:
+    # whether the frames have a row for the timestamps of the grid, regardless of their values
+    covered = np.zeros((len(grid), len(dfs)), dtype=bool)
+    for i, df in enumerate(dfs):
+        positions = grid.get_indexer(df.index)
+        covered[positions[positions >= 0], i] = True
+    return covered
+
+
+def _get_daily_dfs_from_grid(
+    dates: list[datetime.date], grid: pd.DatetimeIndex, values: np.ndarray, columns: list[str]
+) -> OrderedDict[datetime.date, DataFrame[IetLoadDataSchema]]:
+    values = np.round(values / 1000, 3)  # convert from kW to MW, todo clarify for which unit the 3 digits rule applies
+    dfs_by_day = split_df_by_day(pd.DataFrame(values, index=grid, columns=columns), TIMEZONE_FILENAMES)
     daily_dfs = OrderedDict()
-    for date in _dates_in_prognosis_horizon_impuls_energy_trading():
+    for date in dates:
         daily_df = dfs_by_day.get(date)
-        if daily_df is None:
+        # only the empty rows before the first and after the last value of the day are left out, gaps within the
+        # day are kept as missing values, which the schema rejects instead of silently shipping an incomplete day
+        with_data = np.flatnonzero(daily_df.notna().any(axis=1)) if daily_df is not None else []
+        if len(with_data) == 0:
             logger.error(f"Found no data for date {date} to send to Impuls Energy Trading")
             continue
-        daily_df = DataFrame[IetLoadDataSchema](daily_df)
-        daily_dfs[date] = daily_df
+        daily_dfs[date] = DataFrame[IetLoadDataSchema](daily_df.iloc[with_data[0]:with_data[-1] + 1])
     return daily_dfs
 
 
@@ -342,34 +405,27 @@ def _get_predictions_for_impuls_energy_trading(
     uow: unit_of_work.AbstractUnitOfWork,
     prediction_type: PredictionType,
     send_even_if_not_sent_to_internal_fahrplanmanagement: bool = False,
-) -> [DataFrame[TimeSeriesSchema]]:
-    predictions: [DataFrame[TimeSeriesSchema]] = []
-    locations: [model.Location] = uow.locations.get_all()
+) -> list[tuple[model.Prediction, DataFrame[TimeSeriesSchema]]]:
+    predictions: list[tuple[model.Prediction, DataFrame[TimeSeriesSchema]]] = []
+    locations = uow.impuls_energy_trading_locations.list()
+    mandatory_previous_receivers, sent_before = _query_params_for_impuls_predictions(
+        send_even_if_not_sent_to_internal_fahrplanmanagement
+    )
+    latest_predictions = uow.predictions.latest_for_locations(
+        [location.location_id for location in locations],
+        prediction_type,
+        receiver=mandatory_previous_receivers,
+        sent_before=sent_before,
+    )
     for location in locations:
-        if not _location_is_assigned_to_impuls(location):
-            continue
-        mandatory_previous_receivers, sent_before = _query_params_for_impuls_predictions(
-            send_even_if_not_sent_to_internal_fahrplanmanagement
-        )
-
-        prediction = location.get_most_recent_prediction(
-            prediction_type=prediction_type,
-            receiver=mandatory_previous_receivers,
-            sent_before=sent_before,
-        )
+        prediction = latest_predictions.get(location.location_id)
         if prediction is None:
             logger.error(f"Could not get valid prediction for location {location.alias}")
             continue
-        prediction.shipments.append(
-            PredictionShipment(
-                receiver=enums.PredictionReceiver.IMPULS_ENERGY_TRADING
-            )
-        )
-        uow.locations.update(location)
         df = prediction.df.copy()
         TimeSeriesSchema.validate(df)
-        df.columns = [str(location.residual_long.id)]
-        predictions.append(df)
+        df.columns = [str(location.residual_long_id)]
+        predictions.append((prediction, df))
     return predictions
 
 
@@ -461,6 +517,155 @@ def update_location_settings(
         return location
 
 
+def archive_predictions(cmd: commands.ArchivePredictions, uow: unit_of_work.AbstractUnitOfWork):
+    if not settings.prediction_archive_path:
+        logger.warning("Not archiving predictions, no prediction archive is configured")
+        return 0
+    older_than_days = cmd.older_than_days if cmd.older_than_days is not None else settings.prediction_archive_after_days
+    created_before = utc_now() - datetime.timedelta(days=older_than_days)
+    archived = 0
+    # archive in batches, each in its own transaction
+    while True:
+        with uow:
+            if not uow.try_lock("archive_predictions"):
+                logger.info("Not archiving predictions, another process is archiving them")
+                break
+            archived_in_batch = uow.predictions.archive(created_before)
+            uow.commit()
+        if not archived_in_batch:
+            break
+        archived += archived_in_batch
+    logger.info(f"Archived {archived} predictions created before {created_before}")
+    return archived
+
+
+OUTBOX_CHANNEL_RECEIVERS = {
+    enums.OutboxChannel.FAHRPLANMANAGEMENT_EMAIL: enums.PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT,
+    enums.OutboxChannel.IMPULS_EIGENVERBRAUCH_SFTP: enums.PredictionReceiver.IMPULS_ENERGY_TRADING,
+    enums.OutboxChannel.IMPULS_RESIDUAL_LONG_SFTP: enums.PredictionReceiver.IMPULS_ENERGY_TRADING,
+}
+
+
+def deliver_outbox(
+    cmd: commands.DeliverOutbox,
+    uow: unit_of_work.AbstractUnitOfWork,
+    dts: data_sender.AbstractDataSender,
+) -> int:
+    with uow:
+        outbox_messages = uow.outbox.pending(max_attempts=settings.outbox_max_attempts, limit=settings.outbox_batch_size)
+        errors = _deliver_outbox_messages(outbox_messages, dts)
+
+        for outbox_message, error in zip(outbox_messages, errors):
+            if error is not None:
+                outbox_message.attempts += 1
+                outbox_message.last_error = error
+                if outbox_message.attempts >= settings.outbox_max_attempts:
+                    logger.error(f"Giving up delivering {outbox_message.channel.value} message {outbox_message.id}: {error}")
+                    outbox_message.dead_lettered = utc_now()
+            else:
+                outbox_message.delivered = utc_now()
+            uow.outbox.update(outbox_message)
+
+        # the predictions of a batch, like the residuals in all daily files, are only shipped once every message of
+        # the batch was delivered, which may take several runs. Batches with dead letters are never complete
+        shipments = {}  # residuals and their input predictions are part of several messages
+        for batch in uow.outbox.delivered_batches(limit=settings.outbox_batch_size):
+            for outbox_message in batch:
+                receiver = OUTBOX_CHANNEL_RECEIVERS[outbox_message.channel]
+                for prediction_id in outbox_message.prediction_ids:
+                    shipments.setdefault((prediction_id, receiver), PredictionShipment(receiver=receiver))
+                uow.outbox.delete(outbox_message.id)
+        uow.predictions.add_shipments([(prediction_id, shipment) for (prediction_id, _), shipment in shipments.items()])
+        dead_lettered_before = utc_now() - datetime.timedelta(days=settings.outbox_dead_letter_retention_days)
+        if deleted := uow.outbox.delete_dead_letters(dead_lettered_before):
+            logger.warning(f"Deleted {deleted} undelivered outbox messages dead-lettered before {dead_lettered_before}")
+        uow.commit()
+    return errors.count(None)
+
+
+def _deliver_outbox_messages(
+    outbox_messages: list[model.OutboxMessage], dts: data_sender.AbstractDataSender
+) -> list[Optional[str]]:
+    # receivers are delivered concurrently, the messages of one receiver over a shared session
+    errors: list[Optional[str]] = [None] * len(outbox_messages)
+    positions_by_receiver = defaultdict(list)
+    for i, outbox_message in enumerate(outbox_messages):
+        positions_by_receiver[OUTBOX_CHANNEL_RECEIVERS[outbox_message.channel]].append(i)
+
+    def deliver(receiver: enums.PredictionReceiver, positions: list[int]):
+        deliver_messages = OUTBOX_RECEIVER_DELIVERIES[receiver]
+        for i, error in zip(positions, deliver_messages([outbox_messages[i] for i in positions], dts)):
+            errors[i] = error
+
+    with ThreadPoolExecutor(max_workers=max(len(positions_by_receiver), 1)) as executor:
+        list(executor.map(deliver, positions_by_receiver.keys(), positions_by_receiver.values()))
+    return errors
+
+
+def _deliver_fahrplanmanagement_emails(
+    outbox_messages: list[model.OutboxMessage], dts: data_sender.AbstractDataSender
+) -> list[Optional[str]]:
+    # the files for one recipient may be consolidated into few emails, each file is still tracked by its own message
+    errors: list[Optional[str]] = [None] * len(outbox_messages)
+    positions_by_recipient = defaultdict(list)
+    for i, outbox_message in enumerate(outbox_messages):
+        positions_by_recipient[outbox_message.recipient].append(i)
+    with dts.fahrplanmanagement_session():
+        for recipient, positions in positions_by_recipient.items():
+            try:
+                sent = dts.send_all_to_internal_fahrplanmanagement(
+                    [(outbox_messages[i].file_name, outbox_messages[i].df) for i in positions], recipient
+                )
+            except Exception as exc:
+                logger.error(f"Could not deliver emails to {recipient}")
+                logger.error(exc)
+                for i in positions:
+                    errors[i] = repr(exc)
+                continue
+            # unlike the sftp senders, the email sender reports failures by its result
+            for i, file_sent in zip(positions, sent):
+                if not file_sent:
+                    errors[i] = "email was not sent"
+    return errors
+
+
+def _deliver_impuls_energy_trading_files(
+    outbox_messages: list[model.OutboxMessage], dts: data_sender.AbstractDataSender
+) -> list[Optional[str]]:
+    # the daily files of both channels are uploaded in batches over one session
+    errors: list[Optional[str]] = [None] * len(outbox_messages)
+    positions_by_channel = defaultdict(list)
+    for i, outbox_message in enumerate(outbox_messages):
+        positions_by_channel[outbox_message.channel].append(i)
+    send_all = {
+        enums.OutboxChannel.IMPULS_EIGENVERBRAUCH_SFTP: dts.send_all_eigenverbrauch_to_impuls_energy_trading,
+        enums.OutboxChannel.IMPULS_RESIDUAL_LONG_SFTP: dts.send_all_residual_long_to_impuls_energy_trading,
+    }
+    try:
+        with dts.impuls_energy_trading_session():
+            for channel, positions in positions_by_channel.items():
+                channel_errors = send_all[channel](
+                    [(outbox_messages[i].df, outbox_messages[i].prediction_date) for i in positions]
+                )
+                for i, error in zip(positions, channel_errors):
+                    if error is not None:
+                        logger.error(f"Could not deliver {channel.value} message {outbox_messages[i].id}")
+                        logger.error(error)
+                        errors[i] = repr(error)
+    except Exception as exc:
+        # the session could not be opened, uploads are idempotent so every file is retried
+        logger.error("Could not open a session to deliver files to impuls energy trading")
+        logger.error(exc)
+        errors = [repr(exc)] * len(outbox_messages)
+    return errors
+
+
+OUTBOX_RECEIVER_DELIVERIES = {
+    enums.PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT: _deliver_fahrplanmanagement_emails,
+    enums.PredictionReceiver.IMPULS_ENERGY_TRADING: _deliver_impuls_energy_trading_files,
+}
+
+
 EVENT_HANDLERS = {
     events.PredictionsCreated: [send_predictions_evt]
 }
@@ -474,4 +679,6 @@ COMMAND_HANDLERS = {
     commands.UpdatePredictAll: update_and_predict_all,
     commands.SendAllEigenverbrauchsPredictionsToImpuls: send_eigenverbrauchs_predictions_to_impuls_energy_trading,
     commands.SendAllResidualLongPredictionsToImpuls: send_residual_long_predictions_to_impuls_energy_trading,
+    commands.ArchivePredictions: archive_predictions,
+    commands.DeliverOutbox: deliver_outbox,
 }
@@ -3,14 +3,17 @@ from __future__ import annotations
 import abc
 import logging
 import uuid
+import numpy as np
 import pandas as pd
 from datetime import datetime, date, time
-from typing import Optional
+from typing import Iterable, Optional
 from dataclasses import dataclass, field
 
 from pandera.typing import DataFrame
 
-from src.enums import Measurand, DataRetriever, PredictionType, State, PredictionReceiver, TransmissionSystemOperator
+from src.enums import Measurand, DataRetriever, PredictionType, State, PredictionReceiver, TransmissionSystemOperator, \
+    OutboxChannel
+from src.utils.aligned_time_series import align_time_series, positions_in_date_range, trim_to_valid, to_time_series
 from src.utils.dataframe_schemas import TimeSeriesSchema
 from src.utils.timezone import utc_now
 
@@ -61,37 +64,16 @@ class Location(AggregateRoot):
     producers: list[Producer] = field(default_factory=list)
     residual_long: Optional[MarketLocation] = None
     residual_short: MarketLocation
-    predictions: list[Prediction] = field(default_factory=list)
 
     @property
     def has_production(self):
         return self.producers and len(self.producers) > 0
 
-    def get_most_recent_prediction(
-        self,
-        prediction_type,
-        receiver: Optional[PredictionReceiver]=None,
-        sent_before: Optional[time] = None,
-        component: Optional[Component] = None
-    ) -> Optional[Prediction]:
-        sorted_predictions = (p for p in sorted(self.predictions, reverse=True) if p.type == prediction_type)
-        if component:
-            sorted_predictions = filter(lambda prediction: prediction.component == component, sorted_predictions)
-
-        if not receiver and not sent_before:
-            return next(sorted_predictions, None)
-
-        for prediction in sorted_predictions:
-            shipments = prediction.shipments
-            if receiver:
-                shipments = filter(lambda shipment: receiver == shipment.receiver, shipments)
-            if sent_before:
-                if sent_before.tzinfo is None:
-                    raise ValueError("<sent_before> must have a timezone")
-                shipments = filter(lambda shipment: shipment.created.astimezone(sent_before.tzinfo).time().replace(tzinfo=sent_before.tzinfo) < sent_before, shipments)
-            if any(shipments):
-                return prediction
-        return None
+    @property
+    def is_assigned_to_impuls_energy_trading(self) -> bool:
+        return bool(self.has_production) and any(
+            p.prognosis_data_retriever == DataRetriever.IMPULS_ENERGY_TRADING_SFTP for p in self.producers
+        )
 
     def calculate_local_consumption(self):
         if not self.has_production:
@@ -99,59 +81,47 @@ class Location(AggregateRoot):
                 return None
                 # self.events.append(events.MissingData())
             return self.residual_short.historic_load_data.df
-        return (
-            sum(p.market_location.historic_load_data.df for p in self.producers)
-            - self.residual_long.historic_load_data.df
-            + self.residual_short.historic_load_data.df
-        )
-
-    def calculate_location_residual_loads(self):
+        index, values, dtype = align_time_series([
+            *(p.market_location.historic_load_data.df for p in self.producers),
+            self.residual_long.historic_load_data.df,
+            self.residual_short.historic_load_data.df,
+        ])
+        production = sum(values[:, i] for i in range(len(self.producers)))
+        return to_time_series(index, production - values[:, -2] + values[:, -1], dtype)
+
+    def calculate_location_residual_loads(
+        self,
+        consumption_prediction: Prediction,
+        production_predictions: list[Prediction],
+    ) -> list[Prediction]:
         # todo cut prognosis df, so that it starts at prognosis horizon (next day)
-        total_consumption_df = self.get_most_recent_prediction(PredictionType.CONSUMPTION).df
+        # the predictions are aligned once, the residuals are computed on the aligned arrays
+        dfs = [consumption_prediction.df]
         if self.has_production:
-            total_production_df = sum(
-                self.get_most_recent_prediction(PredictionType.PRODUCTION, component=p).df for p in self.producers
-            )
-
-        def clip_to_time_range(df: pd.DataFrame) -> pd.DataFrame:
-            return df[
-                (df.index.date >= self.settings.active_from)
-                & (
-                    df.index.date < self.settings.active_until
-                    if self.settings.active_until
-                    else True
-                )
-            ]
-
-        short_prediction_df = (
-            total_consumption_df - total_production_df
-            if self.has_production
-            else total_consumption_df
-        )
-        short_prediction_df[short_prediction_df < 0] = 0
-        short_prediction_df = clip_to_time_range(short_prediction_df)
-        short_prediction_df = short_prediction_df[
-            short_prediction_df.first_valid_index():short_prediction_df.last_valid_index()
-        ]
-        self.predictions.append(
-            Prediction(df=DataFrame[TimeSeriesSchema](short_prediction_df), type=PredictionType.RESIDUAL_SHORT)
-        )
-
+            dfs.extend(p.df for p in production_predictions)
+        index, values, dtype = align_time_series(dfs)
+        total_consumption = values[:, 0]
+        residuals = [(PredictionType.RESIDUAL_SHORT, total_consumption)]
         if self.has_production:
-            long_prediction_df = total_production_df - total_consumption_df
-            long_prediction_df[long_prediction_df < 0] = 0
-            long_prediction_df = clip_to_time_range(long_prediction_df)
-            long_prediction_df = long_prediction_df[
-                long_prediction_df.first_valid_index():long_prediction_df.last_valid_index()
+            total_production = sum(values[:, i] for i in range(1, values.shape[1]))
+            residuals = [
+                (PredictionType.RESIDUAL_SHORT, total_consumption - total_production),
+                (PredictionType.RESIDUAL_LONG, total_production - total_consumption),
             ]
-            self.predictions.append(
-                Prediction(df=DataFrame[TimeSeriesSchema](long_prediction_df), type=PredictionType.RESIDUAL_LONG)
-            )
-        # self.events.append(events.PredictionsCreated(location_id=str(self.id)))  # leads to send out predictions
 
-    def add_prediction(self, prediction: Prediction):
-        self.predictions.append(prediction)
-        # self.events.append(events.PredictionAdded(location_id=str(self.id)))
+        in_time_range = positions_in_date_range(index, self.settings.active_from, self.settings.active_until)
+        residual_predictions = []
+        for prediction_type, residual in residuals:
+            residual = np.where(residual < 0, 0, residual)
+            residual_index, residual = trim_to_valid(index[in_time_range], residual[in_time_range])
+            residual_predictions.append(
+                Prediction(
+                    location_id=self.id,
+                    df=DataFrame[TimeSeriesSchema](to_time_series(residual_index, residual, dtype)),
+                    type=prediction_type,
+                )
+            )
+        return residual_predictions
 
     def add_component(
         self, component: Component
@@ -163,39 +133,15 @@ class Location(AggregateRoot):
             if not self.producers:
                 self.producers.append(component)
 
-    def delete_oldest_predictions(self, keep: int = 3, type: PredictionType = None):
-        predictions = self.predictions
-
-        if type:
-            predictions = [p for p in self.predictions if p.type == type]
-
-        predictions_to_remove = sorted(predictions, reverse=True)[keep:]
-        self.predictions = [
-            p for p in self.predictions if p not in predictions_to_remove
-        ]
-
     def get_predicted_own_consumption(
         self,
-        mandatory_previous_receivers: Optional[PredictionReceiver] = None,
-        sent_before: Optional[time] = None
+        consumption_prediction: Optional[Prediction],
+        production_prediction: Optional[Prediction],
     ):
         if not self.has_production:
             logger.warning("Location has no production, cannot calculate own consumption")
             return None
-        consumption_prediction = self.get_most_recent_prediction(
-            prediction_type=PredictionType.CONSUMPTION,
-            receiver=mandatory_previous_receivers,
-            sent_before=sent_before,
-        )
-        production_prediction = self.get_most_recent_prediction(
-            prediction_type=PredictionType.PRODUCTION,
-            receiver=mandatory_previous_receivers,
-            sent_before=sent_before,
-        )
-        if consumption_prediction and production_prediction:
-            df = consumption_prediction.df.clip(upper=production_prediction.df)
-            return DataFrame[TimeSeriesSchema](df[df.first_valid_index(): df.last_valid_index()])
-        return None
+        return get_predicted_own_consumption(consumption_prediction, production_prediction)
 
 
 @dataclass(kw_only=True)
@@ -237,13 +183,16 @@ class HistoricLoadData(Entity):
 
 
 @dataclass(kw_only=True)
-class Prediction(Entity):
-    __hash__ = Entity.__hash__
+class Prediction(AggregateRoot):
+    # predictions are append-only, only their shipments are added after creation
+    __hash__ = AggregateRoot.__hash__
+    location_id: Optional[uuid.UUID] = None
     created: datetime = field(default_factory=utc_now)  # this default is only used for newly created predictions in memory, value will be overwritten with current datetime when saved to database
     df: DataFrame[TimeSeriesSchema]
     type: PredictionType
     shipments: list[PredictionShipment] = field(default_factory=list)
     component: Optional[Component] = None
+    download_manifest: list[DownloadedFile] = field(default_factory=list)  # remote files the prediction was built from
 
     def __eq__(self, other):
         return self.id == other.id
@@ -252,6 +201,15 @@ class Prediction(Entity):
         return self.created > other.created
 
 
+@dataclass(kw_only=True, frozen=True)
+class DownloadedFile(ValueObject):
+    file_name: str
+    size: int  # bytes
+    duration: float  # seconds spent downloading, 0 if the file came from the local cache
+    from_cache: bool
+    used: bool = True  # False if all of its rows were overwritten by newer files
+
+
 @dataclass(kw_only=True)
 class PredictionShipment(Entity):
     created: datetime = field(default_factory=utc_now)
@@ -264,6 +222,91 @@ class PredictionShipment(Entity):
         return self.created > other.created
 
 
+@dataclass(kw_only=True)
+class OutboxMessage(Entity):
+    # a prediction file to be delivered, written in the transaction that decided to send it. The outbox worker
+    # delivers it and records shipments for <prediction_ids> once every message of its batch was delivered
+    __hash__ = Entity.__hash__
+    created: datetime = field(default_factory=utc_now)
+    channel: OutboxChannel
+    df: pd.DataFrame
+    file_name: Optional[str] = None  # fahrplanmanagement mails only
+    recipient: Optional[str] = None  # fahrplanmanagement mails only
+    prediction_date: Optional[date] = None  # impuls files only
+    prediction_ids: list[uuid.UUID] = field(default_factory=list)
+    batch_id: uuid.UUID = field(default_factory=uuid.uuid4)  # shared by the messages written together
+    attempts: int = 0  # failed deliveries
+    last_error: Optional[str] = None
+    dead_lettered: Optional[datetime] = None  # when the delivery was given up, kept for inspection until cleaned up
+    delivered: Optional[datetime] = None  # kept until the rest of the batch is delivered
+
+    def __eq__(self, other):
+        return self.id == other.id
+
+
+def get_most_recent_prediction(
+    predictions: Iterable[Prediction],
+    prediction_type: PredictionType,
+    receiver: Optional[PredictionReceiver] = None,
+    sent_before: Optional[time] = None,
+    component: Optional[Component] = None
+) -> Optional[Prediction]:
+    sorted_predictions = (p for p in sorted(predictions, reverse=True) if p.type == prediction_type)
+    if component:
+        sorted_predictions = filter(lambda prediction: prediction.component == component, sorted_predictions)
+
+    if not receiver and not sent_before:
+        return next(sorted_predictions, None)
+
+    for prediction in sorted_predictions:
+        if has_matching_shipment(prediction.shipments, receiver, sent_before):
+            return prediction
+    return None
+
+
+def get_predicted_own_consumption(
+    consumption_prediction: Optional[Prediction],
+    production_prediction: Optional[Prediction],
+) -> Optional[DataFrame[TimeSeriesSchema]]:
+    # own consumption of a location with production, which is the consumption as far as it is covered by production
+    if consumption_prediction and production_prediction:
+        df = consumption_prediction.df.clip(upper=production_prediction.df)
+        return DataFrame[TimeSeriesSchema](df[df.first_valid_index(): df.last_valid_index()])
+    return None
+
+
+def get_predicted_own_consumptions(
+    consumption: np.ndarray,
+    production: np.ndarray,
+    production_covered: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    own consumption of several locations at once, from consumption and production aligned on the same grid
+    with one column per location. Like clip in get_predicted_own_consumption, a missing production value doesn't
+    limit the consumption, but own consumption is missing where the production prediction has no timestamp at all,
+    as given by <production_covered>. Trimming to the valid range isn't needed, on a grid the values outside of it
+    are missing anyway
+    """
+    own_consumption = np.where(np.isnan(production), consumption, np.minimum(consumption, production))
+    if production_covered is not None:
+        own_consumption[~production_covered] = np.nan
+    return own_consumption
+
+
+def has_matching_shipment(
+    shipments: Iterable[PredictionShipment],
+    receiver: Optional[PredictionReceiver] = None,
+    sent_before: Optional[time] = None,
+) -> bool:
+    if receiver:
+        shipments = filter(lambda shipment: receiver == shipment.receiver, shipments)
+    if sent_before:
+        if sent_before.tzinfo is None:
+            raise ValueError("<sent_before> must have a timezone")
+        shipments = filter(lambda shipment: shipment.created.astimezone(sent_before.tzinfo).time().replace(tzinfo=sent_before.tzinfo) < sent_before, shipments)
+    return any(shipments)
+
+
 # value_object
 @dataclass
 class PredictionSettings:
@@ -51,6 +51,12 @@ class PredictionReceiver(str, Enum):
     IMPULS_ENERGY_TRADING = "impuls_energy_trading"
 
 
+class OutboxChannel(str, Enum):
+    FAHRPLANMANAGEMENT_EMAIL = "fahrplanmanagement_email"
+    IMPULS_EIGENVERBRAUCH_SFTP = "impuls_eigenverbrauch_sftp"
+    IMPULS_RESIDUAL_LONG_SFTP = "impuls_residual_long_sftp"
+
+
 class TransmissionSystemOperator(str, Enum):
     HERTZ = "50hzt"
     AMPRION = "amprion"
@@ -48,6 +48,13 @@ class MessageBus:
             for event_type, event_handlers in EVENT_HANDLERS.items()
         }
 
+    def with_fresh_unit_of_work(self) -> MessageBus:
+        # a separate bus, not the shared instance, whose messages are handled in their own unit of work and
+        # therefore concurrently to the ones handled by this bus
+        bus = object.__new__(MessageBus)
+        bus.setup(uow=self.uow.fresh(), ldr=self.ldr, dts=self.dts)
+        return bus
+
     def handle(self, message: Message):
         self.queue = [message]
         while self.queue:
@@ -1,16 +1,21 @@
 from __future__ import annotations
 import abc
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm import Session
 from src.config import settings
-from src.persistence import repository
-from src.persistence.sqlalchemy import Location
+from src.persistence import repository, views
+from src.persistence.archive import PredictionArchive
+from src.persistence.sqlalchemy import Location, Prediction, OutboxMessage
 
 
 class AbstractUnitOfWork(abc.ABC):
     historic_load_data: repository.AbstractRepository
     locations: repository.AbstractRepository[Location]
+    predictions: repository.AbstractPredictionRepository
+    latest_predictions: views.AbstractLatestPredictionView
+    impuls_energy_trading_locations: views.AbstractImpulsEnergyTradingLocationView
+    outbox: repository.AbstractOutboxRepository
 
     def __enter__(self) -> AbstractUnitOfWork:
         return self
@@ -21,8 +26,16 @@ class AbstractUnitOfWork(abc.ABC):
     def commit(self):
         self._commit()
 
+    def try_lock(self, name: str) -> bool:
+        # held until the end of the transaction, only one process at a time gets the lock for <name>
+        return True
+
+    def fresh(self) -> AbstractUnitOfWork:
+        # a unit of work on the same storage with its own session, for messages handled concurrently
+        return self
+
     def collect_new_events(self):  # TODO better solution
-        for obj in self.locations.seen:
+        for obj in (*self.locations.seen, *self.predictions.seen):
             while obj.events:
                 yield obj.events.pop(0)
 
@@ -37,7 +50,13 @@ class AbstractUnitOfWork(abc.ABC):
 
 class MemoryUnitOfWork(AbstractUnitOfWork):
     def __init__(self):
-        self.locations = repository.GenericMemoryRepository[Location]({})
+        locations = {}
+        self.locations = repository.GenericMemoryRepository[Location](locations)
+        predictions = {}
+        self.predictions = repository.MemoryPredictionRepository(predictions)
+        self.latest_predictions = views.MemoryLatestPredictionView(predictions)
+        self.impuls_energy_trading_locations = views.MemoryImpulsEnergyTradingLocationView(locations)
+        self.outbox = repository.MemoryOutboxRepository({})
         self.committed = False
 
     def _commit(self):
@@ -54,20 +73,36 @@ class MemoryUnitOfWork(AbstractUnitOfWork):
 DEFAULT_SESSION_FACTORY = {}
 
 
+def default_session_factory() -> sessionmaker:
+    # created on first use and shared, units of work created independently use the same connection pool
+    if settings.db_connection_string not in DEFAULT_SESSION_FACTORY:
+        DEFAULT_SESSION_FACTORY[settings.db_connection_string] = sessionmaker(
+            bind=create_engine(
+                settings.db_connection_string
+            )  # , isolation_level="REPEATABLE READ")
+        )
+    return DEFAULT_SESSION_FACTORY[settings.db_connection_string]
+
+
 class SqlAlchemyUnitOfWork(AbstractUnitOfWork):
     def __init__(self, session_factory=None):
         if session_factory is None:
-            session_factory = sessionmaker(
-                bind=create_engine(
-                    settings.db_connection_string
-                )  # , isolation_level="REPEATABLE READ")
-            )
+            session_factory = default_session_factory()
 
         self.session_factory = session_factory
 
     def __enter__(self):
         self.session = self.session_factory()  # type: Session
         self.locations = repository.LocationRepository(self.session, Location)
+        self.predictions = repository.PredictionRepository(
+            self.session,
+            Prediction,
+            keyframe_interval=settings.prediction_delta_keyframe_interval,
+            archive=PredictionArchive(settings.prediction_archive_path) if settings.prediction_archive_path else None,
+        )
+        self.latest_predictions = views.SqlAlchemyLatestPredictionView(self.session)
+        self.impuls_energy_trading_locations = views.SqlAlchemyImpulsEnergyTradingLocationView(self.session)
+        self.outbox = repository.OutboxRepository(self.session, OutboxMessage)
         return super().__enter__()
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -77,5 +112,15 @@ class SqlAlchemyUnitOfWork(AbstractUnitOfWork):
     def _commit(self):
         self.session.commit()
 
+    def fresh(self) -> SqlAlchemyUnitOfWork:
+        return SqlAlchemyUnitOfWork(self.session_factory)
+
+    def try_lock(self, name: str) -> bool:
+        if self.session.get_bind().dialect.name != "postgresql":
+            return True
+        return self.session.execute(
+            text("SELECT pg_try_advisory_xact_lock(hashtext(:name))"), {"name": name}
+        ).scalar()
+
     def rollback(self):
         self.session.rollback()
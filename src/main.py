@@ -7,8 +7,9 @@ from fastapi.middleware.cors import CORSMiddleware
 from src.config import settings, scheduler
 from src.infrastructure.message_bus import MessageBus
 from src.infrastructure.unit_of_work import SqlAlchemyUnitOfWork
-from src.services.load_data_exchange.optinode_database import OptinodeDataRetriever
+from src.services.load_data_exchange.optinode_database import OptinodeDataRetriever, setup_optinode
 from src.services.data_sender import DataSender
+from src.services.load_data_exchange.common import sftp_session_pool
 from src.api import locations as locations_api
 from src.api.middleware import ApiKeyAuthMiddleware
 from src.domain import commands
@@ -53,6 +54,14 @@ async def init_bus():
         ldr=OptinodeDataRetriever(),
         dts=DataSender(),
     )
+    if settings.optinode_warm_up:
+        # in the background, serving requests must not wait for it
+        scheduler.add_job(setup_optinode)
+
+
+@app.on_event("shutdown")
+async def close_sftp_sessions():
+    sftp_session_pool.close_all()
 
 
 @app.get("/")
@@ -72,4 +81,26 @@ def send_data_to_impuls_energy_trading():
     # this requires that the historical data was already retrieved
     # and the predictions were calculated on the same day
     bus.handle(commands.SendAllEigenverbrauchsPredictionsToImpuls())
-    bus.handle(commands.SendAllResidualLongPredictionsToImpuls())
\ No newline at end of file
+    bus.handle(commands.SendAllResidualLongPredictionsToImpuls())
+
+
+@scheduler.scheduled_job("interval", seconds=settings.outbox_delivery_interval_seconds, max_instances=1, coalesce=True)
+def deliver_outbox():
+    # with its own unit of work, deliveries run concurrently to the jobs computing predictions.
+    # Predictions only count as sent to fahrplanmanagement once their mails were delivered, up to
+    # outbox_delivery_interval_seconds after they were written and later while deliveries are retried. The impuls
+    # jobs only send residuals that were delivered before the gate closure of fahrplanmanagement, so update_cron
+    # must leave that much time before it
+    MessageBus().with_fresh_unit_of_work().handle(commands.DeliverOutbox())
+
+
+def archive_old_predictions():
+    bus = MessageBus()
+    bus.handle(commands.ArchivePredictions())
+
+
+# only with a mounted archive, the archived series are deleted from the database
+if settings.prediction_archive_path and settings.archive_cron:
+    scheduler.add_job(
+        archive_old_predictions, CronTrigger.from_crontab(settings.archive_cron, timezone=TIMEZONE_BERLIN)
+    )
\ No newline at end of file
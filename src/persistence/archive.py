@@ -0,0 +1,40 @@
+import datetime
+import os
+import pathlib
+import uuid
+import zoneinfo
+
+import pandas as pd
+
+
+class PredictionArchive:
+    # parquet files on a mounted volume, partitioned by location and month of creation
+    def __init__(self, root: str | os.PathLike):
+        self._root = pathlib.Path(root)
+
+    def write(
+        self,
+        location_id: uuid.UUID,
+        created: datetime.datetime,
+        prediction_id: uuid.UUID,
+        df: pd.DataFrame,
+    ) -> str:
+        if not self._root.is_dir():
+            # created by the volume mount, a missing root would write to the container's ephemeral disk
+            raise FileNotFoundError(f"Prediction archive {self._root} is not mounted")
+        directory = self._root / f"location_id={location_id}" / f"month={created:%Y-%m}"
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{prediction_id}.parquet"
+        # write to a temporary file first, so that a stub never points to a partially written file
+        tmp_path = path.with_suffix(".parquet.tmp")
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+        return str(path)
+
+
+def read_archived_dataframe(path: str) -> pd.DataFrame:
+    df = pd.read_parquet(path)
+    # parquet restores timezones as pytz timezones, the rest of the code base uses zoneinfo
+    if getattr(df.index, "tz", None) is not None:
+        df.index = df.index.tz_convert(zoneinfo.ZoneInfo(str(df.index.tz)))
+    return df
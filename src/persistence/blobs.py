@@ -0,0 +1,84 @@
+import hashlib
+import io
+from typing import Iterable
+
+import pandas as pd
+from sqlalchemy import delete, exists
+from sqlalchemy.orm import Session
+
+from src.persistence.archive import read_archived_dataframe
+from src.persistence.delta_encoding import apply_delta
+from src.persistence.dialects import upsert_insert
+from src.persistence.sqlalchemy import (
+    HistoricLoadData as DBHistoricLoadData,
+    Prediction as DBPrediction,
+    TimeSeriesBlob as DBTimeSeriesBlob,
+)
+
+
+def dataframe_hash(df: pd.DataFrame) -> str:
+    # hash of the normalized series instead of the pickled bytes, which depend on the pandas version
+    # and on metadata like the index frequency
+    h = hashlib.sha256()
+    h.update(repr((
+        str(getattr(df.index, "tz", None)),
+        df.index.name,
+        [str(c) for c in df.columns],
+        [str(d) for d in df.dtypes],
+    )).encode())
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def dataframe_to_bytes(df: pd.DataFrame) -> bytes:
+    f = io.BytesIO()
+    df.to_pickle(f)
+    return f.getvalue()
+
+
+def dataframe_from_bytes(data: bytes) -> pd.DataFrame:
+    return pd.read_pickle(io.BytesIO(data))
+
+
+def read_dataframe(db_obj: DBPrediction | DBHistoricLoadData) -> pd.DataFrame:
+    if getattr(db_obj, "archive_path", None) is not None:
+        return read_archived_dataframe(db_obj.archive_path)
+    if db_obj.blob_hash is None:
+        return dataframe_from_bytes(db_obj.dataframe)
+    df = dataframe_from_bytes(db_obj.blob.dataframe)
+    if getattr(db_obj, "base_prediction_id", None) is not None:
+        return apply_delta(read_dataframe(db_obj.base_prediction), df)
+    return df
+
+
+class BlobStore:
+    def __init__(self, session: Session):
+        self._session = session
+
+    def put(self, df: pd.DataFrame) -> str:
+        hash_ = dataframe_hash(df)
+        if self._session.query(exists().where(DBTimeSeriesBlob.hash == hash_)).scalar():
+            return hash_
+        # pickle only new series, concurrent transactions may still store the same one
+        self._session.execute(
+            upsert_insert(self._session, DBTimeSeriesBlob)
+            .values(hash=hash_, dataframe=dataframe_to_bytes(df))
+            .on_conflict_do_nothing(index_elements=[DBTimeSeriesBlob.hash])
+        )
+        return hash_
+
+    def delete_unreferenced(self, hashes: Iterable[str]) -> None:
+        hashes = {h for h in hashes if h is not None}
+        if not hashes:
+            return
+        self._session.flush()
+        # only blobs neither a prediction nor load data refers to
+        self._session.execute(
+            delete(DBTimeSeriesBlob)
+            .where(
+                DBTimeSeriesBlob.hash.in_(hashes),
+                ~exists().where(DBPrediction.blob_hash == DBTimeSeriesBlob.hash),
+                ~exists().where(DBHistoricLoadData.blob_hash == DBTimeSeriesBlob.hash),
+            )
+            .execution_options(synchronize_session=False)
+        )
@@ -0,0 +1,39 @@
+from typing import Optional
+
+import pandas as pd
+
+REMOVED_COLUMN = "__removed__"
+
+
+def encode_delta(base: pd.DataFrame, df: pd.DataFrame) -> Optional[pd.DataFrame]:
+    # rows that are new or changed compared to the base plus the rows of the base that are gone,
+    # None if the series can't be encoded exactly or the delta wouldn't be considerably smaller
+    if (
+        list(base.columns) != list(df.columns)
+        or not base.dtypes.equals(df.dtypes)
+        or base.index.name != df.index.name
+        or str(getattr(base.index, "tz", None)) != str(getattr(df.index, "tz", None))
+        or not (base.index.is_unique and base.index.is_monotonic_increasing)
+        or not (df.index.is_unique and df.index.is_monotonic_increasing)
+    ):
+        return None
+    aligned = base.reindex(df.index)
+    unchanged = ((df == aligned) | (df.isna() & aligned.isna())).all(axis=1).to_numpy() & df.index.isin(base.index)
+    changed = df[~unchanged]
+    removed = base.loc[base.index.difference(df.index)]
+    if len(changed) + len(removed) > len(df) // 2:
+        return None
+    delta = pd.concat([
+        changed.assign(**{REMOVED_COLUMN: False}),
+        removed.assign(**{REMOVED_COLUMN: True}),
+    ]).sort_index()
+    if not apply_delta(base, delta).equals(df):
+        return None
+    return delta
+
+
+def apply_delta(base: pd.DataFrame, delta: pd.DataFrame) -> pd.DataFrame:
+    removed = delta[REMOVED_COLUMN].to_numpy(dtype=bool)
+    changed = delta[~removed].drop(columns=REMOVED_COLUMN)
+    df = base.drop(index=delta.index[removed].union(changed.index), errors="ignore")
+    return pd.concat([df, changed]).sort_index()
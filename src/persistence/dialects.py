@@ -0,0 +1,9 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+
+def upsert_insert(session: Session, entity):
+    # insert supporting on_conflict_do_nothing / on_conflict_do_update, postgres in production, sqlite in the tests
+    if session.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(entity)
+    return postgresql.insert(entity)
@@ -1,13 +1,16 @@
-import io
+import dataclasses
+import datetime
+import uuid
 import pandas as pd
 from abc import ABC, abstractmethod
-from typing import Any, List, Type, TypeVar, Generic
+from typing import Any, Iterable, List, Optional, Sequence, Type, TypeVar, Generic
 
 from pandera.typing import DataFrame
 
 import src.enums
 from src.domain import model
-from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, or_, select
+from sqlalchemy.orm import Session, defer, selectinload
 
 from src.enums import (
     Measurand,
@@ -15,8 +18,13 @@ from src.enums import (
     ComponentType,
     PredictionType,
     PredictionReceiver,
+    OutboxChannel,
 )
-from src.persistence.sqlalchemy import Base as DBBase, LocationSettings
+from src.persistence.archive import PredictionArchive
+from src.persistence.blobs import BlobStore, read_dataframe, dataframe_from_bytes, dataframe_to_bytes
+from src.persistence.delta_encoding import encode_delta
+from src.persistence.dialects import upsert_insert
+from src.persistence.sqlalchemy import Base as DBBase, LocationSettings, NO_COMPONENT_KEY
 from src.persistence.sqlalchemy import (
     Location as DBLocation,
     Component as DBComponent,
@@ -25,6 +33,8 @@ from src.persistence.sqlalchemy import (
     LocationSettings as DBLocationSettings,
     MarketLocation as DBMarketLocation,
     PredictionShipment as DBPredictionShipment,
+    LatestPrediction as DBLatestPrediction,
+    OutboxMessage as DBOutboxMessage,
 )
 from src.utils.dataframe_schemas import TimeSeriesSchema
 from src.utils.timezone import TIMEZONE_UTC
@@ -152,6 +162,105 @@ class GenericSqlAlchemyRepository(AbstractRepository, ABC, Generic[T]):
         raise NotImplementedError
 
 
+def historic_load_data_to_domain(
+    db_hld: DBHistoricLoadData,
+) -> model.HistoricLoadData | None:
+    if db_hld is None:
+        return None
+    return model.HistoricLoadData(
+        id=db_hld.id,
+        created=db_hld.created_at.replace(tzinfo=TIMEZONE_UTC),
+        df=read_dataframe(db_hld),
+    )
+
+
+def market_location_to_domain(
+    db_market_location: DBMarketLocation,
+    with_historic_load_data: bool = True,
+) -> model.MarketLocation | None:
+    if db_market_location is None:
+        return None
+    return model.MarketLocation(
+        id=db_market_location.id,
+        number=db_market_location.number,
+        measurand=Measurand(db_market_location.metering_direction),
+        historic_load_data=historic_load_data_to_domain(
+            db_market_location.historic_load_data
+        ) if with_historic_load_data else None,
+    )
+
+
+def component_to_domain(
+    db_component: DBComponent,
+    with_historic_load_data: bool = True,
+) -> model.Component | None:
+    if db_component is None:
+        return None
+    if db_component.type == ComponentType.CONSUMER.value:
+        return model.Consumer(
+            id=db_component.id,
+            name=db_component.name,
+            market_location=market_location_to_domain(
+                db_component.market_location, with_historic_load_data
+            ),
+        )
+    else:
+        return model.Producer(
+            id=db_component.id,
+            name=db_component.name,
+            market_location=market_location_to_domain(
+                db_component.market_location, with_historic_load_data
+            ),
+            prognosis_data_retriever=DataRetriever(
+                db_component.prognosis_data_retriever
+            ),
+        )
+
+
+def prediction_to_domain(
+    db_prediction: DBPrediction,
+) -> model.Prediction | None:
+    if db_prediction is None:
+        return None
+    return model.Prediction(
+        id=db_prediction.id,
+        location_id=db_prediction.location_id,
+        created=db_prediction.created_at.replace(tzinfo=TIMEZONE_UTC),
+        type=PredictionType(db_prediction.type),
+        df=DataFrame[TimeSeriesSchema](read_dataframe(db_prediction)),
+        shipments=[
+            prediction_shipment_to_domain(s) for s in db_prediction.shipments
+        ],
+        # the component is only referenced by the prediction, its load data belongs to the location aggregate
+        component=component_to_domain(db_prediction.component, with_historic_load_data=False),
+        download_manifest=[model.DownloadedFile(**f) for f in db_prediction.download_manifest or []],
+    )
+
+
+def prediction_shipment_to_domain(
+    db_prediction_shipment: DBPredictionShipment,
+) -> model.PredictionShipment:
+    return model.PredictionShipment(
+        id=db_prediction_shipment.id,
+        created=db_prediction_shipment.created_at.replace(tzinfo=TIMEZONE_UTC),
+        receiver=PredictionReceiver(db_prediction_shipment.receiver),
+    )
+
+
+def _as_utc(value: datetime.datetime) -> datetime.datetime:
+    # timestamps are stored without timezone in UTC, freshly flushed objects still carry their timezone
+    if value.tzinfo is None:
+        return value.replace(tzinfo=TIMEZONE_UTC)
+    return value.astimezone(TIMEZONE_UTC)
+
+
+def _shipment_summary(db_shipments: list[DBPredictionShipment]) -> dict[str, str]:
+    summary = {}
+    for db_shipment in sorted(db_shipments, key=lambda s: _as_utc(s.created_at)):
+        summary.setdefault(db_shipment.receiver, _as_utc(db_shipment.created_at).isoformat())
+    return summary
+
+
 class LocationRepositoryBase(AbstractRepository[model.Location], ABC):
     pass
 
@@ -160,6 +269,32 @@ class LocationRepository(
     GenericSqlAlchemyRepository[model.Location],
     AbstractRepository[model.Location],  # LocationRepositoryBase
 ):
+    def __init__(self, session: Session, db_cls: Type[DBBase]) -> None:
+        super().__init__(session, db_cls)
+        self._blobs = BlobStore(session)
+
+    def _update(self, obj: model.Location) -> model.Location:
+        # replaced historic load data is deleted by the orphan cascade, its blobs have to be cleaned up separately
+        replaced_blob_hashes = self._historic_load_data_blob_hashes(obj.id)
+        location = super()._update(obj)
+        self._blobs.delete_unreferenced(replaced_blob_hashes)
+        return location
+
+    def _historic_load_data_blob_hashes(self, location_id: uuid.UUID) -> set[str]:
+        query = (
+            select(DBHistoricLoadData.blob_hash)
+            .join(DBMarketLocation, DBHistoricLoadData.market_location_id == DBMarketLocation.id)
+            .outerjoin(DBComponent, DBMarketLocation.component_id == DBComponent.id)
+            .where(
+                or_(
+                    DBMarketLocation.residual_short_location_id == location_id,
+                    DBMarketLocation.residual_long_location_id == location_id,
+                    DBComponent.producer_location_id == location_id,
+                )
+            )
+        )
+        return set(self._session.scalars(query))
+
     def db_to_domain(self, db_obj: DBLocation) -> model.Location:
         def settings_to_domain(
             db_setting: DBLocationSettings,
@@ -173,81 +308,6 @@ class LocationRepository(
                 historic_days_for_consumption_prediction=db_setting.historic_days_for_consumption_prediction,
             )
 
-        def historic_load_data_to_domain(
-            db_hld: DBHistoricLoadData,
-        ) -> model.HistoricLoadData | None:
-            if db_hld is None:
-                return None
-            f = io.BytesIO(db_hld.dataframe)
-            return model.HistoricLoadData(
-                id=db_hld.id,
-                created=db_hld.created_at.replace(tzinfo=TIMEZONE_UTC),
-                df=pd.read_pickle(f),
-            )
-
-        def market_location_to_domain(
-            db_market_location: DBMarketLocation,
-        ) -> model.MarketLocation | None:
-            if db_market_location is None:
-                return None
-            return model.MarketLocation(
-                id=db_market_location.id,
-                number=db_market_location.number,
-                measurand=Measurand(db_market_location.metering_direction),
-                historic_load_data=historic_load_data_to_domain(
-                    db_market_location.historic_load_data
-                ),
-            )
-
-        def component_to_domain(db_component: DBComponent) -> model.Component | None:
-            if db_component is None:
-                return None
-            if db_component.type == ComponentType.CONSUMER.value:
-                return model.Consumer(
-                    id=db_component.id,
-                    name=db_component.name,
-                    market_location=market_location_to_domain(
-                        db_component.market_location
-                    ),
-                )
-            else:
-                return model.Producer(
-                    id=db_component.id,
-                    name=db_component.name,
-                    market_location=market_location_to_domain(
-                        db_component.market_location
-                    ),
-                    prognosis_data_retriever=DataRetriever(
-                        db_component.prognosis_data_retriever
-                    ),
-                )
-
-        def prediction_to_domain(
-            db_prediction: DBPrediction,
-        ) -> model.Prediction | None:
-            if db_prediction is None:
-                return None
-            f = io.BytesIO(db_prediction.dataframe)
-            return model.Prediction(
-                id=db_prediction.id,
-                created=db_prediction.created_at.replace(tzinfo=TIMEZONE_UTC),
-                type=PredictionType(db_prediction.type),
-                df=DataFrame[TimeSeriesSchema](pd.read_pickle(f)),
-                shipments=[
-                    prediction_shipment_to_domain(s) for s in db_prediction.shipments
-                ],
-                component=component_to_domain(db_prediction.component),
-            )
-
-        def prediction_shipment_to_domain(
-            db_prediction_shipment: DBPredictionShipment,
-        ) -> model.PredictionShipment:
-            return model.PredictionShipment(
-                id=db_prediction_shipment.id,
-                created=db_prediction_shipment.created_at.replace(tzinfo=TIMEZONE_UTC),
-                receiver=PredictionReceiver(db_prediction_shipment.receiver),
-            )
-
         state = src.enums.State(db_obj.state)
         return model.Location(
             id=db_obj.id,
@@ -258,7 +318,6 @@ class LocationRepository(
             residual_short=market_location_to_domain(db_obj.residual_short),
             residual_long=market_location_to_domain(db_obj.residual_long),
             producers=[component_to_domain(p) for p in db_obj.producers],
-            predictions=[prediction_to_domain(p) for p in db_obj.predictions],
         )
 
     def domain_to_db(self, domain_obj: model.Location) -> DBLocation:
@@ -280,10 +339,7 @@ class LocationRepository(
         ) -> DBHistoricLoadData | None:
             if hld is None:
                 return None
-            f = io.BytesIO()
-            hld.df.to_pickle(f)
-            f.seek(0)
-            return DBHistoricLoadData(id=hld.id, dataframe=f.read())
+            return DBHistoricLoadData(id=hld.id, dataframe=None, blob_hash=self._blobs.put(hld.df))
 
         def market_location_to_db(
             malo: model.MarketLocation,
@@ -315,27 +371,6 @@ class LocationRepository(
                 else None,
             )
 
-        def prediction_to_db(prediction: model.Prediction) -> DBPrediction | None:
-            if prediction is None:
-                return None
-            f = io.BytesIO()
-            prediction.df.to_pickle(f)
-            f.seek(0)
-            return DBPrediction(
-                id=prediction.id,
-                type=prediction.type.value,
-                dataframe=f.read(),
-                shipments=[prediction_shipment_to_db(s) for s in prediction.shipments],
-                component=component_to_db(prediction.component),
-            )
-
-        def prediction_shipment_to_db(
-            prediction_shipment: model.PredictionShipment,
-        ) -> DBPredictionShipment:
-            return DBPredictionShipment(
-                id=prediction_shipment.id, receiver=prediction_shipment.receiver.value
-            )
-
         return DBLocation(
             id=domain_obj.id,
             settings=settings_to_db(domain_obj.settings),
@@ -345,5 +380,628 @@ class LocationRepository(
             residual_short=market_location_to_db(domain_obj.residual_short),
             residual_long=market_location_to_db(domain_obj.residual_long),
             producers=[component_to_db(p) for p in domain_obj.producers],
-            predictions=[prediction_to_db(p) for p in domain_obj.predictions],
+        )
+
+
+class AbstractPredictionRepository(AbstractRepository[model.Prediction], ABC):
+    def latest(
+        self,
+        location_id: uuid.UUID,
+        type: PredictionType,
+        component: Optional[model.Component] = None,
+        receiver: Optional[PredictionReceiver] = None,
+        sent_before: Optional[datetime.time] = None,
+    ) -> Optional[model.Prediction]:
+        prediction = self._latest(location_id, type, component, receiver, sent_before)
+        if prediction:
+            self.seen.add(prediction)
+        return prediction
+
+    def latest_for_locations(
+        self,
+        location_ids: Iterable[uuid.UUID],
+        type: PredictionType,
+        receiver: Optional[PredictionReceiver] = None,
+        sent_before: Optional[datetime.time] = None,
+    ) -> dict[uuid.UUID, model.Prediction]:
+        # the same predictions as calling latest for every location, locations without one are left out
+        predictions = self._latest_for_locations(list(dict.fromkeys(location_ids)), type, receiver, sent_before)
+        for prediction in predictions.values():
+            self.seen.add(prediction)
+        return predictions
+
+    def get_range(
+        self,
+        location_id: uuid.UUID,
+        type: Optional[PredictionType] = None,
+        start: Optional[datetime.datetime] = None,
+        end: Optional[datetime.datetime] = None,
+        include_archived: bool = False,
+    ) -> List[model.Prediction]:
+        predictions = self._get_range(location_id, type, start, end, include_archived)
+        for prediction in predictions:
+            self.seen.add(prediction)
+        return predictions
+
+    @abstractmethod
+    def _latest(
+        self,
+        location_id: uuid.UUID,
+        type: PredictionType,
+        component: Optional[model.Component],
+        receiver: Optional[PredictionReceiver],
+        sent_before: Optional[datetime.time],
+    ) -> Optional[model.Prediction]:
+        raise NotImplementedError
+
+    def _latest_for_locations(
+        self,
+        location_ids: list[uuid.UUID],
+        type: PredictionType,
+        receiver: Optional[PredictionReceiver],
+        sent_before: Optional[datetime.time],
+    ) -> dict[uuid.UUID, model.Prediction]:
+        predictions = {}
+        for location_id in location_ids:
+            if (prediction := self._latest(location_id, type, None, receiver, sent_before)) is not None:
+                predictions[location_id] = prediction
+        return predictions
+
+    @abstractmethod
+    def _get_range(
+        self,
+        location_id: uuid.UUID,
+        type: Optional[PredictionType],
+        start: Optional[datetime.datetime],
+        end: Optional[datetime.datetime],
+        include_archived: bool,
+    ) -> List[model.Prediction]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_shipments(self, shipments: Sequence[tuple[uuid.UUID, model.PredictionShipment]]) -> None:
+        # adds the (prediction id, shipment) <shipments> at once, shipments of unknown predictions are ignored
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_oldest(self, location_id: uuid.UUID, keep: int = 3, type: Optional[PredictionType] = None) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def archive(self, created_before: datetime.datetime, limit: int = 100) -> int:
+        raise NotImplementedError
+
+
+class MemoryPredictionRepository(GenericMemoryRepository[model.Prediction], AbstractPredictionRepository):
+    def __init__(self, objs: dict[Any, model.Prediction]):
+        super().__init__(objs)
+        self._archived_ids = set()
+
+    def _latest(
+        self,
+        location_id: uuid.UUID,
+        type: PredictionType,
+        component: Optional[model.Component],
+        receiver: Optional[PredictionReceiver],
+        sent_before: Optional[datetime.time],
+    ) -> Optional[model.Prediction]:
+        return model.get_most_recent_prediction(
+            self._get_range(location_id, type, None, None, include_archived=True),
+            prediction_type=type,
+            receiver=receiver,
+            sent_before=sent_before,
+            component=component,
+        )
+
+    def _get_range(
+        self,
+        location_id: uuid.UUID,
+        type: Optional[PredictionType],
+        start: Optional[datetime.datetime],
+        end: Optional[datetime.datetime],
+        include_archived: bool,
+    ) -> List[model.Prediction]:
+        return [
+            p for p in self._objs.values()
+            if p.location_id == location_id
+            and (type is None or p.type == type)
+            and (start is None or p.created >= start)
+            and (end is None or p.created < end)
+            and (include_archived or p.id not in self._archived_ids)
+        ]
+
+    def add_shipments(self, shipments: Sequence[tuple[uuid.UUID, model.PredictionShipment]]) -> None:
+        for prediction_id, shipment in shipments:
+            if (prediction := self._objs.get(prediction_id)) is not None:
+                prediction.shipments.append(shipment)
+
+    def delete_oldest(self, location_id: uuid.UUID, keep: int = 3, type: Optional[PredictionType] = None) -> None:
+        predictions = self._get_range(location_id, type, None, None, include_archived=True)
+        for prediction in sorted(predictions, reverse=True)[keep:]:
+            self._delete(prediction.id)
+
+    def archive(self, created_before: datetime.datetime, limit: int = 100) -> int:
+        predictions = sorted(
+            p for p in self._objs.values() if p.id not in self._archived_ids and p.created < created_before
+        )[:limit]
+        self._archived_ids.update(p.id for p in predictions)
+        return len(predictions)
+
+
+class PredictionRepository(
+    GenericSqlAlchemyRepository[model.Prediction],
+    AbstractPredictionRepository,
+):
+    def __init__(
+        self,
+        session: Session,
+        db_cls: Type[DBBase],
+        keyframe_interval: int = 1,
+        archive: Optional[PredictionArchive] = None,
+    ) -> None:
+        super().__init__(session, db_cls)
+        self._blobs = BlobStore(session)
+        # with an interval > 1 predictions are stored as delta to their predecessor, every n-th one in full
+        self._keyframe_interval = keyframe_interval
+        self._archive = archive
+
+    def _add(self, obj: model.Prediction) -> model.Prediction:
+        # predictions are append-only, so there is no need to merge or to reload the written blob
+        db_obj = self.domain_to_db(obj)
+        self._session.add(db_obj)
+        self._session.flush()
+        obj.created = _as_utc(db_obj.created_at)
+        self._refresh_latest_prediction(db_obj)
+        return obj
+
+    def _update(self, obj: model.Prediction) -> model.Prediction:
+        # only shipments can be added to an existing prediction
+        db_obj = self._session.get(self._db_cls, obj.id)
+        existing_shipment_ids = {s.id for s in db_obj.shipments}
+        for shipment in obj.shipments:
+            if shipment.id not in existing_shipment_ids:
+                db_obj.shipments.append(
+                    DBPredictionShipment(id=shipment.id, receiver=shipment.receiver.value)
+                )
+        self._session.flush()
+        self._refresh_latest_prediction(db_obj)
+        return obj
+
+    def _latest(
+        self,
+        location_id: uuid.UUID,
+        type: PredictionType,
+        component: Optional[model.Component],
+        receiver: Optional[PredictionReceiver],
+        sent_before: Optional[datetime.time],
+    ) -> Optional[model.Prediction]:
+        if not receiver and not sent_before:
+            query = (
+                self._session.query(DBPrediction)
+                .join(DBLatestPrediction, DBLatestPrediction.prediction_id == DBPrediction.id)
+                .filter(DBLatestPrediction.location_id == location_id, DBLatestPrediction.type == type.value)
+            )
+            if component:
+                query = query.filter(DBLatestPrediction.component_id == component.id)
+            return prediction_to_domain(query.order_by(DBLatestPrediction.prediction_created_at.desc()).first())
+
+        # walk the history without loading the blobs until a prediction with a matching shipment is found
+        query = (
+            self._session.query(DBPrediction)
+            .options(defer(DBPrediction.dataframe), selectinload(DBPrediction.shipments))
+            .filter(DBPrediction.location_id == location_id, DBPrediction.type == type.value)
+        )
+        if component:
+            query = query.filter(DBPrediction.component_id == component.id)
+        for db_prediction in query.order_by(DBPrediction.created_at.desc()):
+            shipments = [prediction_shipment_to_domain(s) for s in db_prediction.shipments]
+            if model.has_matching_shipment(shipments, receiver, sent_before):
+                return self.db_to_domain(db_prediction)
+        return None
+
+    def _latest_for_locations(
+        self,
+        location_ids: list[uuid.UUID],
+        type: PredictionType,
+        receiver: Optional[PredictionReceiver],
+        sent_before: Optional[datetime.time],
+    ) -> dict[uuid.UUID, model.Prediction]:
+        if not location_ids:
+            return {}
+        latest_ids: dict[uuid.UUID, uuid.UUID] = {}
+        if not receiver and not sent_before:
+            rows = (
+                self._session.query(
+                    DBLatestPrediction.location_id,
+                    DBLatestPrediction.prediction_id,
+                    DBLatestPrediction.prediction_created_at,
+                )
+                .filter(DBLatestPrediction.location_id.in_(location_ids), DBLatestPrediction.type == type.value)
+            )
+            # there is one row per component, the most recent one wins
+            for row in sorted(rows, key=lambda row: _as_utc(row.prediction_created_at)):
+                latest_ids[row.location_id] = row.prediction_id
+        else:
+            # walk the histories of all locations at once without loading the blobs, newest first
+            query = (
+                self._session.query(DBPrediction)
+                .options(defer(DBPrediction.dataframe), selectinload(DBPrediction.shipments))
+                .filter(DBPrediction.location_id.in_(location_ids), DBPrediction.type == type.value)
+            )
+            if receiver:
+                query = query.filter(DBPrediction.shipments.any(DBPredictionShipment.receiver == receiver.value))
+            for db_prediction in query.order_by(DBPrediction.created_at.desc()).yield_per(200):
+                if db_prediction.location_id in latest_ids:
+                    continue
+                shipments = [prediction_shipment_to_domain(s) for s in db_prediction.shipments]
+                if model.has_matching_shipment(shipments, receiver, sent_before):
+                    latest_ids[db_prediction.location_id] = db_prediction.id
+                    if len(latest_ids) == len(location_ids):
+                        break
+        if not latest_ids:
+            return {}
+        db_predictions = {
+            db_prediction.id: db_prediction
+            for db_prediction in self._session.query(DBPrediction)
+            .options(
+                selectinload(DBPrediction.blob),
+                selectinload(DBPrediction.shipments),
+                selectinload(DBPrediction.component).selectinload(DBComponent.market_location),
+            )
+            .filter(DBPrediction.id.in_(latest_ids.values()))
+        }
+        return {
+            location_id: self.db_to_domain(db_predictions[prediction_id])
+            for location_id, prediction_id in latest_ids.items()
+        }
+
+    def add_shipments(self, shipments: Sequence[tuple[uuid.UUID, model.PredictionShipment]]) -> None:
+        # one insert for all shipments instead of loading and merging every prediction
+        prediction_ids = {prediction_id for prediction_id, _ in shipments}
+        existing_ids = set(self._session.scalars(select(DBPrediction.id).where(DBPrediction.id.in_(prediction_ids))))
+        shipments = [(prediction_id, s) for prediction_id, s in shipments if prediction_id in existing_ids]
+        if not shipments:
+            return
+        self._session.execute(
+            insert(DBPredictionShipment),
+            [
+                dict(id=s.id, prediction_id=prediction_id, receiver=s.receiver.value, created_at=s.created)
+                for prediction_id, s in shipments
+            ],
+        )
+        # the read model keeps the first shipment per receiver of the latest predictions
+        shipments_by_prediction = {}
+        for prediction_id, shipment in shipments:
+            shipments_by_prediction.setdefault(prediction_id, []).append(shipment)
+        for row in self._session.query(DBLatestPrediction).filter(
+            DBLatestPrediction.prediction_id.in_(shipments_by_prediction)
+        ):
+            summary = dict(row.shipments or {})
+            for shipment in sorted(shipments_by_prediction[row.prediction_id], key=lambda s: _as_utc(s.created)):
+                summary.setdefault(shipment.receiver.value, _as_utc(shipment.created).isoformat())
+            row.shipments = summary
+        self._session.flush()
+
+    def _get_range(
+        self,
+        location_id: uuid.UUID,
+        type: Optional[PredictionType],
+        start: Optional[datetime.datetime],
+        end: Optional[datetime.datetime],
+        include_archived: bool,
+    ) -> List[model.Prediction]:
+        query = self._session.query(DBPrediction).filter(DBPrediction.location_id == location_id)
+        if type:
+            query = query.filter(DBPrediction.type == type.value)
+        if start:
+            query = query.filter(DBPrediction.created_at >= start.astimezone(TIMEZONE_UTC).replace(tzinfo=None))
+        if end:
+            query = query.filter(DBPrediction.created_at < end.astimezone(TIMEZONE_UTC).replace(tzinfo=None))
+        if not include_archived:
+            query = query.filter(DBPrediction.archive_path.is_(None))
+        return [self.db_to_domain(db_obj) for db_obj in query.order_by(DBPrediction.created_at)]
+
+    def delete_oldest(self, location_id: uuid.UUID, keep: int = 3, type: Optional[PredictionType] = None) -> None:
+        query = (
+            self._session.query(DBPrediction)
+            .options(defer(DBPrediction.dataframe))
+            .filter(DBPrediction.location_id == location_id)
+        )
+        if type:
+            query = query.filter(DBPrediction.type == type.value)
+        db_predictions = query.order_by(DBPrediction.created_at.desc()).all()
+        deleted_ids = {db_prediction.id for db_prediction in db_predictions[keep:]}
+        if not deleted_ids:
+            return
+        deleted_blob_hashes = set()
+        for db_prediction in reversed(db_predictions[:keep]):
+            if db_prediction.base_prediction_id in deleted_ids:
+                # the base of this delta is about to be deleted
+                deleted_blob_hashes.add(self._store_in_full(db_prediction))
+        for db_prediction in db_predictions[keep:]:
+            deleted_blob_hashes.add(db_prediction.blob_hash)
+            self._session.delete(db_prediction)
+        # the read model must not point to deleted predictions
+        self._session.query(DBLatestPrediction).filter(
+            DBLatestPrediction.prediction_id.in_(deleted_ids)
+        ).delete(synchronize_session=False)
+        self._session.flush()
+        self._blobs.delete_unreferenced(deleted_blob_hashes)
+        for db_prediction in query.order_by(DBPrediction.created_at):
+            self._refresh_latest_prediction(db_prediction)
+
+    def archive(self, created_before: datetime.datetime, limit: int = 100) -> int:
+        db_predictions = (
+            self._session.query(DBPrediction)
+            .options(defer(DBPrediction.dataframe))
+            .filter(
+                DBPrediction.archive_path.is_(None),
+                DBPrediction.created_at < created_before.astimezone(TIMEZONE_UTC).replace(tzinfo=None),
+            )
+            .order_by(DBPrediction.created_at)
+            .limit(limit)
+            .all()
+        )
+        archived_ids = {db_prediction.id for db_prediction in db_predictions}
+        replaced_blob_hashes = set()
+        for db_prediction in (
+            self._session.query(DBPrediction)
+            .options(defer(DBPrediction.dataframe))
+            .filter(DBPrediction.base_prediction_id.in_(archived_ids), DBPrediction.id.not_in(archived_ids))
+        ):
+            # the base of this delta is about to be archived
+            replaced_blob_hashes.add(self._store_in_full(db_prediction))
+        dfs = {db_prediction.id: read_dataframe(db_prediction) for db_prediction in db_predictions}
+        for db_prediction in db_predictions:
+            replaced_blob_hashes.add(db_prediction.blob_hash)
+            db_prediction.archive_path = self._archive.write(
+                db_prediction.location_id, db_prediction.created_at, db_prediction.id, dfs[db_prediction.id]
+            )
+            db_prediction.dataframe = None
+            db_prediction.blob_hash = None
+            db_prediction.base_prediction_id = None
+            db_prediction.delta_depth = 0
+        self._session.flush()
+        self._blobs.delete_unreferenced(replaced_blob_hashes)
+        return len(db_predictions)
+
+    def db_to_domain(self, db_obj: DBPrediction) -> model.Prediction:
+        return prediction_to_domain(db_obj)
+
+    def domain_to_db(self, domain_obj: model.Prediction) -> DBPrediction:
+        db_obj = DBPrediction(
+            id=domain_obj.id,
+            location_id=domain_obj.location_id,
+            type=domain_obj.type.value,
+            shipments=[
+                DBPredictionShipment(id=s.id, receiver=s.receiver.value) for s in domain_obj.shipments
+            ],
+            component_id=domain_obj.component.id if domain_obj.component else None,
+            download_manifest=[dataclasses.asdict(f) for f in domain_obj.download_manifest] or None,
+        )
+        self._store_dataframe(db_obj, domain_obj.df)
+        return db_obj
+
+    def _store_dataframe(self, db_obj: DBPrediction, df: pd.DataFrame) -> None:
+        if self._keyframe_interval <= 1 or not self._store_as_delta(db_obj, df):
+            db_obj.blob_hash = self._blobs.put(df)
+
+    def _store_as_delta(self, db_obj: DBPrediction, df: pd.DataFrame) -> bool:
+        base = (
+            self._session.query(DBPrediction)
+            .join(DBLatestPrediction, DBLatestPrediction.prediction_id == DBPrediction.id)
+            .filter(
+                DBLatestPrediction.location_id == db_obj.location_id,
+                DBLatestPrediction.type == db_obj.type,
+                DBLatestPrediction.component_id == db_obj.component_id,
+                DBPrediction.archive_path.is_(None),  # an archived base has no blob anymore, a keyframe follows it
+            )
+            .first()
+        )
+        if base is None or base.delta_depth + 1 >= self._keyframe_interval:
+            return False
+        delta = encode_delta(read_dataframe(base), df)
+        if delta is None:
+            return False
+        db_obj.blob_hash = self._blobs.put(delta)
+        db_obj.base_prediction_id = base.id
+        db_obj.delta_depth = base.delta_depth + 1
+        return True
+
+    def _store_in_full(self, db_prediction: DBPrediction) -> Optional[str]:
+        # turns a delta into a keyframe, returns the hash of the replaced blob
+        replaced_blob_hash = db_prediction.blob_hash
+        db_prediction.blob_hash = self._blobs.put(read_dataframe(db_prediction))
+        db_prediction.base_prediction_id = None
+        db_prediction.delta_depth = 0
+        self._session.flush()
+        self._session.expire(db_prediction, ["blob", "base_prediction"])
+        return replaced_blob_hash
+
+    def _refresh_latest_prediction(self, db_prediction: DBPrediction) -> None:
+        # a single statement, concurrent transactions writing predictions of the same series don't add a second row
+        upsert = upsert_insert(self._session, DBLatestPrediction).values(
+            location_id=db_prediction.location_id,
+            type=db_prediction.type,
+            component_id=db_prediction.component_id,
+            component_key=db_prediction.component_id or NO_COMPONENT_KEY,
+            prediction_id=db_prediction.id,
+            prediction_created_at=_as_utc(db_prediction.created_at).replace(tzinfo=None),
+            shipments=_shipment_summary(db_prediction.shipments),
+        )
+        self._session.execute(
+            upsert.on_conflict_do_update(
+                index_elements=[DBLatestPrediction.location_id, DBLatestPrediction.type, DBLatestPrediction.component_key],
+                set_={
+                    "prediction_id": upsert.excluded.prediction_id,
+                    "prediction_created_at": upsert.excluded.prediction_created_at,
+                    "shipments": upsert.excluded.shipments,
+                },
+                # a newer prediction written in the meantime is kept
+                where=or_(
+                    DBLatestPrediction.prediction_id == upsert.excluded.prediction_id,
+                    DBLatestPrediction.prediction_created_at <= upsert.excluded.prediction_created_at,
+                ),
+            ).returning(DBLatestPrediction),
+            execution_options={"populate_existing": True},  # rows loaded before in this session
+        ).all()
+
+
+class AbstractOutboxRepository(AbstractRepository[model.OutboxMessage], ABC):
+    def pending(self, max_attempts: int, limit: int = 100) -> List[model.OutboxMessage]:
+        messages = self._pending(max_attempts, limit)
+        for message in messages:
+            self.seen.add(message)
+        return messages
+
+    def delivered_batches(self, limit: int = 100) -> List[List[model.OutboxMessage]]:
+        # the messages of batches whose messages were all delivered
+        batches = self._delivered_batches(limit)
+        for messages in batches:
+            for message in messages:
+                self.seen.add(message)
+        return batches
+
+    @abstractmethod
+    def _pending(self, max_attempts: int, limit: int) -> List[model.OutboxMessage]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _delivered_batches(self, limit: int) -> List[List[model.OutboxMessage]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_dead_letters(self, dead_lettered_before: datetime.datetime) -> int:
+        # deletes whole batches, their delivered messages must not complete them afterwards
+        raise NotImplementedError
+
+
+class MemoryOutboxRepository(GenericMemoryRepository[model.OutboxMessage], AbstractOutboxRepository):
+    def _pending(self, max_attempts: int, limit: int) -> List[model.OutboxMessage]:
+        messages = [
+            m for m in self._objs.values()
+            if m.attempts < max_attempts and m.dead_lettered is None and m.delivered is None
+        ]
+        return sorted(messages, key=lambda m: m.created)[:limit]
+
+    def _delivered_batches(self, limit: int) -> List[List[model.OutboxMessage]]:
+        batches = {}
+        for message in sorted(self._objs.values(), key=lambda m: m.created):
+            batches.setdefault(message.batch_id, []).append(message)
+        return [messages for messages in batches.values() if all(m.delivered for m in messages)][:limit]
+
+    def delete_dead_letters(self, dead_lettered_before: datetime.datetime) -> int:
+        batch_ids = {
+            m.batch_id for m in self._objs.values() if m.dead_lettered and m.dead_lettered < dead_lettered_before
+        }
+        ids = [m.id for m in self._objs.values() if m.batch_id in batch_ids]
+        for id_ in ids:
+            del self._objs[id_]
+        return len(ids)
+
+
+class OutboxRepository(
+    GenericSqlAlchemyRepository[model.OutboxMessage],
+    AbstractOutboxRepository,
+):
+    def _add(self, obj: model.OutboxMessage) -> model.OutboxMessage:
+        self._session.add(self.domain_to_db(obj))
+        self._session.flush()
+        return obj
+
+    def _update(self, obj: model.OutboxMessage) -> model.OutboxMessage:
+        # only the delivery attempts change, the payload is written once
+        db_obj = self._session.get(self._db_cls, obj.id)
+        db_obj.attempts = obj.attempts
+        db_obj.last_error = obj.last_error
+        db_obj.dead_lettered_at = obj.dead_lettered
+        db_obj.delivered_at = obj.delivered
+        self._session.flush()
+        return obj
+
+    def _delete(self, id: Any) -> None:
+        self._session.query(self._db_cls).filter_by(id=id).delete()
+        self._session.flush()
+
+    def _pending(self, max_attempts: int, limit: int) -> List[model.OutboxMessage]:
+        # rows being delivered by another worker are skipped, they stay locked until that worker commits
+        db_objs = (
+            self._session.query(self._db_cls)
+            .filter(
+                self._db_cls.attempts < max_attempts,
+                self._db_cls.dead_lettered_at.is_(None),
+                self._db_cls.delivered_at.is_(None),
+            )
+            .order_by(self._db_cls.created_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        return [self.db_to_domain(db_obj) for db_obj in db_objs]
+
+    def _delivered_batches(self, limit: int) -> List[List[model.OutboxMessage]]:
+        batch_sizes = dict(
+            self._session.query(self._db_cls.batch_id, func.count())
+            .group_by(self._db_cls.batch_id)
+            .having(func.count() == func.count(self._db_cls.delivered_at))
+            .order_by(func.min(self._db_cls.created_at))
+            .limit(limit)
+            .all()
+        )
+        if not batch_sizes:
+            return []
+        batches = {}
+        for db_obj in (
+            self._session.query(self._db_cls)
+            .filter(self._db_cls.batch_id.in_(batch_sizes))
+            .order_by(self._db_cls.created_at)
+            .with_for_update(skip_locked=True)
+        ):
+            batches.setdefault(db_obj.batch_id, []).append(self.db_to_domain(db_obj))
+        # a batch partly locked by another worker is completed by that worker
+        return [messages for batch_id, messages in batches.items() if len(messages) == batch_sizes[batch_id]]
+
+    def delete_dead_letters(self, dead_lettered_before: datetime.datetime) -> int:
+        dead_lettered_batch_ids = select(self._db_cls.batch_id).where(
+            self._db_cls.dead_lettered_at < dead_lettered_before.astimezone(TIMEZONE_UTC).replace(tzinfo=None)
+        )
+        deleted = (
+            self._session.query(self._db_cls)
+            .filter(self._db_cls.batch_id.in_(dead_lettered_batch_ids))
+            .delete(synchronize_session=False)
+        )
+        self._session.flush()
+        return deleted
+
+    def db_to_domain(self, db_obj: DBOutboxMessage) -> model.OutboxMessage:
+        return model.OutboxMessage(
+            id=db_obj.id,
+            created=_as_utc(db_obj.created_at),
+            channel=OutboxChannel(db_obj.channel),
+            df=dataframe_from_bytes(db_obj.dataframe),
+            file_name=db_obj.file_name,
+            recipient=db_obj.recipient,
+            prediction_date=db_obj.prediction_date,
+            prediction_ids=[uuid.UUID(id_) for id_ in db_obj.prediction_ids],
+            batch_id=db_obj.batch_id,
+            attempts=db_obj.attempts,
+            last_error=db_obj.last_error,
+            dead_lettered=_as_utc(db_obj.dead_lettered_at) if db_obj.dead_lettered_at else None,
+            delivered=_as_utc(db_obj.delivered_at) if db_obj.delivered_at else None,
+        )
+
+    def domain_to_db(self, domain_obj: model.OutboxMessage) -> DBOutboxMessage:
+        return DBOutboxMessage(
+            id=domain_obj.id,
+            channel=domain_obj.channel.value,
+            dataframe=dataframe_to_bytes(domain_obj.df),
+            file_name=domain_obj.file_name,
+            recipient=domain_obj.recipient,
+            prediction_date=domain_obj.prediction_date,
+            prediction_ids=[str(id_) for id_ in domain_obj.prediction_ids],
+            batch_id=domain_obj.batch_id,
+            attempts=domain_obj.attempts,
+            last_error=domain_obj.last_error,
+            dead_lettered_at=domain_obj.dead_lettered,
+            delivered_at=domain_obj.delivered,
         )
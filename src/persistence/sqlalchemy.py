@@ -2,7 +2,7 @@ from __future__ import annotations
 from uuid import UUID
 from datetime import datetime, date
 from sqlalchemy.orm import Mapped, mapped_column, relationship, DeclarativeBase
-from sqlalchemy import DateTime, Date, ForeignKey, PickleType
+from sqlalchemy import DateTime, Date, ForeignKey, PickleType, JSON, Index, LargeBinary, String
 from typing import Optional
 
 from src.utils.timezone import TIMEZONE_UTC
@@ -101,7 +101,16 @@ class Prediction(Base, UUIDMixin):
     __tablename__ = "predictions"
 
     type: Mapped[str]
-    dataframe: Mapped[bytes] = mapped_column(PickleType())
+    dataframe: Mapped[Optional[bytes]] = mapped_column(PickleType())  # only set for rows written before blobs were introduced
+    blob_hash: Mapped[Optional[str]] = mapped_column(ForeignKey("timeseriesblobs.hash"), index=True)
+    blob: Mapped[Optional[TimeSeriesBlob]] = relationship(foreign_keys=[blob_hash])
+    # if set, the blob only holds the delta to the base prediction, see src.persistence.delta_encoding
+    base_prediction_id: Mapped[Optional[UUID]] = mapped_column(ForeignKey("predictions.id"))
+    base_prediction: Mapped[Optional[Prediction]] = relationship(
+        remote_side="Prediction.id", foreign_keys=[base_prediction_id]
+    )
+    delta_depth: Mapped[int] = mapped_column(default=0)  # number of deltas since the last keyframe
+    archive_path: Mapped[Optional[str]]  # set for archived predictions, whose series only lives in the archive
     location_id: Mapped[UUID] = mapped_column(ForeignKey("locations.id"))
     location: Mapped[Location] = relationship(
         back_populates="predictions", foreign_keys=[location_id]
@@ -115,6 +124,7 @@ class Prediction(Base, UUIDMixin):
     component: Mapped[Optional[Component]] = relationship(
         back_populates="predictions", foreign_keys=[component_id]
     )
+    download_manifest: Mapped[Optional[list]] = mapped_column(JSON)
 
 
 class PredictionShipment(Base, UUIDMixin):
@@ -127,16 +137,67 @@ class PredictionShipment(Base, UUIDMixin):
     receiver: Mapped[str]
 
 
+class OutboxMessage(Base, UUIDMixin):
+    # prediction files waiting to be delivered, removed once they were delivered
+    __tablename__ = "outboxmessages"
+
+    channel: Mapped[str]
+    dataframe: Mapped[bytes] = mapped_column(LargeBinary)
+    file_name: Mapped[Optional[str]]
+    recipient: Mapped[Optional[str]]
+    prediction_date: Mapped[Optional[date]] = mapped_column(Date)
+    prediction_ids: Mapped[list] = mapped_column(JSON, default=list)
+    batch_id: Mapped[UUID] = mapped_column(index=True)
+    attempts: Mapped[int] = mapped_column(default=0)
+    last_error: Mapped[Optional[str]]
+    dead_lettered_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    delivered_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+
+
+NO_COMPONENT_KEY = UUID(int=0)
+
+
+class LatestPrediction(Base):
+    # read model pointing to the most recent prediction per location, type and component,
+    # kept in sync by the PredictionRepository within the transaction that writes the predictions
+    __tablename__ = "latestpredictions"
+    __table_args__ = (
+        Index(
+            "ux_latestpredictions_location_id_type_component_key", "location_id", "type", "component_key", unique=True
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    location_id: Mapped[UUID] = mapped_column(ForeignKey("locations.id", ondelete="CASCADE"))
+    type: Mapped[str]
+    component_id: Mapped[Optional[UUID]] = mapped_column(ForeignKey("components.id", ondelete="CASCADE"))
+    component_key: Mapped[UUID]  # component_id or NO_COMPONENT_KEY, unlike NULL it is unique in the index
+    prediction_id: Mapped[UUID] = mapped_column(ForeignKey("predictions.id", ondelete="CASCADE"))
+    prediction: Mapped[Prediction] = relationship(foreign_keys=[prediction_id])
+    prediction_created_at: Mapped[datetime] = mapped_column(DateTime)
+    shipments: Mapped[dict] = mapped_column(JSON, default=dict)  # receiver -> isoformat of first shipment (UTC)
+
+
 class HistoricLoadData(Base, UUIDMixin):
     __tablename__ = "historicloaddata"
 
-    dataframe: Mapped[bytes] = mapped_column(PickleType())
+    dataframe: Mapped[Optional[bytes]] = mapped_column(PickleType())  # only set for rows written before blobs were introduced
+    blob_hash: Mapped[Optional[str]] = mapped_column(ForeignKey("timeseriesblobs.hash"), index=True)
+    blob: Mapped[Optional[TimeSeriesBlob]] = relationship(foreign_keys=[blob_hash])
     market_location_id: Mapped[UUID] = mapped_column(ForeignKey("marketlocations.id"))
     market_location: Mapped[MarketLocation] = relationship(
         back_populates="historic_load_data", foreign_keys=[market_location_id]
     )
 
 
+class TimeSeriesBlob(Base):
+    # content-addressed storage for pickled time series, identical series are stored only once
+    __tablename__ = "timeseriesblobs"
+
+    hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    dataframe: Mapped[bytes] = mapped_column(LargeBinary)
+
+
 class LocationSettings(Base):
     __tablename__ = "locationsettings"
 
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import datetime
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.domain import model
+from src.enums import DataRetriever, PredictionType, PredictionReceiver
+from src.persistence.repository import prediction_to_domain
+from src.persistence.sqlalchemy import (
+    Component as DBComponent,
+    LatestPrediction as DBLatestPrediction,
+    Location as DBLocation,
+    MarketLocation as DBMarketLocation,
+    Prediction as DBPrediction,
+)
+from src.utils.timezone import TIMEZONE_UTC
+
+
+@dataclass(frozen=True)
+class LatestPrediction:
+    location_id: uuid.UUID
+    type: PredictionType
+    component_id: Optional[uuid.UUID]
+    prediction_id: uuid.UUID
+    created: datetime.datetime
+    shipments: dict[PredictionReceiver, datetime.datetime] = field(default_factory=dict)  # receiver -> first shipment
+
+
+class AbstractLatestPredictionView(ABC):
+    @abstractmethod
+    def list(self, location_id: uuid.UUID, type: Optional[PredictionType] = None) -> list[LatestPrediction]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_predictions(
+        self, location_id: uuid.UUID, type: Optional[PredictionType] = None
+    ) -> list[model.Prediction]:
+        raise NotImplementedError
+
+
+class MemoryLatestPredictionView(AbstractLatestPredictionView):
+    def __init__(self, predictions: dict[Any, model.Prediction]):
+        self._predictions = predictions
+
+    def list(self, location_id: uuid.UUID, type: Optional[PredictionType] = None) -> list[LatestPrediction]:
+        return [
+            LatestPrediction(
+                location_id=location_id,
+                type=prediction.type,
+                component_id=prediction.component.id if prediction.component else None,
+                prediction_id=prediction.id,
+                created=prediction.created,
+                shipments=_shipment_summary(prediction.shipments),
+            )
+            for prediction in self.get_predictions(location_id, type)
+        ]
+
+    def get_predictions(
+        self, location_id: uuid.UUID, type: Optional[PredictionType] = None
+    ) -> list[model.Prediction]:
+        latest: dict[tuple[PredictionType, Optional[uuid.UUID]], model.Prediction] = {}
+        for prediction in self._predictions.values():
+            if prediction.location_id != location_id or (type and prediction.type != type):
+                continue
+            key = (prediction.type, prediction.component.id if prediction.component else None)
+            if key not in latest or prediction > latest[key]:
+                latest[key] = prediction
+        return list(latest.values())
+
+
+class SqlAlchemyLatestPredictionView(AbstractLatestPredictionView):
+    def __init__(self, session: Session):
+        self._session = session
+
+    def list(self, location_id: uuid.UUID, type: Optional[PredictionType] = None) -> list[LatestPrediction]:
+        query = self._session.query(DBLatestPrediction).filter(DBLatestPrediction.location_id == location_id)
+        if type:
+            query = query.filter(DBLatestPrediction.type == type.value)
+        return [
+            LatestPrediction(
+                location_id=row.location_id,
+                type=PredictionType(row.type),
+                component_id=row.component_id,
+                prediction_id=row.prediction_id,
+                created=row.prediction_created_at.replace(tzinfo=TIMEZONE_UTC),
+                shipments={
+                    PredictionReceiver(receiver): datetime.datetime.fromisoformat(created)
+                    for receiver, created in (row.shipments or {}).items()
+                },
+            )
+            for row in query
+        ]
+
+    def get_predictions(
+        self, location_id: uuid.UUID, type: Optional[PredictionType] = None
+    ) -> list[model.Prediction]:
+        query = (
+            self._session.query(DBPrediction)
+            .join(DBLatestPrediction, DBLatestPrediction.prediction_id == DBPrediction.id)
+            .filter(DBLatestPrediction.location_id == location_id)
+        )
+        if type:
+            query = query.filter(DBLatestPrediction.type == type.value)
+        return [prediction_to_domain(db_prediction) for db_prediction in query]
+
+
+@dataclass(frozen=True)
+class ImpulsEnergyTradingLocation:
+    # what the impuls energy trading files need of a location, without loading the location aggregate
+    location_id: uuid.UUID
+    alias: Optional[str]
+    residual_long_id: uuid.UUID
+
+
+class AbstractImpulsEnergyTradingLocationView(ABC):
+    @abstractmethod
+    def list(self) -> list[ImpulsEnergyTradingLocation]:
+        raise NotImplementedError
+
+
+class MemoryImpulsEnergyTradingLocationView(AbstractImpulsEnergyTradingLocationView):
+    def __init__(self, locations: dict[Any, model.Location]):
+        self._locations = locations
+
+    def list(self) -> list[ImpulsEnergyTradingLocation]:
+        return [
+            ImpulsEnergyTradingLocation(
+                location_id=location.id, alias=location.alias, residual_long_id=location.residual_long.id
+            )
+            for location in self._locations.values()
+            if location.is_assigned_to_impuls_energy_trading
+        ]
+
+
+class SqlAlchemyImpulsEnergyTradingLocationView(AbstractImpulsEnergyTradingLocationView):
+    def __init__(self, session: Session):
+        self._session = session
+
+    def list(self) -> list[ImpulsEnergyTradingLocation]:
+        query = (
+            select(DBLocation.id, DBLocation.alias, DBMarketLocation.id.label("residual_long_id"))
+            .join(DBMarketLocation, DBMarketLocation.residual_long_location_id == DBLocation.id)
+            .where(
+                DBLocation.producers.any(
+                    DBComponent.prognosis_data_retriever == DataRetriever.IMPULS_ENERGY_TRADING_SFTP.value
+                )
+            )
+            .order_by(DBLocation.created_at, DBLocation.id)
+        )
+        return [
+            ImpulsEnergyTradingLocation(location_id=row.id, alias=row.alias, residual_long_id=row.residual_long_id)
+            for row in self._session.execute(query)
+        ]
+
+
+def _shipment_summary(shipments: list[model.PredictionShipment]) -> dict[PredictionReceiver, datetime.datetime]:
+    summary = {}
+    for shipment in sorted(shipments):
+        summary.setdefault(shipment.receiver, shipment.created)
+    return summary
@@ -1,8 +1,11 @@
 import abc
+import contextlib
 import datetime
+from typing import ContextManager, Iterator, Sequence
 
 from pandera.typing import DataFrame
 
+from src.config import settings
 from src.services.load_data_exchange.email import ForecastEmailSender, AbstractEmailSender
 from src.services.load_data_exchange.common import AbstractLoadDataSender
 from src.services.load_data_exchange.impuls_energy_trading import IetSftpEigenverbrauchDataSender, \
@@ -15,6 +18,19 @@ class AbstractDataSender(abc.ABC):
     def send_to_internal_fahrplanmanagement(self, data: DataFrame[FahrplanmanagementSchema], *args, **kwargs) -> bool:
         raise NotImplementedError()
 
+    def send_all_to_internal_fahrplanmanagement(
+        self, files: Sequence[tuple[str, DataFrame[FahrplanmanagementSchema]]], recipient: str
+    ) -> list[bool]:
+        # returns whether each of the (file name, data) <files> was sent
+        return [
+            self.send_to_internal_fahrplanmanagement(data=data, file_name=file_name, recipient=recipient)
+            for file_name, data in files
+        ]
+
+    def fahrplanmanagement_session(self) -> ContextManager:
+        # predictions sent to internal fahrplanmanagement within the session may share one connection
+        return contextlib.nullcontext()
+
     @abc.abstractmethod
     def send_eigenverbrauch_to_impuls_energy_trading(self, data, **kwargs) -> bool:
         raise NotImplementedError()
@@ -23,6 +39,21 @@ class AbstractDataSender(abc.ABC):
     def send_residual_long_to_impuls_energy_trading(self, data, **kwargs) -> bool:
         raise NotImplementedError()
 
+    def send_all_eigenverbrauch_to_impuls_energy_trading(
+        self, files: Sequence[tuple[DataFrame, datetime.date]]
+    ) -> list[Exception | None]:
+        # returns the error of each of the (data, prediction date) <files> or None if it was sent
+        return _send_each(self.send_eigenverbrauch_to_impuls_energy_trading, files)
+
+    def send_all_residual_long_to_impuls_energy_trading(
+        self, files: Sequence[tuple[DataFrame, datetime.date]]
+    ) -> list[Exception | None]:
+        return _send_each(self.send_residual_long_to_impuls_energy_trading, files)
+
+    def impuls_energy_trading_session(self) -> ContextManager:
+        # files sent to impuls energy trading within the session may share one connection
+        return contextlib.nullcontext()
+
 
 class DataSender(AbstractDataSender):
     def __init__(
@@ -35,10 +66,20 @@ class DataSender(AbstractDataSender):
         self.impuls_energy_trading_eigenverbrauch_sender = impuls_energy_trading_eigenverbrauch_sender
         self.impuls_energy_trading_residual_long_sender = impuls_energy_trading_residual_long_sender
 
+    def fahrplanmanagement_session(self) -> ContextManager:
+        return self.fahrplanmanagement_sender.session()
+
     def send_to_internal_fahrplanmanagement(self, data: DataFrame[TimeSeriesSchema], file_name: str, recipient: str) -> bool:
         successful = self.fahrplanmanagement_sender.send(recipient, file_name, data)
         return successful
 
+    def send_all_to_internal_fahrplanmanagement(
+        self, files: Sequence[tuple[str, DataFrame[FahrplanmanagementSchema]]], recipient: str
+    ) -> list[bool]:
+        if settings.fahrplanmanagement_consolidated_emails:
+            return self.fahrplanmanagement_sender.send_many(recipient, files)
+        return super().send_all_to_internal_fahrplanmanagement(files, recipient)
+
     def send_eigenverbrauch_to_impuls_energy_trading(self, data, prediction_date: datetime.date) -> bool:
         successful = self.impuls_energy_trading_eigenverbrauch_sender.send_data(data, prediction_date)
         return successful
@@ -46,3 +87,32 @@ class DataSender(AbstractDataSender):
     def send_residual_long_to_impuls_energy_trading(self, data, prediction_date: datetime.date) -> bool:
         successful = self.impuls_energy_trading_residual_long_sender.send_data(data, prediction_date)
         return successful
+
+    def send_all_eigenverbrauch_to_impuls_energy_trading(
+        self, files: Sequence[tuple[DataFrame, datetime.date]]
+    ) -> list[Exception | None]:
+        return self.impuls_energy_trading_eigenverbrauch_sender.send_all_data(files)
+
+    def send_all_residual_long_to_impuls_energy_trading(
+        self, files: Sequence[tuple[DataFrame, datetime.date]]
+    ) -> list[Exception | None]:
+        return self.impuls_energy_trading_residual_long_sender.send_all_data(files)
+
+    @contextlib.contextmanager
+    def impuls_energy_trading_session(self) -> Iterator[None]:
+        with (
+            self.impuls_energy_trading_eigenverbrauch_sender.session(),
+            self.impuls_energy_trading_residual_long_sender.session(),
+        ):
+            yield
+
+
+def _send_each(send, files: Sequence[tuple[DataFrame, datetime.date]]) -> list[Exception | None]:
+    errors = []
+    for data, prediction_date in files:
+        try:
+            send(data, prediction_date=prediction_date)
+            errors.append(None)
+        except Exception as exc:
+            errors.append(exc)
+    return errors
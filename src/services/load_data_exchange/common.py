@@ -1,18 +1,33 @@
 import abc
+import contextlib
 import datetime
 import io
-from typing import Protocol
+import logging
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, ContextManager, Iterable, Iterator, Protocol, Sequence
 
+import numpy as np
 import pandas as pd
 import pandera
 from pandera.typing import DataFrame
-from paramiko import SSHClient, AutoAddPolicy, SFTPClient
+from paramiko import SFTPClient, SFTPAttributes
 
+from src.config import settings
+from src.domain.model import DownloadedFile
 from src.enums import Measurand
+from src.services.load_data_exchange.sftp_cache import SftpFileCache
+from src.services.load_data_exchange.sftp_pool import SftpSessionPool, SftpSession
 from src.utils.dataframe_schemas import TimeSeriesSchema
 
+logger = logging.getLogger(__name__)
+
 
 class AbstractLoadDataRetriever(abc.ABC):
+    download_manifest: Sequence[DownloadedFile] = ()  # remote files consumed by the last call of get_data
+
     @pandera.check_types
     def get_data(
         self,
@@ -21,8 +36,29 @@ class AbstractLoadDataRetriever(abc.ABC):
         start: datetime.datetime | None = None,
         end: datetime.datetime | None = None
     ) -> DataFrame[TimeSeriesSchema]:
+        self.download_manifest = []
         return self._get_data(asset_identifier, measurand, start, end)
 
+    def get_bulk_data(
+        self,
+        assets: Iterable[tuple[str, Measurand]],
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None
+    ) -> dict[tuple[str, Measurand], DataFrame[TimeSeriesSchema]]:
+        """
+        retrieves the data of several (asset identifier, measurand) pairs at once,
+        pairs whose data can't be retrieved are logged and left out of the result
+        """
+        time_range = {key: value for key, value in (("start", start), ("end", end)) if value is not None}
+        result = {}
+        for asset_identifier, measurand in dict.fromkeys(assets):
+            try:
+                result[(asset_identifier, measurand)] = self.get_data(asset_identifier, measurand, **time_range)
+            except Exception as exc:
+                logger.error("Could not get data for asset %s", asset_identifier)
+                logger.error(exc)
+        return result
+
     def _get_data(
         self,
         asset_identifier1: str,
@@ -38,6 +74,21 @@ class AbstractLoadDataSender(abc.ABC):
     def send_data(self, data: pd.DataFrame, **kwargs):
         ...
 
+    def send_all_data(self, files: Sequence[tuple[pd.DataFrame, datetime.date]]) -> list[Exception | None]:
+        # sends the (data, prediction date) <files>, returns the error of each file or None if it was sent
+        errors = []
+        for data, prediction_date in files:
+            try:
+                self.send_data(data, prediction_date)
+                errors.append(None)
+            except Exception as exc:
+                errors.append(exc)
+        return errors
+
+    def session(self) -> ContextManager:
+        # data sent within the session may share one connection
+        return contextlib.nullcontext()
+
 
 class APILoadDataRetriever(AbstractLoadDataRetriever):
     @pandera.check_types
@@ -48,6 +99,37 @@ class APILoadDataRetriever(AbstractLoadDataRetriever):
         raise NotImplementedError()
 
 
+class NewestFirstMerge:
+    """
+    merges forecast files from the newest to the oldest, rows of an older file are only kept for timestamps
+    that no newer file provides
+    """
+    def __init__(self):
+        self._parts: list[pd.DataFrame] = []
+        self._timestamps = np.empty(0, dtype="int64")  # sorted utc nanoseconds of all merged rows
+
+    def covers(self, start: datetime.datetime, end: datetime.datetime) -> bool:
+        # whether every quarter hour in [start, end) is already provided by a newer file
+        quarter_hours = pd.date_range(
+            pd.Timestamp(start.astimezone(datetime.timezone.utc)),
+            pd.Timestamp(end.astimezone(datetime.timezone.utc)),
+            freq="15min",
+            inclusive="left",
+        )
+        return bool(np.isin(quarter_hours.asi8, self._timestamps, assume_unique=True).all())
+
+    def add(self, df: pd.DataFrame) -> None:
+        df = df[~df.index.duplicated(keep="first")]
+        df = df[~np.isin(df.index.asi8, self._timestamps, assume_unique=True)]
+        if self._parts and df.empty:
+            return
+        self._parts.append(df)
+        self._timestamps = np.union1d(self._timestamps, df.index.asi8)
+
+    def result(self) -> pd.DataFrame:
+        return pd.concat(self._parts, axis=0).sort_index()
+
+
 class AbstractSftpClient(abc.ABC):
     pass
 
@@ -59,9 +141,12 @@ class SftpClient(Protocol):
     def _close_sftp(self):
         ...
 
+    def session(self) -> ContextManager:
+        ...
+
 
 class SftpDownloadGenerationPrediction(SftpClient, Protocol):
-    def download_generation_prediction(self, asset_identifier: str, **kwargs) -> list[io.BytesIO]:
+    def download_generation_prediction(self, asset_identifier: str, **kwargs) -> list[BinaryIO]:
         ...
 
 
@@ -69,24 +154,209 @@ class SftpUploadEigenverbrauch(SftpClient, Protocol):
     def upload_eigenverbrauch(self, file_obj: io.BytesIO):
         ...
 
+    def upload_eigenverbrauch_files(self, file_objs: Sequence[io.BytesIO]) -> list[Exception | None]:
+        ...
+
 
 class SftpUploadResidualLong(SftpClient, Protocol):
     def upload_residual_long(self, file_obj: io.BytesIO):
         ...
 
+    def upload_residual_long_files(self, file_objs: Sequence[io.BytesIO]) -> list[Exception | None]:
+        ...
+
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+sftp_session_pool = SftpSessionPool(
+    max_sessions_per_host=settings.sftp_max_sessions_per_host,
+    keepalive_seconds=settings.sftp_keepalive_seconds,
+    max_idle_seconds=settings.sftp_max_idle_seconds,
+)
+
+
+def default_sftp_file_cache() -> SftpFileCache | None:
+    if not settings.sftp_cache_path:
+        return None
+    return SftpFileCache(settings.sftp_cache_path, settings.sftp_cache_max_bytes)
+
 
 class SftpMixin:
+    cache: SftpFileCache | None = None
+    pool: SftpSessionPool = sftp_session_pool
+
+    @property
+    def _borrowed(self) -> threading.local:
+        # clients are shared module level instances, every thread borrows its own session from the pool
+        return self.__dict__.setdefault("_thread_borrowed", threading.local())
+
+    @property
+    def _open_count(self) -> int:
+        # the borrowed session is only released when every nested _open_sftp of the thread is closed
+        return getattr(self._borrowed, "open_count", 0)
+
+    @property
+    def _sftp(self) -> SFTPClient:
+        return self._borrowed.sftp
+
+    @_sftp.setter
+    def _sftp(self, sftp: SFTPClient):
+        self._borrowed.sftp = sftp
+
     def _open_sftp(self):
-        self._ssh = SSHClient()
-        self._ssh.set_missing_host_key_policy(AutoAddPolicy())  # todo: change to RejectPolicy
-        self._ssh.connect(
-            hostname=self.host,
-            username=self.username,
-            password=self.password,
-            timeout=60,
-        )
-        self._sftp: SFTPClient = self._ssh.open_sftp()
+        borrowed = self._borrowed
+        if self._open_count == 0:
+            borrowed.session = self.pool.acquire(self.host, self.username, self.password)
+            borrowed.sftp = borrowed.session.sftp
+        borrowed.open_count = self._open_count + 1
 
     def _close_sftp(self):
-        self._sftp.close()
-        self._ssh.close()
+        borrowed = self._borrowed
+        if self._open_count == 0:
+            return
+        borrowed.open_count -= 1
+        if borrowed.open_count == 0:
+            session, borrowed.session, borrowed.sftp = borrowed.session, None, None
+            self.pool.release(session)
+
+    @contextlib.contextmanager
+    def session(self) -> Iterator[None]:
+        # downloads and uploads of the thread within the session share one borrowed SSH connection
+        self._open_sftp()
+        try:
+            yield
+        finally:
+            self._close_sftp()
+
+    def _put_files(self, files: Sequence[tuple[str, BinaryIO]]) -> list[Exception | None]:
+        # uploads the (remote path, file) <files>, returns the error of each file or None if it was uploaded
+        concurrency = min(settings.sftp_upload_concurrency, len(files))
+        sftp = self._sftp
+        if concurrency <= 1:
+            return [_put_file_atomically(sftp, path, file_obj) for path, file_obj in files]
+        # like downloads, every worker uploads its share of the files over its own channel of the SSH connection
+        shares = [files[i::concurrency] for i in range(concurrency)]
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            uploaded = list(executor.map(lambda share: self._put_files_over_new_channel(sftp, share), shares))
+        errors: list[Exception | None] = [None] * len(files)
+        for i, share_errors in enumerate(uploaded):
+            errors[i::concurrency] = share_errors
+        return errors
+
+    def _put_files_over_new_channel(
+        self, session_sftp: SFTPClient, files: Sequence[tuple[str, BinaryIO]]
+    ) -> list[Exception | None]:
+        try:
+            sftp = self._open_channel(session_sftp)
+        except Exception as exc:
+            return [exc] * len(files)
+        try:
+            return [_put_file_atomically(sftp, path, file_obj) for path, file_obj in files]
+        finally:
+            sftp.close()
+
+    def _download_files(self, remote_dir: str, file_attrs: list[SFTPAttributes]) -> list[BinaryIO]:
+        # remote forecast files are immutable once written, so a cached file with the same name, size and
+        # modification time doesn't need to be downloaded again. Files are streamed into the cache and returned
+        # as open file handles, so memory doesn't grow with the number of files
+        namespace = f"{self.host}:{remote_dir}"
+        file_attrs = list({attrs.filename: attrs for attrs in file_attrs}.values())
+        file_objs: dict[str, BinaryIO] = {}
+        missing: list[SFTPAttributes] = []
+        for attrs in file_attrs:
+            raw = self.cache.open(namespace, attrs.filename, attrs.st_size, attrs.st_mtime) if self.cache else None
+            if raw is None:
+                missing.append(attrs)
+                continue
+            file_obj = LocalFile(raw, attrs.filename)
+            file_obj.download = DownloadedFile(
+                file_name=attrs.filename, size=attrs.st_size, duration=0.0, from_cache=True
+            )
+            file_objs[attrs.filename] = file_obj
+
+        for attrs, file_obj in zip(missing, self._fetch_files(remote_dir, namespace, missing)):
+            file_objs[attrs.filename] = file_obj
+        return [file_objs[attrs.filename] for attrs in file_attrs]
+
+    def _fetch_files(self, remote_dir: str, namespace: str, file_attrs: list[SFTPAttributes]) -> list[BinaryIO]:
+        concurrency = min(settings.sftp_download_concurrency, len(file_attrs))
+        sftp = self._sftp
+        if concurrency <= 1:
+            return [self._fetch_file(sftp, namespace, attrs) for attrs in file_attrs]
+        # every worker downloads its share of the files over its own channel of the borrowed SSH connection
+        shares = [file_attrs[i::concurrency] for i in range(concurrency)]
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            downloaded = list(executor.map(
+                lambda share: self._fetch_files_over_new_channel(sftp, remote_dir, namespace, share), shares
+            ))
+        file_objs: list[BinaryIO] = [None] * len(file_attrs)
+        for i, share_file_objs in enumerate(downloaded):
+            file_objs[i::concurrency] = share_file_objs
+        return file_objs
+
+    def _fetch_files_over_new_channel(
+        self, session_sftp: SFTPClient, remote_dir: str, namespace: str, file_attrs: list[SFTPAttributes]
+    ) -> list[BinaryIO]:
+        sftp = self._open_channel(session_sftp)
+        try:
+            sftp.chdir(remote_dir)
+            return [self._fetch_file(sftp, namespace, attrs) for attrs in file_attrs]
+        finally:
+            sftp.close()
+
+    def _fetch_file(self, sftp: SFTPClient, namespace: str, attrs: SFTPAttributes) -> BinaryIO:
+        started = time.monotonic()
+        if self.cache and self.cache.fits(attrs.st_size):
+            raw = self.cache.store(
+                namespace, attrs.filename, attrs.st_size, attrs.st_mtime,
+                lambda target: _copy_remote_file(sftp, attrs, target),
+            )
+            file_obj = LocalFile(raw, attrs.filename)
+        else:
+            file_obj = io.BytesIO()
+            file_obj.name = attrs.filename
+            _copy_remote_file(sftp, attrs, file_obj)
+            file_obj.seek(0)
+        file_obj.download = DownloadedFile(
+            file_name=attrs.filename, size=attrs.st_size, duration=time.monotonic() - started, from_cache=False
+        )
+        return file_obj
+
+    def _open_channel(self, session_sftp: SFTPClient) -> SFTPClient:
+        # the worker threads don't see the session borrowed by the calling thread, it is passed to them
+        return SFTPClient.from_transport(session_sftp.get_channel().get_transport())
+
+
+class LocalFile(io.BufferedReader):
+    # a downloaded file on local disk, named after the remote file like the in memory io.BytesIO files
+    name = None
+
+    def __init__(self, raw: io.RawIOBase, name: str):
+        super().__init__(raw)
+        self.name = name
+
+
+def _put_file_atomically(sftp: SFTPClient, path: str, file_obj: BinaryIO) -> Exception | None:
+    # the file is written under a temporary name and renamed when complete, so a partial file is never visible
+    temporary_path = f"{path}.part"
+    try:
+        sftp.putfo(file_obj, temporary_path)
+        try:
+            sftp.posix_rename(temporary_path, path)
+        except IOError:
+            # servers without the posix rename extension refuse to rename onto an existing file
+            with contextlib.suppress(IOError):
+                sftp.remove(path)
+            sftp.rename(temporary_path, path)
+    except Exception as exc:
+        with contextlib.suppress(Exception):
+            sftp.remove(temporary_path)
+        return exc
+    return None
+
+
+def _copy_remote_file(sftp: SFTPClient, attrs: SFTPAttributes, target: BinaryIO) -> None:
+    with sftp.open(attrs.filename, "rb") as f:
+        # request all blocks up front instead of waiting for a round trip per block, the size is known from the listing
+        f.prefetch(attrs.st_size)
+        shutil.copyfileobj(f, target, COPY_BUFFER_SIZE)
@@ -0,0 +1,54 @@
+import functools
+import os
+
+import numpy as np
+import pandas as pd
+
+FIFTEEN_MINUTES_IN_NANOSECONDS = 15 * 60 * 1_000_000_000
+
+
+def time_series_to_csv(df: pd.DataFrame, timestamp_format: str, decimal: str = ".") -> bytes:
+    """
+    writes a frame with a datetime index as semicolon separated csv, the index being the first column.
+    Produces the same output as formatting the index with strftime and calling to_csv, without modifying <df>
+    """
+    header = ";".join([df.index.name or "", *map(str, df.columns)])
+    if df.dtypes.nunique() <= 1:
+        rows = _format_values(df.to_numpy()).tolist()
+    else:
+        rows = zip(*(_format_values(df.iloc[:, i].to_numpy()).tolist() for i in range(df.shape[1])))
+    values = os.linesep.join(map(";".join, rows))
+    if decimal != ".":
+        # the values are written in repr format, the only dots in there are decimal points
+        values = values.replace(".", decimal)
+    timestamps = _format_timestamps(df.index, timestamp_format)
+    if df.shape[1]:
+        lines = map(";".join, zip(timestamps, values.split(os.linesep)))
+    else:
+        lines = timestamps
+    return os.linesep.join([header, *lines, ""]).encode()
+
+
+def _format_timestamps(index: pd.DatetimeIndex, timestamp_format: str) -> tuple[str, ...] | list[str]:
+    if len(index) > 1 and (np.diff(index.asi8) == FIFTEEN_MINUTES_IN_NANOSECONDS).all():
+        # predictions are sent for the same grid repeatedly, e.g. once per location
+        return _format_grid(index.asi8[0], len(index), str(index.tz), timestamp_format)
+    return list(index.strftime(timestamp_format))
+
+
+@functools.lru_cache(maxsize=64)
+def _format_grid(start: int, periods: int, tz: str, timestamp_format: str) -> tuple[str, ...]:
+    start = pd.Timestamp(start, tz="UTC")
+    index = pd.date_range(start, periods=periods, freq="15min")
+    if tz != "None":
+        index = index.tz_convert(tz)
+    else:
+        index = index.tz_localize(None)
+    return tuple(index.strftime(timestamp_format))
+
+
+def _format_values(values: np.ndarray) -> np.ndarray:
+    formatted = values.astype(str)
+    if values.dtype.kind == "f":
+        formatted[np.isnan(values)] = ""
+    return formatted
@@ -0,0 +1,29 @@
+from typing import BinaryIO
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+
+def read_time_series_csv(file_obj: BinaryIO, timestamp_column: str, timestamp_format: str) -> pd.DataFrame:
+    """
+    reads a semicolon separated forecast file with decimal commas into a frame with a naive "datetime" index
+    and a float64 "value" column, the value being the first column next to the timestamp.
+    Timestamps are parsed with the explicit <timestamp_format>, localizing them is up to the caller.
+    """
+    table = pa_csv.read_csv(
+        file_obj,
+        parse_options=pa_csv.ParseOptions(delimiter=";"),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={timestamp_column: pa.timestamp("s")},
+            timestamp_parsers=[timestamp_format, pa_csv.ISO8601],
+            decimal_point=",",
+        ),
+    )
+    value_column = next(name for name in table.column_names if name != timestamp_column)
+    index = pd.DatetimeIndex(
+        table.column(timestamp_column).cast(pa.timestamp("ns")).to_numpy(), name="datetime"
+    )
+    # files with only integral values are inferred as integers
+    values = table.column(value_column).cast(pa.float64()).to_numpy()
+    return pd.DataFrame({"value": values}, index=index)
@@ -1,7 +1,10 @@
+import contextlib
 import io
 import logging
 import abc
 import smtplib
+import threading
+from typing import ContextManager, Iterator, Sequence
 
 from pandera.typing import DataFrame
 
@@ -10,6 +13,7 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
 from traceback import format_exception
 
+from src.services.load_data_exchange.csv_export import time_series_to_csv
 from src.utils.dataframe_schemas import TimeSeriesSchema, FahrplanmanagementSchema
 
 logger = logging.getLogger(__name__)
@@ -23,48 +27,128 @@ class AbstractEmailSender(abc.ABC):
         # return True if email was sent successfully, False otherwise
         raise NotImplementedError
 
+    def send_many(
+        self, recipient: str, files: Sequence[tuple[str, DataFrame[TimeSeriesSchema]]]
+    ) -> list[bool]:
+        # sends the (file name, data) <files> in as few emails as possible, returns whether each file was sent
+        return [self.send(recipient, file_name, data) for file_name, data in files]
+
+    def session(self) -> ContextManager:
+        # mails sent within the session may share one connection
+        return contextlib.nullcontext()
+
 
 class ForecastEmailSender(AbstractEmailSender):
     def __init__(self):
         self.smtp_mail = settings.smtp_email
         self.smtp_pass = settings.smtp_pass
+        self._connection: smtplib.SMTP | None = None
+        self._open_sessions = 0
+        self._lock = threading.RLock()
+
+    @contextlib.contextmanager
+    def session(self) -> Iterator[None]:
+        with self._lock:
+            self._open_sessions += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._open_sessions -= 1
+                if not self._open_sessions:
+                    self._disconnect()
 
     def send(
         self, recipient: str, file_name: str, data: DataFrame[FahrplanmanagementSchema]
     ) -> bool:
+        return self._send_attachments(recipient, file_name, [(file_name, self._to_csv(data).getvalue())])
+
+    def send_many(
+        self, recipient: str, files: Sequence[tuple[str, DataFrame[FahrplanmanagementSchema]]]
+    ) -> list[bool]:
+        # one email per batch of attachments, batches are bounded by the size of their encoded attachments
+        attachments = [(file_name, self._to_csv(data).getvalue()) for file_name, data in files]
+        results = []
+        for batch in _size_bounded_batches(attachments, settings.email_max_attachment_bytes):
+            subject = batch[0][0] if len(batch) == 1 else f"{batch[0][0]} and {len(batch) - 1} more"
+            results.extend([self._send_attachments(recipient, subject, batch)] * len(batch))
+        return results
+
+    def _send_attachments(self, recipient: str, subject: str, attachments: list[tuple[str, bytes]]) -> bool:
         msg = MIMEMultipart()
         msg["From"] = self.smtp_mail
         msg["To"] = recipient
-        msg["Subject"] = file_name
+        msg["Subject"] = subject
 
-        buffer = self._to_csv(data)
-        attachment = MIMEApplication(buffer.getvalue(), Name=file_name)
-        attachment["Content-Disposition"] = f"attachment; filename={file_name}"
-        msg.attach(attachment)
+        for file_name, content in attachments:
+            attachment = MIMEApplication(content, Name=file_name)
+            attachment["Content-Disposition"] = f"attachment; filename={file_name}"
+            msg.attach(attachment)
 
         if not settings.send_predictions_enabled:
             return True
 
         send_errors = None
-        smtp_connection = smtplib.SMTP(settings.smtp_host, settings.smtp_port)
-        try:
-            smtp_connection.starttls()
-            smtp_connection.login(self.smtp_mail, self.smtp_pass)
-            send_errors = smtp_connection.sendmail(
-                self.smtp_mail, recipient, msg.as_string()
-            )
-        except Exception as exc:
-            formatted_exception = "".join(
-                format_exception(type(exc), exc, exc.__traceback__)
-            )
-            logger.error(formatted_exception)
-        finally:
-            smtp_connection.quit()
+        with self._lock:
+            try:
+                send_errors = self._sendmail(recipient, msg.as_string())
+            except Exception as exc:
+                formatted_exception = "".join(
+                    format_exception(type(exc), exc, exc.__traceback__)
+                )
+                logger.error(formatted_exception)
+                self._disconnect()
+            finally:
+                if not self._open_sessions:
+                    self._disconnect()
         return send_errors == {}
 
+    def _sendmail(self, recipient: str, msg: str) -> dict:
+        reused_connection = self._connection is not None
+        try:
+            return self._connect().sendmail(self.smtp_mail, recipient, msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError):
+            if not reused_connection:
+                raise
+            # the server closed the connection while it was idle
+            logger.info("SMTP connection was lost, reconnecting")
+            self._disconnect()
+            return self._connect().sendmail(self.smtp_mail, recipient, msg)
+
+    def _connect(self) -> smtplib.SMTP:
+        if self._connection is None:
+            connection = smtplib.SMTP(settings.smtp_host, settings.smtp_port)
+            try:
+                if settings.smtp_starttls:
+                    connection.starttls()
+                connection.login(self.smtp_mail, self.smtp_pass)
+            except Exception:
+                connection.close()
+                raise
+            self._connection = connection
+        return self._connection
+
+    def _disconnect(self) -> None:
+        connection, self._connection = self._connection, None
+        if connection is None:
+            return
+        try:
+            connection.quit()
+        except Exception:
+            connection.close()
+
     def _to_csv(self, data: DataFrame[TimeSeriesSchema]) -> io.BytesIO:
-        file_obj = io.BytesIO()
-        data.index = data.index.strftime("%Y-%m-%d %H:%M")
-        data.to_csv(file_obj, index=True, sep=";")
-        file_obj.seek(0)
-        return file_obj
+        return io.BytesIO(time_series_to_csv(data, "%Y-%m-%d %H:%M"))
+
+
+def _size_bounded_batches(attachments: list[tuple[str, bytes]], max_bytes: int) -> list[list[tuple[str, bytes]]]:
+    batches = []
+    batch_bytes = 0
+    for file_name, content in attachments:
+        encoded_bytes = (len(content) + 2) // 3 * 4  # attachments are base64 encoded
+        if not batches or batch_bytes + encoded_bytes > max_bytes:
+            batches.append([])
+            batch_bytes = 0
+        batches[-1].append((file_name, content))
+        batch_bytes += encoded_bytes
+    return batches
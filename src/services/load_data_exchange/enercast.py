@@ -1,15 +1,20 @@
+import dataclasses
 import datetime
 import io
 import re
+from typing import BinaryIO
 from functools import cmp_to_key
 
 import pandas as pd
 from pandera.typing import DataFrame
+from paramiko import SFTPAttributes
 
 from src.config import settings
 from src.enums import Measurand
 from src.services.load_data_exchange.common import SftpMixin, AbstractLoadDataRetriever, \
-    SftpDownloadGenerationPrediction
+    SftpDownloadGenerationPrediction, default_sftp_file_cache, NewestFirstMerge
+from src.services.load_data_exchange.csv_parsing import read_time_series_csv
+from src.services.load_data_exchange.sftp_listing import RemoteDirectoryIndex
 from src.utils.dataframe_schemas import TimeSeriesSchema
 from src.utils.timezone import TIMEZONE_BERLIN
 
@@ -22,13 +27,25 @@ def enercast_generation_file_name_match(file_name: str) -> re.Match:
     return re.fullmatch(pattern, file_name)
 
 
+def parse_enercast_generation_file_name(file_name: str) -> tuple[str, datetime.date, datetime.datetime] | None:
+    match = enercast_generation_file_name_match(file_name)
+    if not match:
+        return None
+    created = datetime.datetime.strptime(match["timestamp"], TIMESTAMP_FORMAT).astimezone(TIMEZONE_BERLIN)
+    return match["asset_identifier"], created.date(), created
+
+
 class EnercastSftpClient(SftpMixin):
     def __init__(self):
         self.username: str = settings.enercast_ftp_username
         self.password: str = settings.enercast_ftp_pass
         self.host: str = settings.enercast_ftp_host
+        self.cache = default_sftp_file_cache()
+        self.index = RemoteDirectoryIndex(
+            parse_enercast_generation_file_name, datetime.timedelta(seconds=settings.sftp_listing_max_age_seconds)
+        )
 
-    def download_generation_prediction(self, asset_identifier: str, start: datetime.datetime | None = None) -> list[io.BytesIO]:
+    def download_generation_prediction(self, asset_identifier: str, start: datetime.datetime | None = None) -> list[BinaryIO]:
         try:
             self._open_sftp()
             self._sftp.chdir("/forecasts")
@@ -36,27 +53,18 @@ class EnercastSftpClient(SftpMixin):
         except Exception as exc:
             print(exc)
         finally:
-            self._sftp.close()
-            self._ssh.close()
-
-    def _download_relevant_files(self, asset_identifier: str, start: datetime.datetime | None) -> list[io.BytesIO]:
-        file_names: list[str] = []
-        for file_name in self._sftp.listdir():
-            match = enercast_generation_file_name_match(file_name)
-            if match and match["asset_identifier"] == asset_identifier:
-                if start and datetime.datetime.strptime(match["timestamp"], TIMESTAMP_FORMAT).astimezone(TIMEZONE_BERLIN) + datetime.timedelta(days=7) < start:
+            self._close_sftp()
+
+    def _download_relevant_files(self, asset_identifier: str, start: datetime.datetime | None) -> list[BinaryIO]:
+        self.index.refresh_if_stale(self._sftp)
+        file_attrs: list[SFTPAttributes] = []
+        for listed_files in self.index.files(asset_identifier).values():
+            for listed_file in listed_files:
+                if start and listed_file.created + datetime.timedelta(days=7) < start:
                     continue
-                file_names.append(file_name)
-                file_names.append(file_name)
+                file_attrs.append(listed_file.attrs)
 
-        file_objs = []
-        for file_name in file_names:
-            file_obj = io.BytesIO()
-            file_obj.name = file_name
-            self._sftp.getfo(file_name, file_obj)
-            file_obj.seek(0)
-            file_objs.append(file_obj)
-        return file_objs
+        return self._download_files("/forecasts", file_attrs)
 
 
 class EnercastSftpDataRetriever(AbstractLoadDataRetriever):
@@ -77,31 +85,55 @@ class EnercastSftpDataRetriever(AbstractLoadDataRetriever):
         mask = (squashed_data.index >= start if start else True) & (squashed_data.index < end if end else True)
         return squashed_data[mask]
 
-    def _squash_files_data(self, files: list[io.BytesIO]) -> DataFrame[TimeSeriesSchema]:
+    def _squash_files_data(self, files: list[BinaryIO]) -> DataFrame[TimeSeriesSchema]:
         sorted_files = sorted(files, key=cmp_to_key(self._compare_file_names), reverse=True)
-        dfs = [self._csv_to_dataframe(file_obj) for file_obj in sorted_files]
-        df = pd.concat(dfs, axis=0, ignore_index=True)
-        df.rename(
-            columns={"Timestamp (Europe/Berlin)": "datetime", df.columns[1]: "value"},
-            inplace=True,
-        )
-        df.set_index("datetime", inplace=True)
-        df = df[~df.index.duplicated(keep='first')]
-        df = df.sort_index()
-        return df
+        merge = NewestFirstMerge()
+        for file_obj in sorted_files:
+            coverage = self._file_coverage(file_obj)
+            # skip the file if every timestamp of it is overwritten by newer files
+            used = not (coverage and merge.covers(*coverage))
+            if used:
+                merge.add(self._csv_to_dataframe(file_obj))
+            file_obj.close()
+            if hasattr(file_obj, "download"):
+                self.download_manifest.append(dataclasses.replace(file_obj.download, used=used))
+        return merge.result()
+
+    @staticmethod
+    def _file_coverage(file_obj: BinaryIO) -> tuple[datetime.datetime, datetime.datetime] | None:
+        """
+        period covered by the file, read from its first and last line without parsing the whole file
+        """
+        file_obj.readline()  # header
+        first_line = file_obj.readline()
+        file_obj.seek(max(0, file_obj.seek(0, io.SEEK_END) - 1024))
+        last_line = file_obj.read().rstrip().rsplit(b"\n", 1)[-1]
+        file_obj.seek(0)
+        try:
+            first, last = (
+                pd.Timestamp(line.split(b";", 1)[0].strip().decode()).tz_localize(
+                    "Europe/Berlin", ambiguous="NaT", nonexistent="NaT"
+                )
+                for line in (first_line, last_line)
+            )
+        except ValueError:
+            return None
+        if first is pd.NaT or last is pd.NaT:
+            return None
+        return first.to_pydatetime(), (last + pd.Timedelta(minutes=15)).to_pydatetime()
 
     def _csv_to_dataframe(self, file_obj):
-        df = pd.read_csv(file_obj, sep=";", decimal=",", index_col=None, header=0)
+        df = read_time_series_csv(file_obj, "Timestamp (Europe/Berlin)", "%Y-%m-%d %H:%M")
         # apparently pandas < 2.0 has a bug in tz_localize with zoneinfo ojbects.
         # see https://stackoverflow.com/a/77827969/15077097
         # currently we are restricted to pandas 1.5 because of constraints from optinode dependency
         # therefore tz_localize here works with the string "Europe/Berlin" and then the timezone is changed to
         # the zoneinfo object to stay consistens with the rest of the codebase
-        df["Timestamp (Europe/Berlin)"] = pd.to_datetime(df["Timestamp (Europe/Berlin)"]).dt.tz_localize("Europe/Berlin", ambiguous="infer").dt.tz_convert(TIMEZONE_BERLIN)
+        df.index = df.index.tz_localize("Europe/Berlin", ambiguous="infer").tz_convert(TIMEZONE_BERLIN)
         return df
 
     @staticmethod
-    def _compare_file_names(file_1: io.BytesIO, file_2: io.BytesIO):
+    def _compare_file_names(file_1: BinaryIO, file_2: BinaryIO):
         """
         compares the file names by the timestamp in the file name
         naming convention is <asset_name>_<timestamp>.csv
@@ -1,20 +1,37 @@
+import dataclasses
 import datetime
 import io
 import re
+from typing import BinaryIO, ContextManager, Sequence
 from functools import cmp_to_key
 
 import pandas as pd
 from pandera.typing import DataFrame
+from paramiko import SFTPAttributes
 
 from src.config import settings
 from src.enums import Measurand
 from src.services.load_data_exchange.common import SftpMixin, AbstractLoadDataRetriever, \
-    SftpDownloadGenerationPrediction, SftpUploadEigenverbrauch, AbstractLoadDataSender, SftpUploadResidualLong
+    SftpDownloadGenerationPrediction, SftpUploadEigenverbrauch, AbstractLoadDataSender, SftpUploadResidualLong, \
+    default_sftp_file_cache, NewestFirstMerge
+from src.services.load_data_exchange.csv_export import time_series_to_csv
+from src.services.load_data_exchange.csv_parsing import read_time_series_csv
+from src.services.load_data_exchange.sftp_listing import RemoteDirectoryIndex
 from src.utils.dataframe_schemas import TimeSeriesSchema, IetLoadDataSchema
 from src.utils.timezone import TIMEZONE_BERLIN
 
 
 TIMEZONE_FILENAMES = TIMEZONE_BERLIN
+EIGENVERBRAUCH_DIRECTORY = "/Eigenverbrauch/Anlagen"
+RESIDUAL_LONG_DIRECTORY = "/Ausspeisung/Anlagen"
+
+
+def parse_iet_generation_file_name(file_name: str) -> tuple[str, datetime.date, datetime.datetime] | None:
+    match = iet_generation_file_name_match(file_name)
+    if not match:
+        return None
+    created = datetime.datetime.strptime(match["creation_timestamp"], "%Y%m%d_%H%M").replace(tzinfo=TIMEZONE_FILENAMES)
+    return match["asset_id"], datetime.datetime.strptime(match["prognosis_date"], "%Y%m%d").date(), created
 
 
 class IetSftpClient(SftpMixin):
@@ -22,13 +39,17 @@ class IetSftpClient(SftpMixin):
         self.username: str = settings.iet_sftp_username
         self.password: str = settings.iet_sftp_pass
         self.host: str = settings.iet_sftp_host
+        self.cache = default_sftp_file_cache()
+        self.index = RemoteDirectoryIndex(
+            parse_iet_generation_file_name, datetime.timedelta(seconds=settings.sftp_listing_max_age_seconds)
+        )
 
     def download_generation_prediction(
         self,
         asset_identifier: str,
         start: datetime.datetime | None = None,
         end: datetime.datetime | None = None
-    ) -> list[io.BytesIO]:
+    ) -> list[BinaryIO]:
         try:
             self._open_sftp()
             self._sftp.chdir("/Erzeugungsprognose")
@@ -40,48 +61,50 @@ class IetSftpClient(SftpMixin):
         except Exception as exc:
             print(exc)
         finally:
-            self._sftp.close()
-            self._ssh.close()
+            self._close_sftp()
 
     def _download_relevant_files(
             self, asset_identifier: str, start: datetime.datetime | None, end: datetime.datetime | None
-    ) -> list[io.BytesIO]:
-        file_names: list[str] = []
-        for file_name in self._sftp.listdir():
-            match = iet_generation_file_name_match(file_name)
-            if match and match["asset_id"] == asset_identifier and self._prognosis_date_overlaps_with_time_range(
-                datetime.datetime.strptime(match["prognosis_date"], "%Y%m%d").date(), start, end
-            ):
-                file_names.append(file_name)
-
-        file_objs = []
-        for file_name in file_names:
-            file_obj = io.BytesIO()
-            file_obj.name = file_name
-            self._sftp.getfo(file_name, file_obj)
-            file_obj.seek(0)
-            file_objs.append(file_obj)
-        return file_objs
+    ) -> list[BinaryIO]:
+        self.index.refresh_if_stale(self._sftp)
+        file_attrs: list[SFTPAttributes] = []
+        for prognosis_date, listed_files in self.index.files(asset_identifier).items():
+            if self._prognosis_date_overlaps_with_time_range(prognosis_date, start, end):
+                # every file covers the whole prognosis date, so older files of the same date are shadowed
+                newest = max(listed_file.created for listed_file in listed_files)
+                file_attrs.extend(listed_file.attrs for listed_file in listed_files if listed_file.created == newest)
+
+        return self._download_files("/Erzeugungsprognose", file_attrs)
 
     def upload_eigenverbrauch(self, file_obj: io.BytesIO):
-        file_path = f"/Eigenverbrauch/Anlagen/{file_obj.name}"
-        self._upload_file(file_obj, file_path)
+        self._upload_file(file_obj, EIGENVERBRAUCH_DIRECTORY)
 
     def upload_residual_long(self, file_obj: io.BytesIO):
-        file_path = f"/Ausspeisung/Anlagen/{file_obj.name}"
-        self._upload_file(file_obj, file_path)
+        self._upload_file(file_obj, RESIDUAL_LONG_DIRECTORY)
+
+    def upload_eigenverbrauch_files(self, file_objs: Sequence[io.BytesIO]) -> list[Exception | None]:
+        return self._upload_files(file_objs, EIGENVERBRAUCH_DIRECTORY)
 
-    def _upload_file(self, file_obj: io.BytesIO, path: str):
+    def upload_residual_long_files(self, file_objs: Sequence[io.BytesIO]) -> list[Exception | None]:
+        return self._upload_files(file_objs, RESIDUAL_LONG_DIRECTORY)
+
+    def _upload_file(self, file_obj: io.BytesIO, directory: str):
+        # failures are raised, the outbox retries the upload
+        error, = self._upload_files([file_obj], directory)
+        if error is not None:
+            raise error
+
+    def _upload_files(self, file_objs: Sequence[io.BytesIO], directory: str) -> list[Exception | None]:
         if not settings.send_predictions_enabled:
-            return
+            return [None] * len(file_objs)
         try:
             self._open_sftp()
-            self._sftp.putfo(file_obj, remotepath=path)
         except Exception as exc:
-            print(exc)
+            return [exc] * len(file_objs)
+        try:
+            return self._put_files([(f"{directory}/{file_obj.name}", file_obj) for file_obj in file_objs])
         finally:
-            self._sftp.close()
-            self._ssh.close()
+            self._close_sftp()
 
     def _prognosis_date_overlaps_with_time_range(
         self,
@@ -121,28 +144,39 @@ class IetSftpGenerationDataRetriever(AbstractLoadDataRetriever):
         mask = (squashed_data.index >= start if start else True) & (squashed_data.index < end if end else True)
         return squashed_data[mask]
 
-    def _squash_files_data(self, files: list[io.BytesIO]) -> DataFrame[TimeSeriesSchema]:
+    def _squash_files_data(self, files: list[BinaryIO]) -> DataFrame[TimeSeriesSchema]:
         sorted_files = sorted(files, key=cmp_to_key(self._compare_file_names), reverse=True)
-        dfs = [self._csv_to_dataframe(file_obj) for file_obj in sorted_files]
-        df = pd.concat(dfs, axis=0, ignore_index=True)
-        df.rename(
-            columns={"utc_timestamp": "datetime", "power_mw": "value"},
-            inplace=True,
+        merge = NewestFirstMerge()
+        for file_obj in sorted_files:
+            # skip the file if every timestamp of it is overwritten by newer files
+            used = not merge.covers(*self._file_coverage(file_obj))
+            if used:
+                merge.add(self._csv_to_dataframe(file_obj))
+            file_obj.close()
+            if hasattr(file_obj, "download"):
+                self.download_manifest.append(dataclasses.replace(file_obj.download, used=used))
+        return merge.result()
+
+    @staticmethod
+    def _file_coverage(file_obj: BinaryIO) -> tuple[datetime.datetime, datetime.datetime]:
+        # a file contains the prognosis for the whole day of the prognosis date in its name
+        prognosis_date = datetime.datetime.strptime(
+            iet_generation_file_name_match(file_obj.name)["prognosis_date"], "%Y%m%d"
+        ).date()
+        start = datetime.datetime.combine(prognosis_date, datetime.time.min, tzinfo=TIMEZONE_FILENAMES)
+        end = datetime.datetime.combine(
+            prognosis_date + datetime.timedelta(days=1), datetime.time.min, tzinfo=TIMEZONE_FILENAMES
         )
-        df["value"] = df["value"].mul(1000)
-        df.set_index("datetime", inplace=True)
-        df.index = pd.to_datetime(df.index, utc=True, format="%d.%m.%Y %H:%M")
-        df = df.tz_convert(TIMEZONE_BERLIN)
-        df = df[~df.index.duplicated(keep='first')]
-        df = df.sort_index()
-        return df
+        return start, end
 
     def _csv_to_dataframe(self, file_obj):
-        df = pd.read_csv(file_obj, sep=";", decimal=",", index_col=None, header=0)
+        df = read_time_series_csv(file_obj, "utc_timestamp", "%d.%m.%Y %H:%M")
+        df["value"] = df["value"].mul(1000)  # power_mw
+        df.index = df.index.tz_localize("UTC").tz_convert(TIMEZONE_BERLIN)
         return df
 
     @staticmethod
-    def _compare_file_names(file_1: io.BytesIO, file_2: io.BytesIO) -> int:
+    def _compare_file_names(file_1: BinaryIO, file_2: BinaryIO) -> int:
         """
         compares the file names by the timestamp in the file name
         naming convention is <creation_timestamp>_erzeugerprognose_<asset_uuid>_<prognosis_date>.csv
@@ -169,41 +203,50 @@ def iet_generation_file_name_match(file_name: str) -> re.Match:
     return re.fullmatch(pattern, file_name)
 
 
+# both senders upload to the same server, sharing the client lets them share its session within a thread.
+# Threads delivering at the same time, like the outbox worker and the scheduled jobs, borrow their own sessions
+iet_sftp_upload_client = IetSftpClient()
+
+
 class IetSftpEigenverbrauchDataSender(AbstractLoadDataSender):
-    def __init__(self, sftp_client: SftpUploadEigenverbrauch = IetSftpClient()):
+    def __init__(self, sftp_client: SftpUploadEigenverbrauch = iet_sftp_upload_client):
         self.sftp_client = sftp_client
 
     def send_data(self, data: DataFrame[IetLoadDataSchema], prediction_date: datetime.date) -> None:
         file_obj = self._to_csv(data, prediction_date)
         return self.sftp_client.upload_eigenverbrauch(file_obj)
 
+    def send_all_data(self, files: Sequence[tuple[DataFrame[IetLoadDataSchema], datetime.date]]) -> list[Exception | None]:
+        return self.sftp_client.upload_eigenverbrauch_files([self._to_csv(data, date) for data, date in files])
+
+    def session(self) -> ContextManager:
+        return self.sftp_client.session()
+
     def _to_csv(self, df: DataFrame[IetLoadDataSchema], prediction_date: datetime.date) -> io.BytesIO:
-        file_obj = io.BytesIO()
+        file_obj = io.BytesIO(time_series_to_csv(df, '%d.%m.%Y %H:%M:%S', decimal=","))
         today = datetime.date.today().strftime('%Y%m%d')
         prediction_date_str = prediction_date.strftime('%Y%m%d')
         file_obj.name = f"{today}_eigenverbrauch_anlagen_{prediction_date_str}.csv"
-        df.reset_index(inplace=True)
-        df["#timestamp"] = df["#timestamp"].dt.strftime('%d.%m.%Y %H:%M:%S')
-        df.to_csv(file_obj, sep=";", decimal=",", index=False)
-        file_obj.seek(0)
         return file_obj
 
 
 class IetSftpResidualLongDataSender(AbstractLoadDataSender):
-    def __init__(self, sftp_client: SftpUploadResidualLong = IetSftpClient()):
+    def __init__(self, sftp_client: SftpUploadResidualLong = iet_sftp_upload_client):
         self.sftp_client = sftp_client
 
     def send_data(self, data: DataFrame[IetLoadDataSchema], prediction_date: datetime.date) -> None:
         file_obj = self._to_csv(data, prediction_date)
         return self.sftp_client.upload_residual_long(file_obj)
 
+    def send_all_data(self, files: Sequence[tuple[DataFrame[IetLoadDataSchema], datetime.date]]) -> list[Exception | None]:
+        return self.sftp_client.upload_residual_long_files([self._to_csv(data, date) for data, date in files])
+
+    def session(self) -> ContextManager:
+        return self.sftp_client.session()
+
     def _to_csv(self, df: DataFrame[IetLoadDataSchema], prediction_date: datetime.date) -> io.BytesIO:
-        file_obj = io.BytesIO()
+        file_obj = io.BytesIO(time_series_to_csv(df, '%d.%m.%Y %H:%M:%S', decimal=","))
         today = datetime.date.today().strftime('%Y%m%d')
         prediction_date_str = prediction_date.strftime('%Y%m%d')
         file_obj.name = f"{today}_ausspeisemengen_{prediction_date_str}.csv"
-        df.reset_index(inplace=True)
-        df["#timestamp"] = df["#timestamp"].dt.strftime('%d.%m.%Y %H:%M:%S')
-        df.to_csv(file_obj, sep=";", decimal=",", index=False)
-        file_obj.seek(0)
         return file_obj
@@ -1,9 +1,14 @@
 import datetime
 import datetime as dt
+import hashlib
+import logging
 import os
-from typing import Collection
+import threading
+from collections import defaultdict
+from typing import Collection, Iterable
 
 import pandas as pd
+import pandera
 from pandera.typing import DataFrame
 
 from src.config import settings
@@ -13,9 +18,21 @@ from src.utils.dataframe_schemas import TimeSeriesSchema
 from src.utils.exceptions import NoMeteringOrMarketLocationFound, ConflictingEnergyData
 from src.utils.timezone import TIMEZONE_BERLIN
 
+logger = logging.getLogger(__name__)
 
-class OptinodeDataRetriever(AbstractLoadDataRetriever):  # TODO get rid of this
-    def __init__(self):
+_django_setup_lock = threading.Lock()
+_django_is_set_up = False
+
+
+def setup_optinode() -> None:
+    """
+    bootstraps django for optinode. Importing django and optinode is expensive, so this is deferred until
+    optinode is used for the first time unless the process warms it up on startup
+    """
+    global _django_is_set_up
+    with _django_setup_lock:
+        if _django_is_set_up:
+            return
         os.environ["SECRET_KEY"] = "topsecret"
         os.environ["DATABASE_URL"] = settings.optinode_db_connection_string
         os.environ["DJANGO_SETTINGS_MODULE"] = (
@@ -24,7 +41,10 @@ class OptinodeDataRetriever(AbstractLoadDataRetriever):  # TODO get rid of this
         import django
 
         django.setup()
+        _django_is_set_up = True
+
 
+class OptinodeDataRetriever(AbstractLoadDataRetriever):  # TODO get rid of this
     def _get_data(
         self,
         asset_identifier: str,
@@ -32,46 +52,73 @@ class OptinodeDataRetriever(AbstractLoadDataRetriever):  # TODO get rid of this
         start: datetime.datetime | None = None,
         end: datetime.datetime | None = None
     ) -> DataFrame[TimeSeriesSchema]:
-        if not start:
-            start = dt.datetime.combine(dt.date.today(), dt.time.min, tzinfo=TIMEZONE_BERLIN) - dt.timedelta(days=90)
-        malo = self._get_market_location(asset_identifier, start, measurand)
+        setup_optinode()
+        from optinode.webserver.configurator.models import MeteringOrMarketLocation
 
-        energy_data: pd.Series = malo.get_load_profile(
-            start=start, end=end, measurand=measurand.value
-        )
-        energy_data = energy_data.tz_convert(TIMEZONE_BERLIN)
-        energy_data.name = "value"
-        energy_data.index.name = "datetime"
-        return DataFrame[TimeSeriesSchema](energy_data.to_frame())
+        locations = list(MeteringOrMarketLocation.objects.filter(number=asset_identifier, site__is_ppaaas=True))
+        return self._load_profile(asset_identifier, locations, measurand, start, end)
+
+    def get_bulk_data(
+        self,
+        assets: Iterable[tuple[str, Measurand]],
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None
+    ) -> dict[tuple[str, Measurand], DataFrame[TimeSeriesSchema]]:
+        setup_optinode()
+        assets = list(dict.fromkeys(assets))
+        locations_by_number = self._get_market_locations({number for number, _ in assets})
+        result = {}
+        for number, measurand in assets:
+            try:
+                result[(number, measurand)] = self._load_profile(
+                    number, locations_by_number.get(number, []), measurand, start, end
+                )
+            except Exception as exc:
+                logger.error("Could not get data for asset %s", number)
+                logger.error(exc)
+        return result
 
-    def _get_market_location(
-        self, market_location_number: str, start_date: dt.datetime, measurand: Measurand
-    ):
+    @staticmethod
+    def _get_market_locations(market_location_numbers: Collection[str]) -> dict[str, list]:
+        # one query per batch of numbers instead of one per market location
         from optinode.webserver.configurator.models import MeteringOrMarketLocation
 
-        locations = MeteringOrMarketLocation.objects.filter(
-            number=market_location_number,
-            site__is_ppaaas=True
-        )
-        if not locations.exists():
+        numbers = sorted(market_location_numbers)
+        locations_by_number = defaultdict(list)
+        for i in range(0, len(numbers), settings.optinode_query_batch_size):
+            for location in MeteringOrMarketLocation.objects.filter(
+                number__in=numbers[i:i + settings.optinode_query_batch_size],
+                site__is_ppaaas=True
+            ):
+                locations_by_number[location.number].append(location)
+        return locations_by_number
+
+    @pandera.check_types
+    def _load_profile(
+        self,
+        market_location_number: str,
+        locations: list,
+        measurand: Measurand,
+        start: datetime.datetime | None,
+        end: datetime.datetime | None
+    ) -> DataFrame[TimeSeriesSchema]:
+        if not locations:
             raise NoMeteringOrMarketLocationFound(market_location_number)
+        if not start:
+            start = dt.datetime.combine(dt.date.today(), dt.time.min, tzinfo=TIMEZONE_BERLIN) - dt.timedelta(days=90)
 
-        if not self._all_locations_have_equal_energy_data(
-            locations, start_date, measurand
-        ):
+        # every duplicate of a market location is loaded once and must provide the same energy data
+        energy_data = [loc.get_load_profile(start=start, end=end, measurand=measurand.value) for loc in locations]
+        if len({_series_hash(ed) for ed in energy_data}) > 1:
             raise ConflictingEnergyData(market_location_number)
-        return locations[0]
 
-    @staticmethod
-    def _all_locations_have_equal_energy_data(
-        locations: Collection, start_date: dt.datetime, measurand: Measurand
-    ) -> bool:
-        if len(locations) == 1:
-            return True
-        energy_data = [
-            loc.get_load_profile(
-                start=start_date, measurand=measurand
-            )
-            for loc in locations
-        ]
-        return all([energy_data[0].equals(ed) for ed in energy_data[1:]])
+        energy_data: pd.Series = energy_data[0].tz_convert(TIMEZONE_BERLIN)
+        energy_data.name = "value"
+        energy_data.index.name = "datetime"
+        return DataFrame[TimeSeriesSchema](energy_data.to_frame())
+
+
+def _series_hash(series: pd.Series) -> str:
+    h = hashlib.sha256(str(series.dtype).encode())
+    h.update(pd.util.hash_pandas_object(series, index=True).to_numpy().tobytes())
+    return h.hexdigest()
@@ -0,0 +1,87 @@
+import hashlib
+import io
+import os
+import pathlib
+import threading
+from typing import BinaryIO, Callable
+
+
+class SftpFileCache:
+    """
+    local disk cache for downloaded remote files, keyed by remote name, size and modification time,
+    so that a changed remote file is downloaded again. Least recently used files are evicted once the
+    cached files exceed <max_bytes>.
+    """
+    def __init__(self, directory: str | os.PathLike, max_bytes: int):
+        self._directory = pathlib.Path(directory)
+        self._max_bytes = max_bytes
+        self._total_bytes: int | None = None  # determined lazily, the cache must not touch the disk on import
+        self._lock = threading.Lock()
+
+    def open(self, namespace: str, file_name: str, size: int, mtime: int) -> io.FileIO | None:
+        path = self._path(namespace, file_name, size, mtime)
+        try:
+            f = io.FileIO(path, "rb")
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            return None
+        return f
+
+    def fits(self, size: int) -> bool:
+        return size <= self._max_bytes
+
+    def store(
+        self, namespace: str, file_name: str, size: int, mtime: int, write: Callable[[BinaryIO], None]
+    ) -> io.FileIO:
+        # <write> streams the file content into the cache file, there is no need to hold it in memory.
+        # The cached file is returned opened for reading
+        path = self._path(namespace, file_name, size, mtime)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, "wb") as target:
+                write(target)
+            os.replace(tmp_path, path)
+            # open before evicting, files that are open for reading stay readable after they are removed
+            f = io.FileIO(path, "rb")
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_total_bytes()
+            else:
+                self._total_bytes += os.fstat(f.fileno()).st_size
+            if self._total_bytes > self._max_bytes:
+                self._evict()
+        return f
+
+    def _path(self, namespace: str, file_name: str, size: int, mtime: int) -> pathlib.Path:
+        key = hashlib.sha256(f"{namespace}\0{file_name}\0{size}\0{mtime}".encode()).hexdigest()
+        return self._directory / key
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        # (last used, size, path) of all cached files
+        entries = []
+        with os.scandir(self._directory) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _scan_total_bytes(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self) -> None:
+        # rescan, other processes might share the cache directory
+        entries = sorted(self._entries())
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total_bytes <= self._max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+        self._total_bytes = total_bytes
@@ -0,0 +1,61 @@
+import datetime
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from paramiko import SFTPAttributes, SFTPClient
+
+from src.utils.timezone import utc_now
+
+
+@dataclass(frozen=True)
+class ListedFile:
+    attrs: SFTPAttributes
+    asset_identifier: str
+    date: datetime.date
+    created: datetime.datetime
+
+
+# parses a remote file name into asset identifier, date and creation time, None for files that are not of interest
+FileNameParser = Callable[[str], Optional[tuple[str, datetime.date, datetime.datetime]]]
+
+
+class RemoteDirectoryIndex:
+    """
+    listing of a remote directory grouped by asset identifier and date. The directory is listed at most once
+    per <max_age>, so that all producers of a run share one listing, and every file name is parsed only once.
+    """
+    def __init__(self, parse_file_name: FileNameParser, max_age: datetime.timedelta):
+        self._parse_file_name = parse_file_name
+        self._max_age = max_age
+        self._parsed: dict[str, Optional[tuple[str, datetime.date, datetime.datetime]]] = {}
+        self._files: dict[str, dict[datetime.date, list[ListedFile]]] = {}
+        self._listed_at: datetime.datetime | None = None
+        self._lock = threading.Lock()
+
+    def refresh_if_stale(self, sftp: SFTPClient) -> None:
+        with self._lock:
+            if self._listed_at is not None and utc_now() - self._listed_at < self._max_age:
+                return
+            self._refresh(sftp)
+
+    def files(self, asset_identifier: str) -> dict[datetime.date, list[ListedFile]]:
+        return self._files.get(asset_identifier, {})
+
+    def _refresh(self, sftp: SFTPClient) -> None:
+        parsed: dict[str, Optional[tuple[str, datetime.date, datetime.datetime]]] = {}
+        files: dict[str, dict[datetime.date, list[ListedFile]]] = defaultdict(lambda: defaultdict(list))
+        for attrs in sftp.listdir_attr():
+            if attrs.filename in self._parsed:
+                key = self._parsed[attrs.filename]
+            else:
+                key = self._parse_file_name(attrs.filename)
+            parsed[attrs.filename] = key
+            if key is not None:
+                asset_identifier, date, created = key
+                files[asset_identifier][date].append(ListedFile(attrs, asset_identifier, date, created))
+        # forget files that were removed from the remote directory
+        self._parsed = parsed
+        self._files = {asset: dict(by_date) for asset, by_date in files.items()}
+        self._listed_at = utc_now()
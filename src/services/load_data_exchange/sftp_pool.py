@@ -0,0 +1,110 @@
+import threading
+import time
+from dataclasses import dataclass, field
+
+from paramiko import SSHClient, AutoAddPolicy, SFTPClient
+
+
+@dataclass
+class SftpSession:
+    host: str
+    username: str
+    ssh: SSHClient
+    sftp: SFTPClient
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class SftpSessionPool:
+    """
+    keeps authenticated SFTP sessions open between downloads and uploads, so that a run only needs a handful
+    of SSH handshakes. Idle sessions are health checked before they are lent again and at most
+    <max_sessions_per_host> sessions per host and user are lent at the same time.
+    """
+    def __init__(self, max_sessions_per_host: int, keepalive_seconds: int, max_idle_seconds: int, timeout: int = 60):
+        self._max_sessions_per_host = max_sessions_per_host
+        self._keepalive_seconds = keepalive_seconds
+        self._max_idle_seconds = max_idle_seconds
+        self._timeout = timeout
+        self._idle: dict[tuple[str, str], list[SftpSession]] = {}
+        self._limits: dict[tuple[str, str], threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host: str, username: str, password: str) -> SftpSession:
+        key = (host, username)
+        with self._lock:
+            limit = self._limits.setdefault(key, threading.BoundedSemaphore(self._max_sessions_per_host))
+        limit.acquire()
+        try:
+            session = self._take_idle(key)
+            if session is None:
+                session = self._connect(host, username, password)
+        except BaseException:
+            limit.release()
+            raise
+        return session
+
+    def release(self, session: SftpSession) -> None:
+        key = (session.host, session.username)
+        try:
+            session.sftp.chdir(None)  # the next borrower must not depend on the working directory
+            session.last_used = time.monotonic()
+            with self._lock:
+                self._idle.setdefault(key, []).append(session)
+        except Exception:
+            self._close(session)
+        finally:
+            self._limits[key].release()
+
+    def close_all(self) -> None:
+        with self._lock:
+            sessions = [session for idle in self._idle.values() for session in idle]
+            self._idle.clear()
+        for session in sessions:
+            self._close(session)
+
+    def _take_idle(self, key: tuple[str, str]) -> SftpSession | None:
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    return None
+                session = idle.pop()
+            if self._is_healthy(session):
+                return session
+            self._close(session)
+
+    def _is_healthy(self, session: SftpSession) -> bool:
+        if time.monotonic() - session.last_used > self._max_idle_seconds:
+            return False
+        transport = session.ssh.get_transport()
+        if transport is None or not transport.is_active():
+            return False
+        try:
+            session.sftp.normalize(".")  # cheap round trip to the server
+        except Exception:
+            return False
+        return True
+
+    def _connect(self, host: str, username: str, password: str) -> SftpSession:
+        ssh = SSHClient()
+        ssh.set_missing_host_key_policy(AutoAddPolicy())  # todo: change to RejectPolicy
+        ssh.connect(
+            hostname=host,
+            username=username,
+            password=password,
+            timeout=self._timeout,
+        )
+        try:
+            ssh.get_transport().set_keepalive(self._keepalive_seconds)
+            sftp = ssh.open_sftp()
+        except BaseException:
+            ssh.close()
+            raise
+        return SftpSession(host, username, ssh, sftp)
+
+    @staticmethod
+    def _close(session: SftpSession) -> None:
+        try:
+            session.sftp.close()
+        finally:
+            session.ssh.close()
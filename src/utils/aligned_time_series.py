@@ -0,0 +1,55 @@
+import datetime
+import functools
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+def align_time_series(dfs: Sequence[pd.DataFrame]) -> tuple[pd.DatetimeIndex, np.ndarray, np.dtype]:
+    """
+    reindexes the "value" columns of <dfs> once onto their common index, the outer join pandas arithmetic would align
+    them on. Returns the index, one float column per frame and the dtype pandas arithmetic would produce
+    """
+    index = functools.reduce(lambda left, right: left.join(right, how="outer"), (df.index for df in dfs))
+    values = np.full((len(index), len(dfs)), np.nan)
+    reindexed = False
+    for i, df in enumerate(dfs):
+        if df.index.equals(index):
+            values[:, i] = df["value"].to_numpy(dtype=float)
+            continue
+        reindexed = True
+        values[index.get_indexer(df.index), i] = df["value"].to_numpy(dtype=float)
+    dtype = np.result_type(*(df["value"].dtype for df in dfs))
+    if reindexed and dtype.kind in "iub":
+        dtype = np.dtype(float)  # missing values introduced by the alignment
+    return index, values, dtype
+
+
+def positions_in_date_range(
+    index: pd.DatetimeIndex, start: datetime.date, end: Optional[datetime.date]
+) -> slice | np.ndarray:
+    # positions of the timestamps whose local date is within [start, end)
+    if index.is_monotonic_increasing:
+        start_position = index.searchsorted(_day_start(start, index))
+        end_position = index.searchsorted(_day_start(end, index)) if end else len(index)
+        return slice(start_position, end_position)
+    dates = index.date
+    return (dates >= start) & (dates < end if end else True)
+
+
+def trim_to_valid(index: pd.DatetimeIndex, values: np.ndarray) -> tuple[pd.DatetimeIndex, np.ndarray]:
+    # like slicing a frame from its first to its last valid index, all missing values are kept as they are
+    valid = np.flatnonzero(~np.isnan(values))
+    if len(valid) == 0:
+        return index, values
+    return index[valid[0]:valid[-1] + 1], values[valid[0]:valid[-1] + 1]
+
+
+def to_time_series(index: pd.DatetimeIndex, values: np.ndarray, dtype: np.dtype) -> pd.DataFrame:
+    return pd.DataFrame({"value": values.astype(dtype, copy=False)}, index=index)
+
+
+def _day_start(date: datetime.date, index: pd.DatetimeIndex) -> pd.Timestamp:
+    day_start = pd.Timestamp(datetime.datetime.combine(date, datetime.time.min))
+    return day_start.tz_localize(index.tz) if index.tz is not None else day_start
@@ -2,16 +2,36 @@ import datetime
 import zoneinfo
 from collections import OrderedDict
 
+import numpy as np
 import pandas as pd
 
+NANOSECONDS_PER_DAY = 24 * 60 * 60 * 1_000_000_000
+UNIX_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
 
 def split_df_by_day(df: pd.DataFrame, timezone_for_day_boundary: zoneinfo.ZoneInfo | None) -> OrderedDict[datetime.date, [pd.DataFrame]]:
+    index = df.index
+    if index.tz is not None:
+        index = index.tz_convert(timezone_for_day_boundary).tz_localize(None)
+    # local days since the epoch, floor division also works for timestamps before 1970
+    day_codes = index.asi8 // NANOSECONDS_PER_DAY
+
     dfs_by_day = OrderedDict()
-    if not timezone_for_day_boundary:
-        timestamps_series = pd.Series(index=df.index)
+    if len(day_codes) == 0:
+        return dfs_by_day
+    if index.is_monotonic_increasing:
+        # every day is a contiguous block, slicing by position returns views where possible
+        boundaries = np.flatnonzero(np.diff(day_codes)) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(day_codes)]))
+        for start, end in zip(starts, ends):
+            dfs_by_day[_to_date(day_codes[start])] = df.iloc[start:end]
     else:
-        timestamps_series = pd.Series(df.tz_convert(timezone_for_day_boundary).index)
-    unique_dates = timestamps_series.dt.date.unique()
-    for day in unique_dates:
-        dfs_by_day[day] = df[df.tz_convert(timezone_for_day_boundary).index.date == day]
+        positions_by_day = pd.Series(day_codes).groupby(day_codes).indices
+        for day_code in pd.unique(day_codes):
+            dfs_by_day[_to_date(day_code)] = df.iloc[positions_by_day[day_code]]
     return dfs_by_day
+
+
+def _to_date(day_code: int) -> datetime.date:
+    return datetime.date.fromordinal(UNIX_EPOCH_ORDINAL + int(day_code))
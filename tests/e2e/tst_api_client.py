@@ -247,19 +247,19 @@ class TestLocation:
             producers=[
                 ProducerFactory.build(prognosis_data_retriever=enums.DataRetriever.IMPULS_ENERGY_TRADING_SFTP)
             ],
-            predictions=[
-                PredictionFactory.build(
-                    type=enums.PredictionType.CONSUMPTION,
-                    shipments=[PredictionShipmentFactory.build(receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT)]
-                ),
-                PredictionFactory.build(
-                    type=enums.PredictionType.PRODUCTION,
-                    shipments=[PredictionShipmentFactory.build(receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT)]
-                )
-            ]
         )
         with bus.uow as uow:
             uow.locations.add(location)
+            uow.predictions.add(PredictionFactory.build(
+                location_id=location.id,
+                type=enums.PredictionType.CONSUMPTION,
+                shipments=[PredictionShipmentFactory.build(receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT)]
+            ))
+            uow.predictions.add(PredictionFactory.build(
+                location_id=location.id,
+                type=enums.PredictionType.PRODUCTION,
+                shipments=[PredictionShipmentFactory.build(receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT)]
+            ))
             uow.commit()
         # ACT
         response = client.post(
@@ -277,17 +277,17 @@ class TestLocation:
             producers=[
                 ProducerFactory.build(prognosis_data_retriever=enums.DataRetriever.IMPULS_ENERGY_TRADING_SFTP)
             ],
-            predictions=[
-                PredictionFactory.build(
-                    type=enums.PredictionType.CONSUMPTION,
-                ),
-                PredictionFactory.build(
-                    type=enums.PredictionType.PRODUCTION,
-                )
-            ]
         )
         with bus.uow as uow:
             uow.locations.add(location)
+            uow.predictions.add(PredictionFactory.build(
+                location_id=location.id,
+                type=enums.PredictionType.CONSUMPTION,
+            ))
+            uow.predictions.add(PredictionFactory.build(
+                location_id=location.id,
+                type=enums.PredictionType.PRODUCTION,
+            ))
             uow.commit()
         # ACT
         response = client.post(
@@ -307,19 +307,18 @@ class TestLocation:
             producers=[
                 ProducerFactory.build(prognosis_data_retriever=enums.DataRetriever.IMPULS_ENERGY_TRADING_SFTP)
             ],
-            predictions=[
-                PredictionFactory.build(
-                    type=enums.PredictionType.RESIDUAL_LONG,
-                    shipments=[
-                        PredictionShipmentFactory.build(
-                            receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT
-                        )
-                    ]
-                )
-            ]
         )
         with bus.uow as uow:
             uow.locations.add(location)
+            uow.predictions.add(PredictionFactory.build(
+                location_id=location.id,
+                type=enums.PredictionType.RESIDUAL_LONG,
+                shipments=[
+                    PredictionShipmentFactory.build(
+                        receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT
+                    )
+                ]
+            ))
             uow.commit()
         # ACT
         response = client.post(
@@ -86,7 +86,7 @@ class PredictionFactory(factory.alchemy.SQLAlchemyModelFactory):
 
     type = enums.PredictionType.PRODUCTION
     df = _generate_prediction_df()
-    shipments = []
+    shipments = LazyFunction(list)
 
 
 class MarketLocationFactory(factory.alchemy.SQLAlchemyModelFactory):
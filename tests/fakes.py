@@ -10,8 +10,9 @@ class FakeEmailSender(AbstractEmailSender):
     def __init__(self):
         self.data = []
 
-    def send(self, recipient: str, file_name: str, buffer):
-        self.data.append(buffer.getvalue())
+    def send(self, recipient: str, file_name: str, data: pd.DataFrame):
+        self.data.append(data)
+        return True
 
 
 class FakeIetDataSender(AbstractLoadDataSender):
@@ -193,6 +193,35 @@ class TestOptinodeDataRetriever:
             with pytest.raises(ConflictingEnergyData):
                 data_retriever.get_data(asset_identifier="12345", measurand=Measurand.POSITIVE)
 
+    def test_load_bulk_data(self):
+        series = pd.Series(
+            index=pd.DatetimeIndex(
+                data=pd.date_range(
+                    start="2021-01-01T00:00:00", periods=5, freq="15min", tz=TIMEZONE_BERLIN
+                ),
+                name="datetime"
+            ),
+            data=[1, 2, 3, 4, 5],
+            name="value",
+        )
+
+        data_retriever = OptinodeDataRetriever()
+
+        with mock.patch(
+            "optinode.webserver.configurator.models.MeteringOrMarketLocation.objects.filter"
+        ) as mock_filter:
+            mock_malo = mock.MagicMock()
+            mock_malo.number = "12345"
+            mock_malo.get_load_profile.return_value = series.copy()
+            mock_filter.return_value = [mock_malo, mock_malo]
+
+            data = data_retriever.get_bulk_data(
+                [("12345", Measurand.POSITIVE), ("12345", Measurand.NEGATIVE), ("67890", Measurand.POSITIVE)]
+            )
+        assert mock_filter.call_count == 1
+        assert list(data) == [("12345", Measurand.POSITIVE), ("12345", Measurand.NEGATIVE)]
+        pd.testing.assert_frame_equal(data[("12345", Measurand.POSITIVE)], series.to_frame())
+
     def test_load_data_no_location(self):
         data_retriever = OptinodeDataRetriever()
 
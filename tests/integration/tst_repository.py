@@ -1,11 +1,29 @@
 import datetime as dt
 import uuid
+from unittest.mock import patch
 
 import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+from sqlalchemy.exc import IntegrityError
 
-from src.persistence.repository import LocationRepository
-from src.persistence.sqlalchemy import Location as DBLocation
-from tests.factories import LocationFactory
+from src.domain import model
+from src.enums import PredictionType, PredictionReceiver, OutboxChannel, DataRetriever
+from src.persistence.archive import PredictionArchive
+from src.persistence.blobs import BlobStore, dataframe_hash
+from src.persistence.repository import LocationRepository, PredictionRepository, OutboxRepository
+from src.persistence.sqlalchemy import (
+    NO_COMPONENT_KEY,
+    LatestPrediction as DBLatestPrediction,
+    Location as DBLocation,
+    OutboxMessage as DBOutboxMessage,
+    Prediction as DBPrediction,
+    TimeSeriesBlob as DBTimeSeriesBlob,
+)
+from src.persistence.views import SqlAlchemyLatestPredictionView, SqlAlchemyImpulsEnergyTradingLocationView
+from src.utils.timezone import TIMEZONE_BERLIN
+from tests.factories import HistoricLoadDataFactory, LocationFactory, PredictionFactory, PredictionShipmentFactory, \
+    ProducerFactory
 
 
 def create_df_with_constant_values(value=42):
@@ -20,11 +38,401 @@ def create_df_with_constant_values(value=42):
 
 class TestLocationRepository:
     def test_get_location_by_id(self, sqlite_session_factory):
-        session = sqlite_session_factory()
-        repo = LocationRepository(session=session, db_cls=DBLocation)
-        location = LocationFactory.build(
-            id=uuid.UUID("64c4a7dd-242e-48a3-8932-3f85f1d6009b")
-        )
-
-        repo.add(location)
-        assert repo.get(uuid.UUID("64c4a7dd-242e-48a3-8932-3f85f1d6009b")) == location
+        with sqlite_session_factory() as session:
+            repo = LocationRepository(session=session, db_cls=DBLocation)
+            location = LocationFactory.build(
+                id=uuid.UUID("64c4a7dd-242e-48a3-8932-3f85f1d6009b")
+            )
+
+            repo.add(location)
+            assert repo.get(uuid.UUID("64c4a7dd-242e-48a3-8932-3f85f1d6009b")) == location
+
+    def test_impuls_energy_trading_locations(self, sqlite_session_factory):
+        with sqlite_session_factory() as session:
+            repo = LocationRepository(session=session, db_cls=DBLocation)
+            impuls_location = LocationFactory.build(producers=[
+                ProducerFactory.build(),
+                ProducerFactory.build(prognosis_data_retriever=DataRetriever.IMPULS_ENERGY_TRADING_SFTP),
+            ])
+            repo.add(impuls_location)
+            repo.add(LocationFactory.build())
+
+            [listed] = SqlAlchemyImpulsEnergyTradingLocationView(session).list()
+            assert listed.location_id == impuls_location.id
+            assert listed.alias == impuls_location.alias
+            assert listed.residual_long_id == impuls_location.residual_long.id
+
+
+class TestPredictionRepository:
+    def test_add_prediction_refreshes_latest_prediction_read_model(self, sqlite_session_factory):
+        with sqlite_session_factory() as session:
+            location_repo = LocationRepository(session=session, db_cls=DBLocation)
+            repo = PredictionRepository(session=session, db_cls=DBPrediction)
+            view = SqlAlchemyLatestPredictionView(session)
+            location = LocationFactory.build()
+            location_repo.add(location)
+            repo.add(PredictionFactory.build(location_id=location.id, type=PredictionType.CONSUMPTION))
+
+            newest = PredictionFactory.build(location_id=location.id, type=PredictionType.CONSUMPTION)
+            repo.add(newest)
+            newest.shipments.append(
+                PredictionShipmentFactory.build(receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT)
+            )
+            repo.update(newest)
+
+            [latest] = view.list(location.id, PredictionType.CONSUMPTION)
+            assert latest.prediction_id == newest.id
+            assert list(latest.shipments) == [PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT]
+            assert repo.latest(location.id, PredictionType.CONSUMPTION) == newest
+            assert repo.latest(
+                location.id, PredictionType.CONSUMPTION, receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT
+            ) == newest
+
+    def test_latest_prediction_read_model_has_one_row_per_series(self, sqlite_session_factory):
+        with sqlite_session_factory() as session:
+            location_repo = LocationRepository(session=session, db_cls=DBLocation)
+            repo = PredictionRepository(session=session, db_cls=DBPrediction)
+            view = SqlAlchemyLatestPredictionView(session)
+            location = LocationFactory.build()
+            location_repo.add(location)
+            older, newest = [
+                repo.add(PredictionFactory.build(location_id=location.id, type=PredictionType.CONSUMPTION))
+                for _ in range(2)
+            ]
+
+            # as a transaction that wrote the older prediction would refresh it after the newest one
+            repo._refresh_latest_prediction(session.get(DBPrediction, older.id))
+
+            [latest] = view.list(location.id, PredictionType.CONSUMPTION)
+            assert latest.prediction_id == newest.id
+            session.add(DBLatestPrediction(
+                location_id=location.id,
+                type=PredictionType.CONSUMPTION.value,
+                component_key=NO_COMPONENT_KEY,
+                prediction_id=older.id,
+                prediction_created_at=dt.datetime.now(),
+            ))
+            with pytest.raises(IntegrityError):
+                session.flush()
+
+    def test_latest_for_locations_matches_latest(self, sqlite_session_factory):
+        with sqlite_session_factory() as session:
+            location_repo = LocationRepository(session=session, db_cls=DBLocation)
+            repo = PredictionRepository(session=session, db_cls=DBPrediction)
+            locations = [LocationFactory.build() for _ in range(3)]
+            for location in locations:
+                location_repo.add(location)
+            for location in locations[:2]:
+                for shipped in [True, False]:
+                    prediction = repo.add(PredictionFactory.build(location_id=location.id, type=PredictionType.CONSUMPTION))
+                    if shipped:
+                        prediction.shipments.append(
+                            PredictionShipmentFactory.build(receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT)
+                        )
+                        repo.update(prediction)
+            location_ids = [location.id for location in locations]
+
+            for receiver in [None, PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT]:
+                latest = repo.latest_for_locations(location_ids, PredictionType.CONSUMPTION, receiver=receiver)
+                assert latest == {
+                    location.id: repo.latest(location.id, PredictionType.CONSUMPTION, receiver=receiver)
+                    for location in locations[:2]
+                }
+                for location_id, prediction in latest.items():
+                    assert_frame_equal(
+                        prediction.df, repo.latest(location_id, PredictionType.CONSUMPTION, receiver=receiver).df
+                    )
+
+    def test_add_shipments_refreshes_latest_prediction_read_model(self, sqlite_session_factory):
+        with sqlite_session_factory() as session:
+            location_repo = LocationRepository(session=session, db_cls=DBLocation)
+            repo = PredictionRepository(session=session, db_cls=DBPrediction)
+            view = SqlAlchemyLatestPredictionView(session)
+            location = LocationFactory.build()
+            location_repo.add(location)
+            predictions = [
+                repo.add(PredictionFactory.build(location_id=location.id, type=prediction_type))
+                for prediction_type in [PredictionType.CONSUMPTION, PredictionType.RESIDUAL_SHORT]
+            ]
+
+            repo.add_shipments(
+                [(p.id, PredictionShipmentFactory.build(receiver=PredictionReceiver.IMPULS_ENERGY_TRADING)) for p in predictions]
+                + [(uuid.uuid4(), PredictionShipmentFactory.build(receiver=PredictionReceiver.IMPULS_ENERGY_TRADING))]
+            )
+            session.expire_all()
+
+            for prediction in predictions:
+                assert [s.receiver for s in repo.get(prediction.id).shipments] == [PredictionReceiver.IMPULS_ENERGY_TRADING]
+                [latest] = view.list(location.id, prediction.type)
+                assert list(latest.shipments) == [PredictionReceiver.IMPULS_ENERGY_TRADING]
+
+    def test_download_manifest_is_stored_with_prediction(self, sqlite_session_factory):
+        with sqlite_session_factory() as session:
+            location_repo = LocationRepository(session=session, db_cls=DBLocation)
+            repo = PredictionRepository(session=session, db_cls=DBPrediction)
+            location = LocationFactory.build()
+            location_repo.add(location)
+            manifest = [
+                model.DownloadedFile(file_name="a.csv", size=1024, duration=0.25, from_cache=False),
+                model.DownloadedFile(file_name="b.csv", size=512, duration=0.0, from_cache=True, used=False),
+            ]
+            prediction = repo.add(PredictionFactory.build(
+                location_id=location.id,
+                type=PredictionType.PRODUCTION,
+                component=location.producers[0],
+                download_manifest=manifest,
+            ))
+            session.expire_all()
+
+            assert repo.get(prediction.id).download_manifest == manifest
+
+    def test_delete_oldest_keeps_latest_prediction_read_model(self, sqlite_session_factory):
+        with sqlite_session_factory() as session:
+            location_repo = LocationRepository(session=session, db_cls=DBLocation)
+            repo = PredictionRepository(session=session, db_cls=DBPrediction)
+            location = LocationFactory.build()
+            location_repo.add(location)
+            predictions = [
+                repo.add(PredictionFactory.build(location_id=location.id, type=PredictionType.CONSUMPTION))
+                for _ in range(3)
+            ]
+
+            repo.delete_oldest(location.id, keep=1)
+
+            assert repo.get_range(location.id) == [predictions[-1]]
+            assert repo.latest(location.id, PredictionType.CONSUMPTION) == predictions[-1]
+
+    def test_identical_series_are_stored_once(self, sqlite_session_factory):
+        with sqlite_session_factory() as session:
+            location_repo = LocationRepository(session=session, db_cls=DBLocation)
+            repo = PredictionRepository(session=session, db_cls=DBPrediction)
+            location = LocationFactory.build(producers=[], residual_long=None)
+            location_repo.add(location)
+            consumption = PredictionFactory.build(location_id=location.id, type=PredictionType.CONSUMPTION)
+            residual_short = PredictionFactory.build(
+                location_id=location.id, type=PredictionType.RESIDUAL_SHORT, df=consumption.df.copy()
+            )
+            repo.add(consumption)
+            repo.add(residual_short)
+
+            blob_hash = dataframe_hash(consumption.df)
+            assert session.query(DBPrediction).filter_by(blob_hash=blob_hash).count() == 2
+            assert session.query(DBTimeSeriesBlob).filter_by(hash=blob_hash).count() == 1
+            assert_frame_equal(repo.get(residual_short.id).df, consumption.df)
+
+            repo.delete_oldest(location.id, keep=0, type=PredictionType.CONSUMPTION)
+            assert session.query(DBTimeSeriesBlob).filter_by(hash=blob_hash).count() == 1
+            repo.delete_oldest(location.id, keep=0, type=PredictionType.RESIDUAL_SHORT)
+            assert session.query(DBTimeSeriesBlob).filter_by(hash=blob_hash).count() == 0
+
+    def test_stored_series_is_not_pickled_again(self, sqlite_session_factory):
+        with sqlite_session_factory() as session:
+            store = BlobStore(session)
+            df = create_df_with_constant_values()
+            blob_hash = store.put(df)
+
+            with patch("src.persistence.blobs.dataframe_to_bytes") as dataframe_to_bytes:
+                assert store.put(df.copy()) == blob_hash
+
+            dataframe_to_bytes.assert_not_called()
+            assert session.query(DBTimeSeriesBlob).filter_by(hash=blob_hash).count() == 1
+
+    def test_replaced_historic_load_data_blob_is_deleted(self, sqlite_session_factory):
+        with sqlite_session_factory() as session:
+            repo = LocationRepository(session=session, db_cls=DBLocation)
+            location = LocationFactory.build(producers=[], residual_long=None)
+            repo.add(location)
+            old_blob_hash = dataframe_hash(location.residual_short.historic_load_data.df)
+
+            location.residual_short.historic_load_data = HistoricLoadDataFactory.build(
+                df=location.residual_short.historic_load_data.df + 1
+            )
+            repo.update(location)
+
+            assert session.query(DBTimeSeriesBlob).filter_by(hash=old_blob_hash).count() == 0
+            assert_frame_equal(
+                repo.get(location.id).residual_short.historic_load_data.df,
+                location.residual_short.historic_load_data.df,
+            )
+
+    def test_predictions_are_stored_as_delta_with_keyframes(self, sqlite_session_factory):
+        with sqlite_session_factory() as session:
+            location_repo = LocationRepository(session=session, db_cls=DBLocation)
+            repo = PredictionRepository(session=session, db_cls=DBPrediction, keyframe_interval=3)
+            location = LocationFactory.build(producers=[], residual_long=None)
+            location_repo.add(location)
+            df = create_df_with_constant_values(42.0).tz_localize(TIMEZONE_BERLIN)
+            predictions = []
+            for day in range(4):
+                # each day shifts the prediction horizon and updates some values
+                day_df = df.iloc[day * 96:].copy()
+                day_df.iloc[:4] = day
+                prediction = PredictionFactory.build(location_id=location.id, type=PredictionType.CONSUMPTION, df=day_df)
+                predictions.append(repo.add(prediction))
+
+            db_predictions = [session.get(DBPrediction, p.id) for p in predictions]
+            assert [p.delta_depth for p in db_predictions] == [0, 1, 2, 0]
+            assert [p.base_prediction_id for p in db_predictions] == [None, predictions[0].id, predictions[1].id, None]
+            for prediction in predictions:
+                assert_frame_equal(repo.get(prediction.id).df, prediction.df, check_freq=False)
+
+            repo.delete_oldest(location.id, keep=3)
+
+            assert session.get(DBPrediction, predictions[1].id).base_prediction_id is None
+            for prediction in predictions[1:]:
+                assert_frame_equal(repo.get(prediction.id).df, prediction.df, check_freq=False)
+
+    def test_archive_predictions(self, sqlite_session_factory, tmp_path):
+        with sqlite_session_factory() as session:
+            location_repo = LocationRepository(session=session, db_cls=DBLocation)
+            repo = PredictionRepository(
+                session=session, db_cls=DBPrediction, keyframe_interval=3, archive=PredictionArchive(tmp_path)
+            )
+            location = LocationFactory.build(producers=[], residual_long=None)
+            location_repo.add(location)
+            df = create_df_with_constant_values(42.0).tz_localize(TIMEZONE_BERLIN)
+            predictions = []
+            for day in range(3):
+                day_df = df.iloc[day * 96:].copy()
+                day_df.iloc[:4] = day
+                predictions.append(
+                    repo.add(PredictionFactory.build(location_id=location.id, type=PredictionType.CONSUMPTION, df=day_df))
+                )
+            archived_blob_hashes = [session.get(DBPrediction, p.id).blob_hash for p in predictions[:2]]
+
+            assert repo.archive(created_before=predictions[2].created, limit=1) == 1
+            assert repo.archive(created_before=predictions[2].created) == 1
+            assert repo.archive(created_before=predictions[2].created) == 0
+
+            db_prediction = session.get(DBPrediction, predictions[0].id)
+            assert db_prediction.archive_path == str(
+                tmp_path / f"location_id={location.id}" / f"month={db_prediction.created_at:%Y-%m}" / f"{predictions[0].id}.parquet"
+            )
+            assert session.query(DBTimeSeriesBlob).filter(DBTimeSeriesBlob.hash.in_(archived_blob_hashes)).count() == 0
+            assert repo.get_range(location.id) == [predictions[2]]
+            assert repo.get_range(location.id, include_archived=True) == predictions
+            for prediction in predictions:
+                assert_frame_equal(repo.get(prediction.id).df, prediction.df, check_freq=False)
+
+    def test_archive_refuses_missing_archive_root(self, sqlite_session_factory, tmp_path):
+        with sqlite_session_factory() as session:
+            location_repo = LocationRepository(session=session, db_cls=DBLocation)
+            repo = PredictionRepository(
+                session=session, db_cls=DBPrediction, archive=PredictionArchive(tmp_path / "not-mounted")
+            )
+            location = LocationFactory.build(producers=[], residual_long=None)
+            location_repo.add(location)
+            prediction = repo.add(PredictionFactory.build(location_id=location.id, type=PredictionType.CONSUMPTION))
+
+            with pytest.raises(FileNotFoundError):
+                repo.archive(created_before=dt.datetime.now(dt.timezone.utc) + dt.timedelta(days=1))
+
+            assert not (tmp_path / "not-mounted").exists()
+            db_prediction = session.get(DBPrediction, prediction.id)
+            assert db_prediction.archive_path is None and db_prediction.blob_hash is not None
+
+    def test_prediction_after_archived_latest_is_stored_in_full(self, sqlite_session_factory, tmp_path):
+        with sqlite_session_factory() as session:
+            location_repo = LocationRepository(session=session, db_cls=DBLocation)
+            repo = PredictionRepository(
+                session=session, db_cls=DBPrediction, keyframe_interval=3, archive=PredictionArchive(tmp_path)
+            )
+            location = LocationFactory.build(producers=[], residual_long=None)
+            location_repo.add(location)
+            df = create_df_with_constant_values(42.0).tz_localize(TIMEZONE_BERLIN)
+            archived = repo.add(PredictionFactory.build(location_id=location.id, type=PredictionType.CONSUMPTION, df=df))
+            assert repo.archive(created_before=dt.datetime.now(dt.timezone.utc) + dt.timedelta(days=1)) == 1
+
+            prediction = repo.add(
+                PredictionFactory.build(location_id=location.id, type=PredictionType.CONSUMPTION, df=df.iloc[96:])
+            )
+
+            db_prediction = session.get(DBPrediction, prediction.id)
+            assert (db_prediction.delta_depth, db_prediction.base_prediction_id) == (0, None)
+            for prediction in [archived, prediction]:
+                assert_frame_equal(repo.get(prediction.id).df, prediction.df, check_freq=False)
+
+
+class TestOutboxRepository:
+    def test_pending_messages_until_max_attempts(self, sqlite_session_factory):
+        with sqlite_session_factory() as session:
+            repo = OutboxRepository(session=session, db_cls=DBOutboxMessage)
+            prediction_ids = [uuid.uuid4(), uuid.uuid4()]
+            message = model.OutboxMessage(
+                channel=OutboxChannel.IMPULS_RESIDUAL_LONG_SFTP,
+                df=create_df_with_constant_values(),
+                prediction_date=dt.date(2024, 9, 2),
+                prediction_ids=prediction_ids,
+            )
+            repo.add(message)
+            session.expire_all()
+
+            [pending] = repo.pending(max_attempts=1)
+            assert pending.prediction_ids == prediction_ids
+            assert pending.prediction_date == dt.date(2024, 9, 2)
+            assert_frame_equal(pending.df, message.df)
+
+            pending.attempts += 1
+            pending.last_error = "timeout"
+            repo.update(pending)
+            session.expire_all()
+            assert repo.pending(max_attempts=1) == []
+            assert [m.last_error for m in repo.pending(max_attempts=2)] == ["timeout"]
+
+            repo.delete(message.id)
+            assert repo.pending(max_attempts=2) == []
+
+    def test_delete_dead_letters(self, sqlite_session_factory):
+        with sqlite_session_factory() as session:
+            repo = OutboxRepository(session=session, db_cls=DBOutboxMessage)
+            now = dt.datetime.now(dt.timezone.utc)
+            messages = [
+                model.OutboxMessage(
+                    channel=OutboxChannel.IMPULS_RESIDUAL_LONG_SFTP,
+                    df=create_df_with_constant_values(),
+                    prediction_date=dt.date(2024, 9, 2),
+                    attempts=1,
+                    dead_lettered=dead_lettered,
+                )
+                for dead_lettered in [now - dt.timedelta(days=40), now - dt.timedelta(days=1)]
+            ]
+            for message in messages:
+                repo.add(message)
+            session.expire_all()
+            assert repo.pending(max_attempts=2) == []
+
+            assert repo.delete_dead_letters(now - dt.timedelta(days=30)) == 1
+            session.expire_all()
+            [remaining] = repo.get_all()
+            assert remaining.id == messages[1].id
+            assert remaining.dead_lettered == messages[1].dead_lettered
+
+    def test_delivered_batches(self, sqlite_session_factory):
+        with sqlite_session_factory() as session:
+            repo = OutboxRepository(session=session, db_cls=DBOutboxMessage)
+            batch_id = uuid.uuid4()
+            messages = [
+                model.OutboxMessage(
+                    channel=OutboxChannel.IMPULS_RESIDUAL_LONG_SFTP,
+                    df=create_df_with_constant_values(),
+                    prediction_date=dt.date(2024, 9, day),
+                    batch_id=batch_id,
+                )
+                for day in [2, 3]
+            ]
+            for message in messages:
+                repo.add(message)
+            session.expire_all()
+
+            first, second = repo.pending(max_attempts=1)
+            first.delivered = dt.datetime.now(dt.timezone.utc)
+            repo.update(first)
+            assert repo.delivered_batches() == []
+            assert repo.pending(max_attempts=1) == [second]
+
+            second.delivered = dt.datetime.now(dt.timezone.utc)
+            repo.update(second)
+            session.expire_all()
+            [batch] = repo.delivered_batches()
+            assert [m.id for m in batch] == [m.id for m in messages]
+            assert repo.pending(max_attempts=1) == []
@@ -0,0 +1,42 @@
+import io
+
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from src.services.load_data_exchange.csv_export import time_series_to_csv
+from src.utils.timezone import TIMEZONE_BERLIN
+
+
+def to_csv_with_pandas(df: pd.DataFrame, timestamp_format: str, decimal: str) -> bytes:
+    df = df.copy()
+    df.index = df.index.strftime(timestamp_format)
+    file_obj = io.BytesIO()
+    df.to_csv(file_obj, sep=";", decimal=decimal)
+    return file_obj.getvalue()
+
+
+class TestTimeSeriesToCsv:
+    def test_same_bytes_as_pandas(self):
+        index = pd.date_range(
+            "2024-10-26 00:00", "2024-10-28 00:00", freq="15min", tz=TIMEZONE_BERLIN, name="#timestamp"
+        ).tz_convert("UTC")
+        values = np.random.default_rng(0).random((len(index), 3)) * 1000
+        values[0] = [0.0, 1e-05, 1e16]
+        df = pd.DataFrame(np.round(values, 3), index=index, columns=["a", "b", "c"])
+        original = df.copy()
+
+        for timestamp_format, decimal in [("%d.%m.%Y %H:%M:%S", ","), ("%Y-%m-%d %H:%M", ".")]:
+            for frame in [df, df.tz_convert(TIMEZONE_BERLIN), df.iloc[::3]]:
+                assert time_series_to_csv(frame, timestamp_format, decimal) == to_csv_with_pandas(
+                    frame, timestamp_format, decimal
+                )
+        assert_frame_equal(df, original)
+
+    def test_integer_values(self):
+        index = pd.date_range("2024-09-01 22:00", periods=2, freq="15min", tz="UTC", name="#timestamp")
+        df = pd.DataFrame({"a": [1, 2]}, index=index)
+
+        assert time_series_to_csv(df, "%d.%m.%Y %H:%M:%S", ",") == (
+            b"#timestamp;a\n01.09.2024 22:00:00;1\n01.09.2024 22:15:00;2\n"
+        )
@@ -0,0 +1,33 @@
+import io
+
+import pandas as pd
+
+from src.services.load_data_exchange.csv_parsing import read_time_series_csv
+
+
+class TestReadTimeSeriesCsv:
+    def test_read_time_series_csv(self):
+        file_obj = io.BytesIO(
+            b"Timestamp (Europe/Berlin);50571705655_WP_1\n"
+            b"2024-10-27 02:45;1\n"
+            b"2024-10-27 02:00;2\n"
+            b"2024-10-27 02:15;\n"
+        )
+
+        df = read_time_series_csv(file_obj, "Timestamp (Europe/Berlin)", "%Y-%m-%d %H:%M")
+
+        assert list(df.index) == [
+            pd.Timestamp("2024-10-27 02:45"), pd.Timestamp("2024-10-27 02:00"), pd.Timestamp("2024-10-27 02:15")
+        ]
+        assert df.index.name == "datetime"
+        assert df["value"].dtype == "float64"
+        assert df["value"].tolist()[:2] == [1.0, 2.0]
+        assert pd.isna(df["value"].iloc[2])
+
+    def test_decimal_comma(self):
+        file_obj = io.BytesIO(b"utc_timestamp;power_mw\n01.09.2024 22:00;0,125\n")
+
+        df = read_time_series_csv(file_obj, "utc_timestamp", "%d.%m.%Y %H:%M")
+
+        assert df.index[0] == pd.Timestamp("2024-09-01 22:00")
+        assert df["value"].iloc[0] == 0.125
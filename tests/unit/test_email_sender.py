@@ -0,0 +1,127 @@
+import socketserver
+import threading
+from unittest import mock
+
+import pandas as pd
+import pytest
+
+from src.config import settings
+from src.services.load_data_exchange.email import ForecastEmailSender
+from src.utils.dataframe_schemas import FahrplanmanagementSchema
+from src.utils.timezone import TIMEZONE_BERLIN
+
+
+class StandInSmtpHandler(socketserver.StreamRequestHandler):
+    """just enough SMTP to log in and send mails, the server can be told to drop connections after each mail"""
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 stand-in ESMTP")
+        while line := self.rfile.readline():
+            command = line.decode().strip().upper()
+            if command.startswith("EHLO"):
+                self.reply("250-stand-in", "250 AUTH PLAIN LOGIN")
+            elif command.startswith("AUTH"):
+                self.reply("235 authenticated")
+            elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                self.reply("250 ok")
+            elif command == "DATA":
+                self.reply("354 go ahead")
+                message = b"".join(iter(self.rfile.readline, b".\r\n"))
+                self.server.messages.append(message)
+                self.reply("250 queued")
+                if self.server.drop_after_message:
+                    return
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 not implemented")
+
+    def reply(self, *lines: str):
+        self.wfile.write("".join(f"{line}\r\n" for line in lines).encode())
+
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), StandInSmtpHandler)
+    server.daemon_threads = True
+    server.connections = 0
+    server.messages = []
+    server.drop_after_message = False
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    with mock.patch.multiple(
+        settings, smtp_host=host, smtp_port=port, smtp_starttls=False, send_predictions_enabled=True
+    ):
+        yield server
+    server.shutdown()
+    server.server_close()
+
+
+def prediction(malo_number: str) -> pd.DataFrame:
+    index = pd.date_range("2024-09-02", periods=4, freq="15min", tz=TIMEZONE_BERLIN, name="datetime")
+    return FahrplanmanagementSchema.from_time_series_schema(pd.DataFrame({"value": 1.0}, index=index), malo_number)
+
+
+class TestForecastEmailSender:
+    def test_connects_per_mail_without_session(self, smtp_server):
+        sender = ForecastEmailSender()
+
+        results = [sender.send("a@example.com", f"{i}.csv", prediction(str(i))) for i in range(2)]
+
+        assert results == [True, True]
+        assert smtp_server.connections == 2
+        assert len(smtp_server.messages) == 2
+
+    def test_session_shares_one_connection(self, smtp_server):
+        sender = ForecastEmailSender()
+
+        with sender.session():
+            results = [sender.send("a@example.com", f"{i}.csv", prediction(str(i))) for i in range(3)]
+
+        assert results == [True, True, True]
+        assert smtp_server.connections == 1
+        assert len(smtp_server.messages) == 3
+        assert sender._connection is None
+
+    def test_session_reconnects_after_connection_loss(self, smtp_server):
+        smtp_server.drop_after_message = True
+        sender = ForecastEmailSender()
+
+        with sender.session():
+            results = [sender.send("a@example.com", f"{i}.csv", prediction(str(i))) for i in range(3)]
+
+        assert results == [True, True, True]
+        assert smtp_server.connections == 3
+        assert len(smtp_server.messages) == 3
+
+    def test_reports_failed_mail(self, smtp_server):
+        sender = ForecastEmailSender()
+        smtp_server.server_close()
+
+        with sender.session():
+            assert sender.send("a@example.com", "0.csv", prediction("0")) is False
+
+    def test_send_many_attaches_all_files_to_one_mail(self, smtp_server):
+        sender = ForecastEmailSender()
+
+        results = sender.send_many("a@example.com", [(f"{i}.csv", prediction(str(i))) for i in range(3)])
+
+        assert results == [True, True, True]
+        assert smtp_server.connections == 1
+        assert len(smtp_server.messages) == 1
+        assert all(f"filename={i}.csv".encode() in smtp_server.messages[0] for i in range(3))
+
+    def test_send_many_splits_mails_by_attachment_size(self, smtp_server):
+        sender = ForecastEmailSender()
+        files = [(f"{i}.csv", prediction(str(i))) for i in range(3)]
+        attachment_bytes = (len(sender._to_csv(files[0][1]).getvalue()) + 2) // 3 * 4
+
+        with mock.patch.object(settings, "email_max_attachment_bytes", 2 * attachment_bytes):
+            with sender.session():
+                results = sender.send_many("a@example.com", files)
+
+        assert results == [True, True, True]
+        assert smtp_server.connections == 1
+        assert len(smtp_server.messages) == 2
@@ -0,0 +1,35 @@
+import datetime
+
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from src.services.load_data_exchange.common import NewestFirstMerge
+from src.utils.timezone import TIMEZONE_BERLIN
+
+
+def forecast(start: str, periods: int, value: float) -> pd.DataFrame:
+    index = pd.date_range(start, periods=periods, freq="15min", tz="UTC", name="datetime").tz_convert(TIMEZONE_BERLIN)
+    return pd.DataFrame({"value": [value] * periods}, index=index)
+
+
+class TestNewestFirstMerge:
+    def test_merge_equals_concat_without_duplicates(self):
+        newest = forecast("2024-09-01 22:00", 96, 3.0)
+        incomplete = forecast("2024-09-02 22:00", 50, 2.0)
+        oldest = forecast("2024-09-01 22:00", 192, 1.0)
+
+        merge = NewestFirstMerge()
+        for df in [newest, incomplete, oldest]:
+            merge.add(df)
+
+        expected = pd.concat([newest, incomplete, oldest])
+        expected = expected[~expected.index.duplicated(keep="first")].sort_index()
+        assert_frame_equal(merge.result(), expected, check_freq=False)
+
+    def test_covers(self):
+        merge = NewestFirstMerge()
+        merge.add(forecast("2024-09-01 22:00", 96, 1.0))
+        day = datetime.datetime(2024, 9, 2, tzinfo=TIMEZONE_BERLIN)
+
+        assert merge.covers(day, day + datetime.timedelta(days=1))
+        assert not merge.covers(day, day + datetime.timedelta(days=1, minutes=15))
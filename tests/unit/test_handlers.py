@@ -1,18 +1,21 @@
 import datetime
 import datetime as dt
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 import pandas as pd
+import pytest
 from pandas._testing import assert_frame_equal
+from pandera.errors import SchemaError
 from pandera.typing import DataFrame
 
 from src import enums
+from src.config import settings
 from src.enums import PredictionReceiver, TransmissionSystemOperator, PredictionType, DataRetriever
 from src.infrastructure.message_bus import MessageBus
 from src.infrastructure.unit_of_work import MemoryUnitOfWork
 from src.services.load_data_exchange.common import AbstractLoadDataRetriever
 from src.services.data_sender import DataSender
-from src.domain import commands
+from src.domain import commands, handlers
 from src.domain import model
 from src.services.load_data_exchange.data_retriever_config import DATA_RETRIEVER_MAP, DataRetrieverConfig
 from src.utils.dataframe_schemas import IetLoadDataSchema
@@ -75,6 +78,24 @@ class TestHistoricData:
         assert location.residual_long.historic_load_data is not None
         assert location.producers.pop().market_location.historic_load_data is not None
 
+    def test_update_historic_data_from_bulk_data(self):
+        bus = setup_test()
+        location = LocationFactory.build()
+        bus.uow.locations.add(location)
+        residual_short = location.residual_short
+        residual_long_data = location.residual_long.historic_load_data
+
+        handlers.update_historic_data(
+            commands.UpdateHistoricData(location_id=str(location.id)),
+            bus.uow,
+            bus.ldr,
+            {(residual_short.number, residual_short.measurand): create_df_with_constant_values(7.0)},
+        )
+
+        assert (location.residual_short.historic_load_data.df["value"] == 7).all()
+        # market locations missing from the bulk data keep their historic data
+        assert location.residual_long.historic_load_data is residual_long_data
+
 
 class TestPrediction:
     def test_calculate_prediction_consumer_only(self):
@@ -84,7 +105,7 @@ class TestPrediction:
         bus.uow.locations.add(location)
         bus.handle(commands.CalculatePredictions(location_id=str(location.id)))
 
-        assert len(location.predictions) == 2
+        assert len(bus.uow.predictions.get_range(location.id)) == 2
 
     def test_calculate_predictions_respects_start_and_end_ranges(self):
         today = dt.date.today()
@@ -101,7 +122,8 @@ class TestPrediction:
         bus.uow.locations.add(location)
         bus.handle(commands.CalculatePredictions(location_id=str(location.id)))
 
-        assert len(location.predictions) == 2
+        predictions = bus.uow.predictions.get_range(location.id)
+        assert len(predictions) == 2
         index = pd.date_range(
             start=datetime.datetime.combine(location.settings.active_from, datetime.time(tzinfo=TIMEZONE_BERLIN)),
             end=datetime.datetime.combine(location.settings.active_until, datetime.time(tzinfo=TIMEZONE_BERLIN)),
@@ -109,7 +131,7 @@ class TestPrediction:
             inclusive="left"
         )
 
-        for prediction in location.predictions:
+        for prediction in predictions:
             pd.testing.assert_index_equal(pd.DatetimeIndex(index), prediction.df.index, check_names=False)
 
     def test_wont_calculate_predictions_if_not_active_yet(self):
@@ -125,7 +147,7 @@ class TestPrediction:
         bus.uow.locations.add(location)
         bus.handle(commands.CalculatePredictions(location_id=str(location.id)))
 
-        assert len(location.predictions) == 0
+        assert len(bus.uow.predictions.get_range(location.id)) == 0
 
     def test_calculate_prediction_teileinspeiser(self):
         with patch.dict(
@@ -142,18 +164,19 @@ class TestPrediction:
             bus.uow.locations.add(location)
             bus.handle(commands.CalculatePredictions(location_id=str(location.id)))
 
-        assert len(location.predictions) == 4
-        assert sorted([p.type for p in location.predictions]) == sorted([
+        predictions = bus.uow.predictions.get_range(location.id)
+        assert len(predictions) == 4
+        assert sorted([p.type for p in predictions]) == sorted([
             PredictionType.CONSUMPTION,
             PredictionType.PRODUCTION,
             PredictionType.RESIDUAL_SHORT,
             PredictionType.RESIDUAL_LONG,
         ])
 
-        short_prediction = next(filter(lambda p: p.type == PredictionType.RESIDUAL_SHORT, location.predictions))
-        consumption_prediction = next(filter(lambda p: p.type == PredictionType.CONSUMPTION, location.predictions))
-        long_prediction = next(filter(lambda p: p.type == PredictionType.RESIDUAL_LONG, location.predictions))
-        producer_prediction = next(filter(lambda p: p.type == PredictionType.PRODUCTION and p.component == location.producers[0], location.predictions))
+        short_prediction = next(filter(lambda p: p.type == PredictionType.RESIDUAL_SHORT, predictions))
+        consumption_prediction = next(filter(lambda p: p.type == PredictionType.CONSUMPTION, predictions))
+        long_prediction = next(filter(lambda p: p.type == PredictionType.RESIDUAL_LONG, predictions))
+        producer_prediction = next(filter(lambda p: p.type == PredictionType.PRODUCTION and p.component == location.producers[0], predictions))
 
         expected_residual = producer_prediction.df - consumption_prediction.df
         expected_residual = expected_residual[expected_residual.first_valid_index(): expected_residual.last_valid_index()]
@@ -184,8 +207,9 @@ class TestPrediction:
             bus.uow.locations.add(location)
             bus.handle(commands.CalculatePredictions(location_id=str(location.id)))
 
-        assert len(location.predictions) == 5
-        assert sorted([p.type for p in location.predictions]) == sorted([
+        predictions = bus.uow.predictions.get_range(location.id)
+        assert len(predictions) == 5
+        assert sorted([p.type for p in predictions]) == sorted([
             PredictionType.CONSUMPTION,
             PredictionType.PRODUCTION,
             PredictionType.PRODUCTION,
@@ -193,11 +217,11 @@ class TestPrediction:
             PredictionType.RESIDUAL_LONG,
         ])
 
-        short_prediction = next(filter(lambda p: p.type == PredictionType.RESIDUAL_SHORT, location.predictions))
-        consumption_prediction = next(filter(lambda p: p.type == PredictionType.CONSUMPTION, location.predictions))
-        long_prediction = next(filter(lambda p: p.type == PredictionType.RESIDUAL_LONG, location.predictions))
-        producer_1_prediction = next(filter(lambda p: p.type == PredictionType.PRODUCTION and p.component == producers[0], location.predictions))
-        producer_2_prediction = next(filter(lambda p: p.type == PredictionType.PRODUCTION and p.component == producers[1], location.predictions))
+        short_prediction = next(filter(lambda p: p.type == PredictionType.RESIDUAL_SHORT, predictions))
+        consumption_prediction = next(filter(lambda p: p.type == PredictionType.CONSUMPTION, predictions))
+        long_prediction = next(filter(lambda p: p.type == PredictionType.RESIDUAL_LONG, predictions))
+        producer_1_prediction = next(filter(lambda p: p.type == PredictionType.PRODUCTION and p.component == producers[0], predictions))
+        producer_2_prediction = next(filter(lambda p: p.type == PredictionType.PRODUCTION and p.component == producers[1], predictions))
 
         expected_residual = producer_1_prediction.df + producer_2_prediction.df - consumption_prediction.df
         expected_residual = expected_residual[expected_residual.first_valid_index(): expected_residual.last_valid_index()]
@@ -217,91 +241,99 @@ class TestSendPredictions:
             producers=[
                 ProducerFactory.build(prognosis_data_retriever=enums.DataRetriever.IMPULS_ENERGY_TRADING_SFTP)
             ],
-            predictions=[
-                PredictionFactory.build(
-                    type=enums.PredictionType.CONSUMPTION,
-                    shipments=[
-                        PredictionShipmentFactory.build(
-                            created=ONE_HOUR_BEFORE_GATE_CLOSURE,
-                            receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT
-                        )
-                    ]
-                ),
-                PredictionFactory.build(
-                    type=enums.PredictionType.PRODUCTION,
-                    shipments=[
-                        PredictionShipmentFactory.build(
-                            created=ONE_HOUR_BEFORE_GATE_CLOSURE,
-                            receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT
-                        )
-                    ]
-                )
-            ]
         )
+        location_1_predictions = [
+            PredictionFactory.build(
+                location_id=location_1.id,
+                type=enums.PredictionType.CONSUMPTION,
+                shipments=[
+                    PredictionShipmentFactory.build(
+                        created=ONE_HOUR_BEFORE_GATE_CLOSURE,
+                        receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT
+                    )
+                ]
+            ),
+            PredictionFactory.build(
+                location_id=location_1.id,
+                type=enums.PredictionType.PRODUCTION,
+                shipments=[
+                    PredictionShipmentFactory.build(
+                        created=ONE_HOUR_BEFORE_GATE_CLOSURE,
+                        receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT
+                    )
+                ]
+            )
+        ]
         location_2 = LocationFactory.build(
             producers=[
                 ProducerFactory.build(prognosis_data_retriever=enums.DataRetriever.IMPULS_ENERGY_TRADING_SFTP)
             ],
-            predictions=[
-                PredictionFactory.build(
-                    type=enums.PredictionType.CONSUMPTION,
-                    shipments=[
-                        PredictionShipmentFactory.build(
-                            created=ONE_HOUR_BEFORE_GATE_CLOSURE,
-                            receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT
-                        )
-                    ]
-                ),
-                PredictionFactory.build(
-                    type=enums.PredictionType.PRODUCTION,
-                    shipments=[
-                        PredictionShipmentFactory.build(
-                            created=ONE_HOUR_BEFORE_GATE_CLOSURE,
-                            receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT
-                        )
-                    ]
-                )
-            ]
         )
+        location_2_predictions = [
+            PredictionFactory.build(
+                location_id=location_2.id,
+                type=enums.PredictionType.CONSUMPTION,
+                shipments=[
+                    PredictionShipmentFactory.build(
+                        created=ONE_HOUR_BEFORE_GATE_CLOSURE,
+                        receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT
+                    )
+                ]
+            ),
+            PredictionFactory.build(
+                location_id=location_2.id,
+                type=enums.PredictionType.PRODUCTION,
+                shipments=[
+                    PredictionShipmentFactory.build(
+                        created=ONE_HOUR_BEFORE_GATE_CLOSURE,
+                        receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT
+                    )
+                ]
+            )
+        ]
         # not applicable for impuls energy trading
         location_3 = LocationFactory.build(
             producers=[
                 ProducerFactory.build(prognosis_data_retriever=enums.DataRetriever.ENERCAST_SFTP)
             ],
-            predictions=[
-                PredictionFactory.build(
-                    type=enums.PredictionType.CONSUMPTION,
-                    shipments=[
-                        PredictionShipmentFactory.build(
-                            created=ONE_HOUR_BEFORE_GATE_CLOSURE,
-                            receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT
-                        )
-                    ]
-                )
-            ]
         )
+        location_3_predictions = [
+            PredictionFactory.build(
+                location_id=location_3.id,
+                type=enums.PredictionType.CONSUMPTION,
+                shipments=[
+                    PredictionShipmentFactory.build(
+                        created=ONE_HOUR_BEFORE_GATE_CLOSURE,
+                        receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT
+                    )
+                ]
+            )
+        ]
         with bus.uow as uow:
             uow.locations.add(location_1)
             uow.locations.add(location_2)
             uow.locations.add(location_3)
+            for prediction in [*location_1_predictions, *location_2_predictions, *location_3_predictions]:
+                uow.predictions.add(prediction)
             uow.commit()
 
         # ACT
         bus.handle(commands.SendAllEigenverbrauchsPredictionsToImpuls())
+        bus.handle(commands.DeliverOutbox())
 
         # ASSERT
         for day in pd.date_range(datetime.date.today() + datetime.timedelta(days=1), freq="D", periods=6):
             day = day.to_pydatetime().date()
 
-            consumption_prediction = next(filter(lambda p: p.type == PredictionType.CONSUMPTION, location_1.predictions)).df
-            production_prediction = next(filter(lambda p: p.type == PredictionType.PRODUCTION, location_1.predictions)).df
+            consumption_prediction = next(filter(lambda p: p.type == PredictionType.CONSUMPTION, location_1_predictions)).df
+            production_prediction = next(filter(lambda p: p.type == PredictionType.PRODUCTION, location_1_predictions)).df
             df1 = consumption_prediction.clip(upper=production_prediction)
             df1 = (df1.tz_convert(TIMEZONE_BERLIN) / 1000).round(3)
             df1 = df1[df1.index.date == day]
             df1 = df1.tz_convert(TIMEZONE_UTC)
 
-            consumption_prediction = next(filter(lambda p: p.type == PredictionType.CONSUMPTION, location_2.predictions)).df
-            production_prediction = next(filter(lambda p: p.type == PredictionType.PRODUCTION, location_2.predictions)).df
+            consumption_prediction = next(filter(lambda p: p.type == PredictionType.CONSUMPTION, location_2_predictions)).df
+            production_prediction = next(filter(lambda p: p.type == PredictionType.PRODUCTION, location_2_predictions)).df
             df2 = consumption_prediction.clip(upper=production_prediction)
             df2 = (df2.tz_convert(TIMEZONE_BERLIN) / 1000).round(3)
             df2 = df2[df2.index.date == day]
@@ -321,28 +353,33 @@ class TestSendPredictions:
             producers=[
                 ProducerFactory.build(prognosis_data_retriever=enums.DataRetriever.IMPULS_ENERGY_TRADING_SFTP)
             ],
-            predictions=[
-                PredictionFactory.build(
-                    type=enums.PredictionType.CONSUMPTION,
-                ),
-                PredictionFactory.build(
-                    type=enums.PredictionType.PRODUCTION,
-                )
-            ]
         )
+        predictions = [
+            PredictionFactory.build(
+                location_id=location.id,
+                type=enums.PredictionType.CONSUMPTION,
+            ),
+            PredictionFactory.build(
+                location_id=location.id,
+                type=enums.PredictionType.PRODUCTION,
+            )
+        ]
         with bus.uow as uow:
             uow.locations.add(location)
+            for prediction in predictions:
+                uow.predictions.add(prediction)
 
         # ACT
         bus.handle(commands.SendAllEigenverbrauchsPredictionsToImpuls(
             send_even_if_not_sent_to_internal_fahrplanmanagement=True
         ))
+        bus.handle(commands.DeliverOutbox())
 
         # ASSERT
         for day in pd.date_range(datetime.date.today() + datetime.timedelta(days=1), freq="D", periods=6):
             day = day.to_pydatetime().date()
 
-            df = (location.predictions[0].df.tz_convert(TIMEZONE_BERLIN) / 1000).round(3)
+            df = (predictions[0].df.tz_convert(TIMEZONE_BERLIN) / 1000).round(3)
             df = df[df.index.date == day]
             df = df.tz_convert(TIMEZONE_UTC)
             df.index.name = "#timestamp"
@@ -359,51 +396,45 @@ class TestSendPredictions:
             producers=[
                 ProducerFactory.build(prognosis_data_retriever=enums.DataRetriever.IMPULS_ENERGY_TRADING_SFTP)
             ],
-            predictions=[
-                PredictionFactory.build(
-                    type=enums.PredictionType.RESIDUAL_LONG,
-                    shipments=[
-                        PredictionShipmentFactory.build(
-                            created=ONE_HOUR_BEFORE_GATE_CLOSURE,
-                            receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT
-                        )
-                    ]
-                )
-            ]
         )
         location_2 = LocationFactory.build(
             tso=TransmissionSystemOperator.AMPRION,
             producers=[
                 ProducerFactory.build(prognosis_data_retriever=enums.DataRetriever.IMPULS_ENERGY_TRADING_SFTP)
             ],
-            predictions=[
-                PredictionFactory.build(
-                    type=enums.PredictionType.RESIDUAL_LONG,
-                    shipments=[
-                        PredictionShipmentFactory.build(
-                            created=ONE_HOUR_BEFORE_GATE_CLOSURE,
-                            receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT
-                        )
-                    ]
-                )
-            ]
         )
+        prediction_1, prediction_2 = [
+            PredictionFactory.build(
+                location_id=location.id,
+                type=enums.PredictionType.RESIDUAL_LONG,
+                shipments=[
+                    PredictionShipmentFactory.build(
+                        created=ONE_HOUR_BEFORE_GATE_CLOSURE,
+                        receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT
+                    )
+                ]
+            )
+            for location in [location_1, location_2]
+        ]
         with bus.uow as uow:
             uow.locations.add(location_1)
             uow.locations.add(location_2)
+            uow.predictions.add(prediction_1)
+            uow.predictions.add(prediction_2)
             uow.commit()
 
         # ACT
         bus.handle(commands.SendAllResidualLongPredictionsToImpuls())
+        bus.handle(commands.DeliverOutbox())
 
         # ASSERT
         for day in pd.date_range(datetime.date.today() + datetime.timedelta(days=1), freq="D", periods=6):
             day = day.to_pydatetime().date()
 
-            df1 = (location_1.predictions[0].df.tz_convert(TIMEZONE_BERLIN) / 1000).round(3)
+            df1 = (prediction_1.df.tz_convert(TIMEZONE_BERLIN) / 1000).round(3)
             df1 = df1[df1.index.date == day]
             df1 = df1.tz_convert(TIMEZONE_UTC)
-            df2 = (location_2.predictions[0].df.tz_convert(TIMEZONE_BERLIN) / 1000).round(3)
+            df2 = (prediction_2.df.tz_convert(TIMEZONE_BERLIN) / 1000).round(3)
             df2 = df2[df2.index.date == day]
             df2 = df2.tz_convert(TIMEZONE_UTC)
             df = pd.concat([df1, df2], axis=1)
@@ -415,8 +446,229 @@ class TestSendPredictions:
 
         with bus.uow as uow:
             for id_ in [location_1.id, location_2.id]:
-                prediction = uow.locations.get(id_).predictions[0]
+                prediction = uow.predictions.latest(id_, PredictionType.RESIDUAL_LONG)
                 assert [s.receiver for s in prediction.shipments] == [
                     PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT,
                     PredictionReceiver.IMPULS_ENERGY_TRADING
                 ]
+
+    def test_daily_dfs_for_impuls_energy_trading_with_misaligned_predictions(self):
+        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+        start = datetime.datetime.combine(tomorrow, datetime.time.min, tzinfo=TIMEZONE_BERLIN)
+        first_day = pd.date_range(start, start + datetime.timedelta(days=1), freq="15min", inclusive="left")
+        predictions = [
+            pd.DataFrame({"a": 1234.5678}, index=first_day),
+            # other timezone and data beyond the prognosis horizon
+            pd.DataFrame(
+                {"b": 1000.0}, index=first_day.union(first_day + datetime.timedelta(days=10)).tz_convert(TIMEZONE_UTC)
+            ),
+        ]
+
+        daily_dfs = handlers._get_daily_dfs_from_predictions(predictions)
+
+        assert list(daily_dfs) == [tomorrow]
+        expected = pd.DataFrame({"a": 1.235, "b": 1.0}, index=first_day.tz_convert(TIMEZONE_UTC).rename("#timestamp"))
+        assert_frame_equal(daily_dfs[tomorrow], DataFrame[IetLoadDataSchema](expected))
+
+
+    def test_daily_dfs_for_impuls_energy_trading_do_not_drop_gaps_within_a_day(self):
+        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+        start = datetime.datetime.combine(tomorrow, datetime.time(6), tzinfo=TIMEZONE_BERLIN)
+        morning = pd.date_range(start, periods=8, freq="15min")
+        # two hours without data in the middle of the day, nothing before 6:00 and after 10:00
+        prediction = pd.DataFrame({"a": 1000.0}, index=morning.union(morning + datetime.timedelta(hours=4)))
+
+        with pytest.raises(SchemaError, match="contains null values"):
+            handlers._get_daily_dfs_from_predictions([prediction])
+
+class FailingEmailSender(FakeEmailSender):
+    def send(self, recipient: str, file_name: str, data: pd.DataFrame):
+        return False
+
+
+class FlakyIetDataSender(FakeIetDataSender):
+    def __init__(self, failing_dates):
+        super().__init__()
+        self.failing_dates = set(failing_dates)
+
+    def send_data(self, data: pd.DataFrame, prediction_date: datetime.date):
+        if prediction_date in self.failing_dates:
+            raise IOError("connection lost")
+        super().send_data(data, prediction_date)
+
+
+class TestOutbox:
+    def add_location_with_residual_predictions(self, bus) -> tuple[model.Location, list[model.Prediction]]:
+        location = LocationFactory.build()
+        predictions = [
+            PredictionFactory.build(location_id=location.id, type=prediction_type)
+            for prediction_type in [
+                PredictionType.CONSUMPTION,
+                PredictionType.PRODUCTION,
+                PredictionType.RESIDUAL_SHORT,
+                PredictionType.RESIDUAL_LONG,
+            ]
+        ]
+        with bus.uow as uow:
+            uow.locations.add(location)
+            for prediction in predictions:
+                uow.predictions.add(prediction)
+        return location, predictions
+
+    def test_send_predictions_only_writes_outbox(self):
+        bus = setup_test()
+        location, predictions = self.add_location_with_residual_predictions(bus)
+
+        bus.handle(commands.SendPredictions(location_id=str(location.id)))
+
+        assert bus.dts.fahrplanmanagement_sender.data == []
+        assert all(p.shipments == [] for p in predictions)
+        assert len(bus.uow.outbox.pending(max_attempts=1)) == 2
+
+    def test_deliver_outbox_records_shipments(self):
+        bus = setup_test()
+        location, predictions = self.add_location_with_residual_predictions(bus)
+        bus.handle(commands.SendPredictions(location_id=str(location.id)))
+
+        delivered = bus.handle(commands.DeliverOutbox())
+
+        assert delivered == 2
+        assert len(bus.dts.fahrplanmanagement_sender.data) == 2
+        for prediction in predictions:
+            assert [s.receiver for s in prediction.shipments] == [PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT]
+        assert bus.uow.outbox.pending(max_attempts=1) == []
+
+    def test_deliver_outbox_on_a_bus_with_fresh_unit_of_work(self):
+        bus = setup_test()
+        location, predictions = self.add_location_with_residual_predictions(bus)
+        bus.handle(commands.SendPredictions(location_id=str(location.id)))
+
+        fresh_bus = bus.with_fresh_unit_of_work()
+        delivered = fresh_bus.handle(commands.DeliverOutbox())
+
+        assert fresh_bus is not MessageBus() and MessageBus() is bus
+        assert delivered == 2
+        for prediction in predictions:
+            assert [s.receiver for s in prediction.shipments] == [PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT]
+
+    def test_deliver_outbox_with_consolidated_emails(self):
+        bus = setup_test()
+        bus.dts.fahrplanmanagement_sender.send_many = Mock(side_effect=lambda recipient, files: [True] * len(files))
+        location, predictions = self.add_location_with_residual_predictions(bus)
+        bus.handle(commands.SendPredictions(location_id=str(location.id)))
+
+        with patch.object(settings, "fahrplanmanagement_consolidated_emails", True):
+            delivered = bus.handle(commands.DeliverOutbox())
+
+        assert delivered == 2
+        recipients = [c.args[0] for c in bus.dts.fahrplanmanagement_sender.send_many.call_args_list]
+        assert sorted(recipients) == sorted([settings.mail_recipient_cons, settings.mail_recipient_prod])
+        for prediction in predictions:
+            assert [s.receiver for s in prediction.shipments] == [PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT]
+
+    def test_failed_delivery_is_retried(self):
+        bus = setup_test()
+        bus.dts.fahrplanmanagement_sender = FailingEmailSender()
+        location, predictions = self.add_location_with_residual_predictions(bus)
+        bus.handle(commands.SendPredictions(location_id=str(location.id)))
+
+        delivered = bus.handle(commands.DeliverOutbox())
+
+        assert delivered == 0
+        assert all(p.shipments == [] for p in predictions)
+        outbox_messages = bus.uow.outbox.pending(max_attempts=2)
+        assert [(m.attempts, m.last_error) for m in outbox_messages] == [(1, "email was not sent")] * 2
+        assert bus.uow.outbox.pending(max_attempts=1) == []
+
+    def test_daily_files_are_shipped_once_all_of_them_were_delivered(self):
+        bus = setup_test()
+        location = LocationFactory.build(
+            tso=TransmissionSystemOperator.AMPRION,
+            producers=[ProducerFactory.build(prognosis_data_retriever=enums.DataRetriever.IMPULS_ENERGY_TRADING_SFTP)],
+        )
+        prediction = PredictionFactory.build(
+            location_id=location.id,
+            type=enums.PredictionType.RESIDUAL_LONG,
+            shipments=[
+                PredictionShipmentFactory.build(
+                    created=ONE_HOUR_BEFORE_GATE_CLOSURE, receiver=PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT
+                )
+            ],
+        )
+        with bus.uow as uow:
+            uow.locations.add(location)
+            uow.predictions.add(prediction)
+        bus.handle(commands.SendAllResidualLongPredictionsToImpuls())
+        days = len(bus.uow.outbox.pending(max_attempts=1))
+        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+        sender = FlakyIetDataSender(failing_dates=[tomorrow])
+        bus.dts.impuls_energy_trading_residual_long_sender = sender
+
+        assert bus.handle(commands.DeliverOutbox()) == days - 1
+        assert [s.receiver for s in prediction.shipments] == [PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT]
+
+        sender.failing_dates.clear()
+        assert bus.handle(commands.DeliverOutbox()) == 1
+        assert bus.handle(commands.DeliverOutbox()) == 0
+        assert [s.receiver for s in prediction.shipments] == [
+            PredictionReceiver.INTERNAL_FAHRPLANMANAGEMENT, PredictionReceiver.IMPULS_ENERGY_TRADING
+        ]
+        assert bus.uow.outbox.get_all() == []
+
+    def test_undeliverable_messages_are_dead_lettered_and_cleaned_up(self):
+        bus = setup_test()
+        bus.dts.fahrplanmanagement_sender = FailingEmailSender()
+        location, predictions = self.add_location_with_residual_predictions(bus)
+        bus.handle(commands.SendPredictions(location_id=str(location.id)))
+
+        with patch.object(settings, "outbox_max_attempts", 1):
+            bus.handle(commands.DeliverOutbox())
+            outbox_messages = bus.uow.outbox.get_all()
+            assert len(outbox_messages) == 2
+            assert all(m.dead_lettered is not None for m in outbox_messages)
+            assert bus.uow.outbox.pending(max_attempts=2) == []
+
+            with patch.object(settings, "outbox_dead_letter_retention_days", -1):
+                bus.handle(commands.DeliverOutbox())
+        assert bus.uow.outbox.get_all() == []
+
+
+class TestArchivePredictions:
+    def test_archive_predictions_older_than_given_days(self):
+        bus = setup_test()
+        location = LocationFactory.build()
+        old_prediction = PredictionFactory.build(
+            location_id=location.id,
+            type=PredictionType.CONSUMPTION,
+            created=datetime.datetime.now(tz=TIMEZONE_UTC) - datetime.timedelta(days=91),
+        )
+        new_prediction = PredictionFactory.build(location_id=location.id, type=PredictionType.CONSUMPTION)
+        with bus.uow as uow:
+            uow.locations.add(location)
+            uow.predictions.add(old_prediction)
+            uow.predictions.add(new_prediction)
+
+        with patch.object(settings, "prediction_archive_path", "/mnt/prediction-archive"):
+            archived = bus.handle(commands.ArchivePredictions(older_than_days=90))
+
+        assert archived == 1
+        assert bus.uow.predictions.get_range(location.id) == [new_prediction]
+        assert bus.uow.predictions.get_range(location.id, include_archived=True) == [old_prediction, new_prediction]
+
+    def test_no_archiving_without_archive(self):
+        bus = setup_test()
+        location = LocationFactory.build()
+        old_prediction = PredictionFactory.build(
+            location_id=location.id,
+            type=PredictionType.CONSUMPTION,
+            created=datetime.datetime.now(tz=TIMEZONE_UTC) - datetime.timedelta(days=91),
+        )
+        with bus.uow as uow:
+            uow.locations.add(location)
+            uow.predictions.add(old_prediction)
+
+        with patch.object(settings, "prediction_archive_path", None):
+            archived = bus.handle(commands.ArchivePredictions(older_than_days=90))
+
+        assert archived == 0
+        assert bus.uow.predictions.get_range(location.id) == [old_prediction]
@@ -1,5 +1,6 @@
 import datetime
 import datetime as dt
+import numpy as np
 import pandas as pd
 from pandas.testing import assert_frame_equal
 from pandera.typing import DataFrame
@@ -7,13 +8,17 @@ from pandera.typing import DataFrame
 from src.domain.model import (
     HistoricLoadData,
     Location,
+    LocationSettings,
     Prediction,
     Producer, MarketLocation,
+    get_predicted_own_consumption,
+    get_predicted_own_consumptions,
 )
 from src.enums import PredictionType, DataRetriever, Measurand
+from src.persistence.repository import MemoryPredictionRepository
 from src.utils.dataframe_schemas import TimeSeriesSchema
 from src.utils.timezone import TIMEZONE_BERLIN
-from tests.factories import LocationFactory
+from tests.factories import LocationFactory, ProducerFactory
 
 
 def create_df_with_constant_values(value=42):
@@ -26,6 +31,37 @@ def create_df_with_constant_values(value=42):
     return DataFrame[TimeSeriesSchema](df)
 
 
+def residual_loads_with_pandas(location: Location, consumption_df: pd.DataFrame, production_dfs: list[pd.DataFrame]):
+    # the previous implementation of Location.calculate_location_residual_loads, kept as reference
+    total_production_df = sum(production_dfs) if location.has_production else None
+
+    def clip_to_time_range(df):
+        return df[
+            (df.index.date >= location.settings.active_from)
+            & (df.index.date < location.settings.active_until if location.settings.active_until else True)
+        ]
+
+    residual_dfs = []
+    short_df = consumption_df - total_production_df if location.has_production else consumption_df.copy()
+    short_df[short_df < 0] = 0
+    short_df = clip_to_time_range(short_df)
+    residual_dfs.append(short_df[short_df.first_valid_index():short_df.last_valid_index()])
+    if location.has_production:
+        long_df = total_production_df - consumption_df
+        long_df[long_df < 0] = 0
+        long_df = clip_to_time_range(long_df)
+        residual_dfs.append(long_df[long_df.first_valid_index():long_df.last_valid_index()])
+    return residual_dfs
+
+
+def random_series(start: str, periods: int, seed: int, missing: float = 0.0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    values = rng.uniform(0, 100, periods)
+    values[rng.random(periods) < missing] = np.nan
+    index = pd.date_range(start, periods=periods, freq="15min", tz=TIMEZONE_BERLIN, name="datetime")
+    return pd.DataFrame({"value": values}, index=index)
+
+
 class TestLocation:
     def test_only_one_producer_per_location(self, location):
         producer = Producer(market_location=MarketLocation(number="MALO-PRODUCER-01", measurand=Measurand.NEGATIVE), prognosis_data_retriever=DataRetriever.ENERCAST_SFTP)
@@ -72,74 +108,167 @@ class TestLocation:
 
     def test_calculate_location_residual_loads_consumer_only(self, location):
         input_df = create_df_with_constant_values()
-        location.predictions.append(
-            Prediction(df=input_df, type=PredictionType.CONSUMPTION)
+        residual_predictions = location.calculate_location_residual_loads(
+            Prediction(df=input_df, type=PredictionType.CONSUMPTION), []
         )
-        location.calculate_location_residual_loads()
         prediction_residual_short = next(
-            p for p in location.predictions if p.type == PredictionType.RESIDUAL_SHORT
+            p for p in residual_predictions if p.type == PredictionType.RESIDUAL_SHORT
         )
 
         mask = (input_df.index.date >= location.settings.active_from) & (
                     input_df.index.date < location.settings.active_until if location.settings.active_until else True)
+        assert prediction_residual_short.location_id == location.id
         assert_frame_equal(prediction_residual_short.df, input_df[mask])
 
+
+    def test_residual_loads_match_previous_implementation(self):
+        settings = [
+            LocationSettings(
+                active_from=datetime.date(2024, 3, 29),
+                active_until=active_until,
+                send_consumption_predictions_to_fahrplanmanagement=True,
+                historic_days_for_consumption_prediction=50,
+            )
+            for active_until in [None, datetime.date(2024, 4, 2)]
+        ]
+        cases = [
+            # consumption and production on the same grid, across the change to summer time
+            (random_series("2024-03-28", 96 * 7, 0), [random_series("2024-03-28", 96 * 7, 1)]),
+            # production starting later and ending earlier, with missing values
+            (random_series("2024-03-28", 96 * 7, 2, missing=0.05), [random_series("2024-03-29 06:00", 96 * 3, 3)]),
+            # two producers which only partly overlap
+            (
+                random_series("2024-03-28", 96 * 7, 4),
+                [random_series("2024-03-28", 96 * 5, 5), random_series("2024-03-30", 96 * 5, 6, missing=0.1)],
+            ),
+        ]
+        for location_settings in settings:
+            for consumption_df, production_dfs in cases:
+                location = LocationFactory.build(
+                    settings=location_settings, producers=[ProducerFactory.build() for _ in production_dfs]
+                )
+                residual_predictions = location.calculate_location_residual_loads(
+                    Prediction(df=consumption_df, type=PredictionType.CONSUMPTION),
+                    [Prediction(df=df, type=PredictionType.PRODUCTION) for df in production_dfs],
+                )
+
+                expected_dfs = residual_loads_with_pandas(location, consumption_df, production_dfs)
+                assert [p.type for p in residual_predictions] == [PredictionType.RESIDUAL_SHORT, PredictionType.RESIDUAL_LONG]
+                for prediction, expected_df in zip(residual_predictions, expected_dfs):
+                    assert_frame_equal(prediction.df, expected_df)
+
+                consumer_only = LocationFactory.build(settings=location_settings, producers=[])
+                [short_prediction] = consumer_only.calculate_location_residual_loads(
+                    Prediction(df=consumption_df, type=PredictionType.CONSUMPTION), []
+                )
+                assert_frame_equal(short_prediction.df, residual_loads_with_pandas(consumer_only, consumption_df, [])[0])
+
+    def test_own_consumptions_match_own_consumption_per_location(self):
+        grid = pd.date_range("2024-09-02", periods=8, freq="15min", tz=TIMEZONE_BERLIN)
+        consumptions = [
+            pd.DataFrame({"value": [1.0, 5.0, 3.0, 4.0, np.nan, 2.0, 6.0, 1.0]}, index=grid),
+            pd.DataFrame({"value": [7.0, 7.0, 7.0, 7.0]}, index=grid[2:6]),
+        ]
+        productions = [
+            # a missing value at 00:30 and no timestamps after 01:15
+            pd.DataFrame({"value": [2.0, 2.0, np.nan, 2.0, 2.0, 2.0]}, index=grid[:6]),
+            pd.DataFrame({"value": [3.0, 3.0, np.nan, 3.0, np.nan, 3.0, 3.0, 3.0]}, index=grid),
+        ]
+
+        own_consumptions = get_predicted_own_consumptions(
+            np.column_stack([c.reindex(grid)["value"] for c in consumptions]),
+            np.column_stack([p.reindex(grid)["value"] for p in productions]),
+            production_covered=np.column_stack([grid.isin(p.index) for p in productions]),
+        )
+
+        for i, (consumption, production) in enumerate(zip(consumptions, productions)):
+            expected = get_predicted_own_consumption(
+                Prediction(df=consumption, type=PredictionType.CONSUMPTION),
+                Prediction(df=production, type=PredictionType.PRODUCTION),
+            )
+            np.testing.assert_array_equal(own_consumptions[:, i], expected.reindex(grid)["value"].to_numpy())
+
+class TestPredictionRepository:
     def test_delete_oldest_predictions(self, location: Location):
+        repo = MemoryPredictionRepository({})
         oldest = Prediction(
+            location_id=location.id,
             df=create_df_with_constant_values(),
             type=PredictionType.CONSUMPTION,
             created=datetime.datetime(2024, 1, 1),
         )
-        location.predictions.append(oldest)
+        repo.add(oldest)
         newest = Prediction(
+            location_id=location.id,
             df=create_df_with_constant_values(),
             type=PredictionType.CONSUMPTION,
             created=datetime.datetime(2024, 1, 2),
         )
-        location.predictions.append(newest)
+        repo.add(newest)
 
-        location.delete_oldest_predictions(keep=1, type=PredictionType.CONSUMPTION)
+        repo.delete_oldest(location.id, keep=1, type=PredictionType.CONSUMPTION)
 
-        assert location.predictions == [newest]
+        assert repo.get_range(location.id) == [newest]
 
     def test_delete_only_specific_prediction_types(self, location: Location):
+        repo = MemoryPredictionRepository({})
         consumption_prediction = Prediction(
+            location_id=location.id,
             df=create_df_with_constant_values(),
             type=PredictionType.CONSUMPTION,
             created=datetime.datetime(2024, 1, 1),
         )
         consumption_prediction_2 = Prediction(
+            location_id=location.id,
             df=create_df_with_constant_values(),
             type=PredictionType.CONSUMPTION,
             created=datetime.datetime(2024, 1, 2),
         )
         production_prediction = Prediction(
+            location_id=location.id,
             df=create_df_with_constant_values(),
             type=PredictionType.PRODUCTION,
             created=datetime.datetime(2024, 1, 2),
         )
-        location.predictions.append(consumption_prediction)
-        location.predictions.append(consumption_prediction_2)
-        location.predictions.append(production_prediction)
+        repo.add(consumption_prediction)
+        repo.add(consumption_prediction_2)
+        repo.add(production_prediction)
 
-        location.delete_oldest_predictions(type=PredictionType.CONSUMPTION, keep=1)
+        repo.delete_oldest(location.id, type=PredictionType.CONSUMPTION, keep=1)
 
-        assert set(location.predictions) == {production_prediction, consumption_prediction_2}
+        assert set(repo.get_range(location.id)) == {production_prediction, consumption_prediction_2}
 
     def test_delete_and_keep_none(self, location: Location):
+        repo = MemoryPredictionRepository({})
         consumption_prediction = Prediction(
+            location_id=location.id,
             df=create_df_with_constant_values(),
             type=PredictionType.CONSUMPTION,
             created=datetime.datetime(2024, 1, 1),
         )
         production_prediction = Prediction(
+            location_id=location.id,
             df=create_df_with_constant_values(),
             type=PredictionType.PRODUCTION,
             created=datetime.datetime(2024, 1, 2),
         )
-        location.predictions.append(consumption_prediction)
-        location.predictions.append(production_prediction)
+        repo.add(consumption_prediction)
+        repo.add(production_prediction)
+
+        repo.delete_oldest(location.id, type=PredictionType.CONSUMPTION, keep=0)
+
+        assert repo.get_range(location.id) == [production_prediction]
+
+    def test_predictions_of_other_locations_are_kept(self, location: Location):
+        repo = MemoryPredictionRepository({})
+        other_location_prediction = Prediction(
+            location_id=LocationFactory.build().id,
+            df=create_df_with_constant_values(),
+            type=PredictionType.CONSUMPTION,
+            created=datetime.datetime(2024, 1, 1),
+        )
+        repo.add(other_location_prediction)
 
-        location.delete_oldest_predictions(type=PredictionType.CONSUMPTION, keep=0)
+        repo.delete_oldest(location.id, keep=0)
 
-        assert location.predictions == [production_prediction]
+        assert repo.get(other_location_prediction.id) == other_location_prediction
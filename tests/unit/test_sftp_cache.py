@@ -0,0 +1,110 @@
+import io
+import os
+
+from paramiko import SFTPAttributes
+
+from src.config import settings
+from src.services.load_data_exchange.common import SftpMixin
+from src.services.load_data_exchange.sftp_cache import SftpFileCache
+
+
+class FakeRemoteFile(io.BytesIO):
+    def prefetch(self, file_size: int):
+        pass
+
+
+class FakeSftp:
+    def __init__(self, files: dict[str, bytes]):
+        self.files = files
+        self.downloaded: list[str] = []
+
+    def open(self, file_name: str, mode: str):
+        self.downloaded.append(file_name)
+        return FakeRemoteFile(self.files[file_name])
+
+    def chdir(self, path: str):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeSftpClient(SftpMixin):
+    def __init__(self, sftp: FakeSftp, cache: SftpFileCache):
+        self.host = "sftp.example.com"
+        self._sftp = sftp
+        self.cache = cache
+        self.opened_channels = 0
+
+    def _open_channel(self, session_sftp):
+        self.opened_channels += 1
+        return session_sftp
+
+
+def attrs(file_name: str, size: int, mtime: int) -> SFTPAttributes:
+    a = SFTPAttributes()
+    a.filename, a.st_size, a.st_mtime = file_name, size, mtime
+    return a
+
+
+class TestSftpFileCache:
+    def test_store_and_open(self, tmp_path):
+        cache = SftpFileCache(tmp_path / "cache", max_bytes=100)
+        assert cache.open("host:/dir", "a.csv", 3, 1) is None
+        with cache.store("host:/dir", "a.csv", 3, 1, lambda target: target.write(b"abc")) as f:
+            assert f.read() == b"abc"
+        with cache.open("host:/dir", "a.csv", 3, 1) as f:
+            assert f.read() == b"abc"
+        # a changed remote file is a cache miss
+        assert cache.open("host:/dir", "a.csv", 3, 2) is None
+        assert cache.open("host:/other", "a.csv", 3, 1) is None
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = SftpFileCache(tmp_path, max_bytes=10)
+
+        def store(file_name, data):
+            cache.store("ns", file_name, 4, 1, lambda target: target.write(data)).close()
+
+        def read(file_name):
+            f = cache.open("ns", file_name, 4, 1)
+            if f is None:
+                return None
+            with f:
+                return f.read()
+
+        store("a.csv", b"aaaa")
+        store("b.csv", b"bbbb")
+        os.utime(cache._path("ns", "a.csv", 4, 1), (1, 1))
+        os.utime(cache._path("ns", "b.csv", 4, 1), (2, 2))
+        assert read("a.csv") == b"aaaa"  # a is now the most recently used file
+        store("c.csv", b"cccc")
+        assert read("a.csv") == b"aaaa"
+        assert read("b.csv") is None
+        assert read("c.csv") == b"cccc"
+
+    def test_download_files_uses_cache(self, tmp_path):
+        sftp = FakeSftp({"a.csv": b"abc", "b.csv": b"def"})
+        client = FakeSftpClient(sftp, SftpFileCache(tmp_path, max_bytes=100))
+        file_attrs = [attrs("a.csv", 3, 1), attrs("b.csv", 3, 1)]
+
+        first = client._download_files("/forecasts", file_attrs)
+        second = client._download_files("/forecasts", file_attrs)
+
+        assert sorted(sftp.downloaded) == ["a.csv", "b.csv"]
+        assert [(f.download.size, f.download.from_cache) for f in first] == [(3, False), (3, False)]
+        assert [(f.download.size, f.download.from_cache) for f in second] == [(3, True), (3, True)]
+        assert [(f.name, f.read()) for f in first] == [(f.name, f.read()) for f in second] == [
+            ("a.csv", b"abc"), ("b.csv", b"def")
+        ]
+
+    def test_download_files_concurrently(self, tmp_path):
+        files = {f"{i}.csv": str(i).encode() for i in range(10)}
+        sftp = FakeSftp(files)
+        client = FakeSftpClient(sftp, None)
+        file_attrs = [attrs(file_name, 1, 1) for file_name in files]
+
+        file_objs = client._download_files("/forecasts", file_attrs + [file_attrs[0]])
+
+        assert [(f.name, f.read()) for f in file_objs] == [(a.filename, files[a.filename]) for a in file_attrs]
+        assert sorted(sftp.downloaded) == sorted(files)
+        assert client.opened_channels == min(settings.sftp_download_concurrency, len(files))
@@ -0,0 +1,98 @@
+import datetime
+
+from freezegun import freeze_time
+from paramiko import SFTPAttributes
+
+from src.services.load_data_exchange.enercast import EnercastSftpClient
+from src.services.load_data_exchange.impuls_energy_trading import IetSftpClient, parse_iet_generation_file_name
+from src.services.load_data_exchange.sftp_listing import RemoteDirectoryIndex
+from tests.unit.test_sftp_cache import FakeRemoteFile
+
+ASSET_ID = "fde5bb7e-b0a9-4dc5-ae9e-9ca109777cb7"
+
+
+class FakeSftp:
+    def __init__(self, file_names: list[str]):
+        self.file_names = file_names
+        self.listings = 0
+
+    def listdir_attr(self):
+        self.listings += 1
+        attrs = []
+        for file_name in self.file_names:
+            a = SFTPAttributes()
+            a.filename, a.st_size, a.st_mtime = file_name, 1, 1
+            attrs.append(a)
+        return attrs
+
+    def chdir(self, path):
+        pass
+
+    def close(self):
+        pass
+
+
+class TestRemoteDirectoryIndex:
+    def test_groups_files_by_asset_and_date(self):
+        sftp = FakeSftp([
+            f"20240827_0800_erzeugungsprognose_{ASSET_ID}_20240902.csv",
+            f"20240828_0800_erzeugungsprognose_{ASSET_ID}_20240902.csv",
+            f"20240828_0800_erzeugungsprognose_{ASSET_ID}_20240903.csv",
+            "20240828_0800_erzeugungsprognose_other_20240903.csv",
+            "unrelated.txt",
+        ])
+        index = RemoteDirectoryIndex(parse_iet_generation_file_name, datetime.timedelta(minutes=5))
+        index.refresh_if_stale(sftp)
+
+        files = index.files(ASSET_ID)
+        assert {date: [f.attrs.filename[:13] for f in fs] for date, fs in files.items()} == {
+            datetime.date(2024, 9, 2): ["20240827_0800", "20240828_0800"],
+            datetime.date(2024, 9, 3): ["20240828_0800"],
+        }
+        assert index.files("unknown") == {}
+
+    def test_lists_once_per_max_age(self):
+        sftp = FakeSftp([f"20240827_0800_erzeugungsprognose_{ASSET_ID}_20240902.csv"])
+        index = RemoteDirectoryIndex(parse_iet_generation_file_name, datetime.timedelta(minutes=5))
+        with freeze_time("2024-08-28 08:00") as frozen_time:
+            index.refresh_if_stale(sftp)
+            index.refresh_if_stale(sftp)
+            assert sftp.listings == 1
+            sftp.file_names = []
+            frozen_time.tick(datetime.timedelta(minutes=6))
+            index.refresh_if_stale(sftp)
+        assert sftp.listings == 2
+        assert index.files(ASSET_ID) == {}
+
+    def test_client_selects_files_from_index(self):
+        client = IetSftpClient()
+        client.cache = None
+        client._sftp = FakeSftp([
+            f"20240827_0800_erzeugungsprognose_{ASSET_ID}_20240902.csv",
+            f"20240827_0800_erzeugungsprognose_{ASSET_ID}_20240903.csv",
+            f"20240828_0800_erzeugungsprognose_{ASSET_ID}_20240903.csv",
+        ])
+        client._sftp.open = lambda file_name, mode: FakeRemoteFile(file_name.encode())
+
+        files = client._download_relevant_files(
+            ASSET_ID, start=datetime.datetime(2024, 9, 3, tzinfo=datetime.timezone.utc), end=None
+        )
+
+        assert [f.name for f in files] == [f"20240828_0800_erzeugungsprognose_{ASSET_ID}_20240903.csv"]
+
+    def test_enercast_client_downloads_every_file_once(self):
+        client = EnercastSftpClient()
+        client.cache = None
+        client._sftp = FakeSftp([
+            "50571705655_WP_1_2024-08-28-11-30-42.csv",
+            "50571705655_WP_1_2024-08-29-11-30-41.csv",
+            "12345_WP_2_2024-08-29-11-30-41.csv",
+        ])
+        client._sftp.open = lambda file_name, mode: FakeRemoteFile(file_name.encode())
+        client._open_channel = lambda session_sftp: session_sftp
+
+        files = client._download_relevant_files("50571705655", start=None)
+
+        assert sorted(f.name for f in files) == [
+            "50571705655_WP_1_2024-08-28-11-30-42.csv", "50571705655_WP_1_2024-08-29-11-30-41.csv"
+        ]
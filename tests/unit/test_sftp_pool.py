@@ -0,0 +1,87 @@
+import threading
+
+from src.services.load_data_exchange.sftp_pool import SftpSessionPool, SftpSession
+
+
+class FakeTransport:
+    def __init__(self):
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+
+class FakeSsh:
+    def __init__(self):
+        self.transport = FakeTransport()
+        self.closed = False
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSftp:
+    def chdir(self, path):
+        pass
+
+    def normalize(self, path):
+        return "/"
+
+    def close(self):
+        pass
+
+
+class FakeSftpSessionPool(SftpSessionPool):
+    def __init__(self, max_sessions_per_host=2, max_idle_seconds=300):
+        super().__init__(max_sessions_per_host, keepalive_seconds=30, max_idle_seconds=max_idle_seconds)
+        self.connections = 0
+
+    def _connect(self, host, username, password):
+        self.connections += 1
+        return SftpSession(host, username, FakeSsh(), FakeSftp())
+
+
+class TestSftpSessionPool:
+    def test_reuses_released_session(self):
+        pool = FakeSftpSessionPool()
+        session = pool.acquire("host", "user", "pass")
+        pool.release(session)
+        assert pool.acquire("host", "user", "pass") is session
+        assert pool.connections == 1
+
+    def test_replaces_broken_or_expired_session(self):
+        pool = FakeSftpSessionPool()
+        session = pool.acquire("host", "user", "pass")
+        pool.release(session)
+        session.ssh.transport.active = False
+        new_session = pool.acquire("host", "user", "pass")
+        assert new_session is not session
+        assert session.ssh.closed
+        pool.release(new_session)
+
+        expiring_pool = FakeSftpSessionPool(max_idle_seconds=-1)
+        session = expiring_pool.acquire("host", "user", "pass")
+        expiring_pool.release(session)
+        assert expiring_pool.acquire("host", "user", "pass") is not session
+
+    def test_limits_sessions_per_host(self):
+        pool = FakeSftpSessionPool(max_sessions_per_host=1)
+        session = pool.acquire("host", "user", "pass")
+        other_host_session = pool.acquire("other-host", "user", "pass")
+        acquired = threading.Event()
+
+        def acquire_and_release():
+            pool.release(pool.acquire("host", "user", "pass"))
+            acquired.set()
+
+        thread = threading.Thread(target=acquire_and_release)
+        thread.start()
+        assert not acquired.wait(0.1)
+        pool.release(session)
+        assert acquired.wait(1)
+        thread.join()
+        pool.release(other_host_session)
+        assert pool.connections == 2
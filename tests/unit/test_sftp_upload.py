@@ -0,0 +1,205 @@
+import datetime
+import io
+import threading
+from unittest import mock
+
+import pandas as pd
+
+from src.config import settings
+from src.services.data_sender import DataSender
+from src.services.load_data_exchange.impuls_energy_trading import IetSftpClient, IetSftpEigenverbrauchDataSender, \
+    IetSftpResidualLongDataSender
+from src.services.load_data_exchange.sftp_pool import SftpSession, SftpSessionPool
+from src.utils.timezone import TIMEZONE_UTC
+from tests.fakes import FakeEmailSender
+
+
+class FakeRemoteDirectory:
+    def __init__(self, posix_rename_supported=True, failing_file_names=()):
+        self.files: dict[str, bytes] = {}
+        self.renames: list[tuple[str, str]] = []
+        self.posix_rename_supported = posix_rename_supported
+        self.failing_file_names = failing_file_names
+        self.lock = threading.Lock()
+
+
+class FakeUploadSftp:
+    def __init__(self, directory: FakeRemoteDirectory):
+        self.directory = directory
+
+    def putfo(self, file_obj, remotepath):
+        if remotepath.split("/")[-1].removesuffix(".part") in self.directory.failing_file_names:
+            with self.directory.lock:
+                self.directory.files[remotepath] = b"partial"
+            raise IOError("connection lost")
+        with self.directory.lock:
+            self.directory.files[remotepath] = file_obj.read()
+
+    def posix_rename(self, oldpath, newpath):
+        if not self.directory.posix_rename_supported:
+            raise IOError("operation unsupported")
+        self._move(oldpath, newpath)
+
+    def rename(self, oldpath, newpath):
+        if newpath in self.directory.files:
+            raise IOError("file exists")
+        self._move(oldpath, newpath)
+
+    def remove(self, path):
+        with self.directory.lock:
+            if path not in self.directory.files:
+                raise IOError("no such file")
+            del self.directory.files[path]
+
+    def _move(self, oldpath, newpath):
+        with self.directory.lock:
+            self.directory.files[newpath] = self.directory.files.pop(oldpath)
+            self.directory.renames.append((oldpath, newpath))
+
+    def chdir(self, path):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeUploadSessionPool(SftpSessionPool):
+    def __init__(self, directory: FakeRemoteDirectory):
+        super().__init__(max_sessions_per_host=2, keepalive_seconds=30, max_idle_seconds=300)
+        self.directory = directory
+        self.connections = 0
+
+    def _connect(self, host, username, password):
+        self.connections += 1
+        return SftpSession(host, username, mock.Mock(), FakeUploadSftp(self.directory))
+
+
+def upload_client(directory: FakeRemoteDirectory) -> IetSftpClient:
+    client = IetSftpClient()
+    client.pool = FakeUploadSessionPool(directory)
+    client._open_channel = lambda session_sftp: FakeUploadSftp(directory)
+    return client
+
+
+def file_obj(name: str, content: bytes = b"data") -> io.BytesIO:
+    file_obj = io.BytesIO(content)
+    file_obj.name = name
+    return file_obj
+
+
+def daily_df(date: datetime.date) -> pd.DataFrame:
+    index = pd.date_range(date, periods=4, freq="15min", tz=TIMEZONE_UTC, name="#timestamp")
+    return pd.DataFrame({"asset-1": [1.0, 2.0, 3.0, 4.0]}, index=index)
+
+
+@mock.patch.object(settings, "send_predictions_enabled", True)
+class TestIetSftpUpload:
+    def test_uploads_files_under_temporary_names(self):
+        directory = FakeRemoteDirectory()
+        client = upload_client(directory)
+
+        errors = client.upload_eigenverbrauch_files([file_obj(f"{i}.csv", str(i).encode()) for i in range(6)])
+
+        assert errors == [None] * 6
+        assert directory.files == {f"/Eigenverbrauch/Anlagen/{i}.csv": str(i).encode() for i in range(6)}
+        assert sorted(directory.renames) == [
+            (f"/Eigenverbrauch/Anlagen/{i}.csv.part", f"/Eigenverbrauch/Anlagen/{i}.csv") for i in range(6)
+        ]
+        assert client.pool.connections == 1
+
+    def test_failed_upload_leaves_no_partial_file(self):
+        directory = FakeRemoteDirectory(failing_file_names=["1.csv"])
+        client = upload_client(directory)
+
+        errors = client.upload_residual_long_files([file_obj(f"{i}.csv") for i in range(3)])
+
+        assert errors[0] is None and errors[2] is None
+        assert isinstance(errors[1], IOError)
+        assert sorted(directory.files) == ["/Ausspeisung/Anlagen/0.csv", "/Ausspeisung/Anlagen/2.csv"]
+
+    def test_replaces_existing_file_without_posix_rename(self):
+        directory = FakeRemoteDirectory(posix_rename_supported=False)
+        directory.files["/Ausspeisung/Anlagen/0.csv"] = b"old"
+        client = upload_client(directory)
+
+        with mock.patch.object(settings, "sftp_upload_concurrency", 1):
+            errors = client.upload_residual_long_files([file_obj("0.csv", b"new")])
+
+        assert errors == [None]
+        assert directory.files == {"/Ausspeisung/Anlagen/0.csv": b"new"}
+
+    def test_threads_borrow_their_own_session(self):
+        directory = FakeRemoteDirectory()
+        client = upload_client(directory)
+        client.pool.release = mock.Mock(wraps=client.pool.release)
+        both_entered = threading.Barrier(2)
+        sessions = []
+
+        def upload(name):
+            with client.session():
+                both_entered.wait(timeout=5)
+                sessions.append(client._borrowed.session)
+                assert client.upload_eigenverbrauch_files([file_obj(name)]) == [None]
+
+        threads = [threading.Thread(target=upload, args=(f"{i}.csv",)) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(sessions) == 2 and sessions[0] is not sessions[1]
+        assert sorted(directory.files) == ["/Eigenverbrauch/Anlagen/0.csv", "/Eigenverbrauch/Anlagen/1.csv"]
+        assert client.pool.connections == 2
+        released = [c.args[0] for c in client.pool.release.call_args_list]
+        assert {id(session) for session in released} == {id(session) for session in sessions}
+
+    def test_data_sender_uploads_both_channels_over_one_session(self):
+        directory = FakeRemoteDirectory()
+        client = upload_client(directory)
+        dts = DataSender(
+            fahrplanmanagement_sender=FakeEmailSender(),
+            impuls_energy_trading_eigenverbrauch_sender=IetSftpEigenverbrauchDataSender(sftp_client=client),
+            impuls_energy_trading_residual_long_sender=IetSftpResidualLongDataSender(sftp_client=client),
+        )
+        files = [(daily_df(datetime.date(2024, 9, day)), datetime.date(2024, 9, day)) for day in range(2, 8)]
+
+        with dts.impuls_energy_trading_session():
+            eigenverbrauch_errors = dts.send_all_eigenverbrauch_to_impuls_energy_trading(files)
+            residual_long_errors = dts.send_all_residual_long_to_impuls_energy_trading(files)
+
+        assert eigenverbrauch_errors == residual_long_errors == [None] * 6
+        assert len([path for path in directory.files if path.startswith("/Eigenverbrauch/")]) == 6
+        assert len([path for path in directory.files if path.startswith("/Ausspeisung/")]) == 6
+        assert client.pool.connections == 1
+        assert client._open_count == 0
+
+    def test_data_senders_sharing_a_client_deliver_concurrently(self):
+        directory = FakeRemoteDirectory()
+        client = upload_client(directory)
+        dts = DataSender(
+            fahrplanmanagement_sender=FakeEmailSender(),
+            impuls_energy_trading_eigenverbrauch_sender=IetSftpEigenverbrauchDataSender(sftp_client=client),
+            impuls_energy_trading_residual_long_sender=IetSftpResidualLongDataSender(sftp_client=client),
+        )
+        files = [(daily_df(datetime.date(2024, 9, day)), datetime.date(2024, 9, day)) for day in range(2, 8)]
+        both_entered = threading.Barrier(2)
+        errors = {}
+
+        def deliver(name, send_all):
+            with dts.impuls_energy_trading_session():
+                both_entered.wait(timeout=5)
+                errors[name] = send_all(files)
+
+        threads = [
+            threading.Thread(target=deliver, args=("eigenverbrauch", dts.send_all_eigenverbrauch_to_impuls_energy_trading)),
+            threading.Thread(target=deliver, args=("residual_long", dts.send_all_residual_long_to_impuls_energy_trading)),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == {"eigenverbrauch": [None] * 6, "residual_long": [None] * 6}
+        assert len([path for path in directory.files if path.startswith("/Eigenverbrauch/")]) == 6
+        assert len([path for path in directory.files if path.startswith("/Ausspeisung/")]) == 6
+        assert client.pool.connections == 2
@@ -0,0 +1,42 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from src.utils.split_df_by_day import split_df_by_day
+from src.utils.timezone import TIMEZONE_BERLIN
+
+
+def split_df_by_day_with_masks(df: pd.DataFrame, timezone_for_day_boundary) -> dict:
+    local_dates = df.tz_convert(timezone_for_day_boundary).index.date
+    return {day: df[local_dates == day] for day in pd.unique(local_dates)}
+
+
+def wide_df(start: str, days: int, columns: int = 3) -> pd.DataFrame:
+    index = pd.date_range(start, periods=days * 96, freq="15min", tz="UTC", name="#timestamp")
+    return pd.DataFrame(np.random.default_rng(0).random((len(index), columns)), index=index)
+
+
+class TestSplitDfByDay:
+    def test_split_equals_masks_across_dst_changes(self):
+        df = wide_df("2024-03-25 23:00", days=220)
+
+        dfs_by_day = split_df_by_day(df, TIMEZONE_BERLIN)
+
+        expected = split_df_by_day_with_masks(df, TIMEZONE_BERLIN)
+        assert list(dfs_by_day) == list(expected)
+        for day, daily_df in expected.items():
+            assert_frame_equal(dfs_by_day[day], daily_df, check_freq=False)
+        assert len(dfs_by_day[datetime.date(2024, 3, 31)]) == 92
+        assert len(dfs_by_day[datetime.date(2024, 10, 27)]) == 100
+
+    def test_split_unsorted_index(self):
+        df = wide_df("2024-09-01 22:00", days=3).sample(frac=1, random_state=0)
+
+        dfs_by_day = split_df_by_day(df, TIMEZONE_BERLIN)
+
+        expected = split_df_by_day_with_masks(df, TIMEZONE_BERLIN)
+        assert list(dfs_by_day) == list(expected)
+        for day, daily_df in expected.items():
+            assert_frame_equal(dfs_by_day[day], daily_df)